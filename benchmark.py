@@ -0,0 +1,1100 @@
+"""Performance benchmarks for the dashboard data layer.
+
+Run from the project root, e.g.:
+
+    python benchmark.py generate --rows 1000000
+
+The suite command is the reproducible end-to-end run; its JSON results can be
+diffed between revisions:
+
+    python benchmark.py suite --output before.json
+    python benchmark.py suite --output after.json
+    python benchmark.py compare before.json after.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import main
+from main import DataGenerator, FilterSpec
+
+FILTER_REGIONS = ['all', 'North', 'South', 'East', 'West']
+FILTER_PRODUCTS = ['all', 'Electronics', 'Clothing', 'Home & Garden', 'Sports']
+FILTER_DATE_RANGES = ['all', '30', '90', '365']
+
+
+def legacy_generate_sample_data(generator, num_records):
+    """Original row-by-row generator, kept as the baseline to beat"""
+    np.random.seed(42)
+
+    start_date = datetime.now() - timedelta(days=730)
+    end_date = datetime.now()
+
+    data = []
+
+    for _ in range(num_records):
+        random_date = start_date + timedelta(
+            days=np.random.randint(0, (end_date - start_date).days)
+        )
+
+        month = random_date.month
+        seasonal_multiplier = 1.0
+        if month in [11, 12]:
+            seasonal_multiplier = 1.5
+        elif month in [6, 7, 8]:
+            seasonal_multiplier = 1.2
+
+        region = np.random.choice(generator.regions)
+        region_multiplier = generator.REGION_MULTIPLIERS[region]
+
+        product = np.random.choice(generator.products)
+        base_price = generator.BASE_PRICES[product]
+
+        base_sales = base_price * (0.5 + np.random.random() * 2)
+        sales = base_sales * seasonal_multiplier * region_multiplier
+
+        data.append({
+            'date': random_date.strftime('%Y-%m-%d'),
+            'region': region,
+            'product': product,
+            'sales': round(sales, 2),
+            'orders': np.random.randint(1, 6),
+            'customers': np.random.randint(20, 101),
+            'customer_id': f'CUST_{np.random.randint(1000, 9999)}',
+            'order_id': f'ORD_{np.random.randint(10000, 99999)}'
+        })
+
+    return pd.DataFrame(data)
+
+
+def timed(func, *args, **kwargs):
+    """Return (result, elapsed seconds) for a single call"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_generate(rows, legacy_rows, chunk_size, stream=False):
+    """Compare rows/second of the vectorized and legacy generators"""
+    generator = DataGenerator(num_records=0)
+
+    if stream:
+        # Consume chunks one at a time so 100M+ rows never sit in memory at once
+        def consume():
+            for _ in generator.iter_sample_chunks(rows, chunk_size=chunk_size):
+                pass
+        _, elapsed = timed(consume)
+    else:
+        _, elapsed = timed(generator.generate_sample_data, rows, chunk_size=chunk_size)
+    print(f'vectorized: {rows:>12,} rows in {elapsed:8.3f}s '
+          f'({rows / elapsed:,.0f} rows/s)')
+
+    if legacy_rows:
+        _, legacy_elapsed = timed(legacy_generate_sample_data, generator, legacy_rows)
+        print(f'legacy:     {legacy_rows:>12,} rows in {legacy_elapsed:8.3f}s '
+              f'({legacy_rows / legacy_elapsed:,.0f} rows/s)')
+        print(f'speedup:    {(rows / elapsed) / (legacy_rows / legacy_elapsed):,.1f}x')
+
+
+def percentiles(samples):
+    """p50/p95/p99 of latency samples, in milliseconds"""
+    if not samples:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    values = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return dict(zip(['p50', 'p95', 'p99'], values.round(3).tolist()))
+
+
+def random_filters(rng):
+    """Query string for a random dashboard filter combination"""
+    return urllib.parse.urlencode({'region': rng.choice(FILTER_REGIONS),
+                                   'product': rng.choice(FILTER_PRODUCTS),
+                                   'date_range': rng.choice(FILTER_DATE_RANGES)})
+
+
+def bench_soak(rows, rate, duration, readers, tick):
+    """Append at a fixed row rate while readers query /api/data concurrently"""
+    main.data_gen = DataGenerator(num_records=rows)
+    stop = threading.Event()
+    append_latencies, query_latencies, errors = [], [], []
+
+    def writer():
+        batch = max(1, int(rate * tick))
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            records = main.data_gen.generate_realtime_records(batch)
+            start = time.perf_counter()
+            main.data_gen.append_records(records)
+            append_latencies.append(time.perf_counter() - start)
+            next_tick += tick
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+
+    def reader(seed):
+        rng = random.Random(seed)
+        client = main.app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.get(f'/api/data?{random_filters(rng)}')
+            query_latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(seed,)) for seed in range(readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    appended = len(main.data_gen.data) - rows
+    print(f'appended:   {appended:,} rows in {elapsed:.1f}s ({appended / elapsed:,.0f} rows/s)')
+    print(f'append ms:  {percentiles(append_latencies)}')
+    print(f'queries:    {len(query_latencies):,} ({len(query_latencies) / elapsed:,.1f}/s), '
+          f'{len(errors)} errors')
+    print(f'query ms:   {percentiles(query_latencies)}')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_export(rows, export_format):
+    """Stream a full export and report throughput and peak memory"""
+    main.data_gen = DataGenerator(num_records=rows)
+    client = main.app.test_client()
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    response = client.get(f'/api/export?format={export_format}', buffered=False)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+
+    print(f'export:     {rows:,} rows as {export_format}, {size / 1e6:,.1f} MB '
+          f'in {elapsed:.2f}s ({size / 1e6 / elapsed:,.1f} MB/s)')
+    print(f'peak RSS:   {rss_before:,.0f} MB before, {peak_rss_mb():,.0f} MB after')
+
+
+def best_of(repeat, func, *args):
+    """Fastest of several timed calls, in seconds"""
+    return min(timed(func, *args)[1] for _ in range(repeat))
+
+
+def bench_kernel(sizes, repeat):
+    """Fused single-pass aggregation vs the per-chart pandas builders"""
+    filter_sets = [('all', 'all', 'all'), ('North', 'all', '365'), ('all', 'Sports', '90')]
+    for rows in sizes:
+        generator = DataGenerator(num_records=rows)
+        for region, product, date_range in filter_sets:
+            filters = FilterSpec(region, product, date_range)
+
+            def pandas_path():
+                df = generator.get_filtered_data(filters)
+                return main.build_dashboard_data(df)
+
+            def fused_path():
+                return main.fused_dashboard_data(generator.store, generator.get_row_selection(filters))
+
+            pandas_time = best_of(repeat, pandas_path)
+            fused_time = best_of(repeat, fused_path)
+            print(f'{rows:>12,} rows  {region}/{product}/{date_range:<4}  '
+                  f'prepare_*: {pandas_time * 1000:9.1f}ms  fused: {fused_time * 1000:8.1f}ms  '
+                  f'({pandas_time / fused_time:,.1f}x)')
+
+
+def full_scan_index(df, filters):
+    """Row positions via full-column comparisons, the pre-index baseline"""
+    mask = np.ones(len(df), dtype=bool)
+    if filters.regions:
+        mask &= df['region'].isin(filters.regions).to_numpy()
+    if filters.products:
+        mask &= df['product'].isin(filters.products).to_numpy()
+    dates = df['date'].to_numpy()
+    if filters.start is not None:
+        mask &= dates >= np.datetime64(filters.start, 'ns')
+    if filters.end is not None:
+        mask &= dates < np.datetime64(filters.end + 1, 'ns')
+    return np.flatnonzero(mask)
+
+
+def bench_filter(rows, repeat):
+    """Binary-searched date ranges vs full-column filter scans"""
+    generator = DataGenerator(num_records=rows, distinct_mode=None)
+    df = generator.data
+    today = np.datetime64(datetime.now().date(), 'D')
+    filter_sets = [
+        FilterSpec(date_range='30'),
+        FilterSpec(date_range='365'),
+        FilterSpec(start=today - 120, end=today - 90),
+        FilterSpec(region=['North', 'East'], date_range='90'),
+        FilterSpec(region='West', product=['Sports', 'Clothing'])
+    ]
+    for filters in filter_sets:
+        scan_time = best_of(repeat, full_scan_index, df, filters)
+        indexed_time = best_of(repeat, generator.get_row_selection, filters)
+        selected = len(generator.get_filtered_index(filters))
+        print(f'{rows:>12,} rows  {str(filters.key()):<70} {selected:>11,} selected  '
+              f'scan: {scan_time * 1000:8.2f}ms  indexed: {indexed_time * 1000:8.3f}ms  '
+              f'({scan_time / indexed_time:,.1f}x)')
+
+
+def check_snapshot(snapshot, rng):
+    """Consistency problems in one pinned snapshot (an empty list if none)"""
+    problems = []
+    cube = snapshot.cube
+    sales = snapshot.column('sales')
+    if cube.row_count != len(snapshot):
+        problems.append(f'cube has {cube.row_count} rows, snapshot {len(snapshot)}')
+    if not np.isclose(cube.sales.sum(), sales.sum(), rtol=1e-9):
+        problems.append(f'cube sales {cube.sales.sum()} != row sales {sales.sum()}')
+    if int(cube.orders.sum()) != int(snapshot.column('orders').sum()):
+        problems.append('cube orders differ from row orders')
+    if cube.distinct_mode == 'exact':
+        unique = len(np.unique(snapshot.column('customer_id')))
+        if cube.distinct_customers() != unique:
+            problems.append(f'cube counts {cube.distinct_customers()} customers, rows {unique}')
+
+    # The cube and the fused row kernel must agree on a random filter
+    filters = FilterSpec(rng.choice(FILTER_REGIONS), rng.choice(FILTER_PRODUCTS),
+                         rng.choice(FILTER_DATE_RANGES))
+    from_cube = main.compute_dashboard_data(filters, 'cube', snapshot=snapshot)['metrics']
+    from_rows = main.compute_dashboard_data(filters, 'fused', snapshot=snapshot)['metrics']
+    for metric in ('total_sales', 'total_orders'):
+        if not np.isclose(from_cube[metric], from_rows[metric], rtol=1e-9, atol=0.01):
+            problems.append(f'{filters.key()}: cube {metric} {from_cube[metric]} != rows {from_rows[metric]}')
+    return problems
+
+
+def bench_stress(rows, writers, readers, duration, batch, data_dir=None):
+    """Concurrent appenders and readers; every snapshot a reader pins must be consistent"""
+    generator = main.data_gen = DataGenerator(num_records=rows, data_dir=data_dir)
+    stop = threading.Event()
+    appended, problems = [], []
+    checks = [0] * readers
+
+    def writer(seed):
+        rng = np.random.RandomState(seed)
+        while not stop.is_set():
+            records = generator.generate_realtime_records(batch, rng)
+            if rng.random_sample() < 0.1:
+                # Backdated rows land mid-history and leave the store out of date order
+                records['date'] -= pd.to_timedelta(rng.randint(0, 1000, batch), unit='D')
+            generator.append_records(records)
+            appended.append(batch)
+
+    def reader(index):
+        rng = random.Random(index)
+        while not stop.is_set():
+            problems.extend(check_snapshot(generator.snapshot, rng))
+            checks[index] += 1
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(writers)]
+    threads += [threading.Thread(target=reader, args=(index,)) for index in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    final = generator.snapshot
+    problems.extend(check_snapshot(final, random.Random(0)))
+    if len(final) != rows + sum(appended):
+        problems.append(f'{len(final)} rows after appending {sum(appended)} to {rows}')
+    rebuilt = main.RollupCube.from_frame(final.data, generator.regions, generator.products)
+    if not np.allclose(rebuilt.sales, final.cube.sales) or not np.array_equal(rebuilt.rows, final.cube.rows):
+        problems.append('incrementally built cube differs from a rebuilt one')
+
+    print(f'appends:    {len(appended):,} batches of {batch} from {writers} writers, '
+          f'version {final.version}')
+    print(f'checks:     {sum(checks):,} snapshots checked by {readers} readers')
+    print(f'problems:   {len(problems)}')
+    for problem in problems[:10]:
+        print(f'  {problem}')
+    return not problems
+
+
+def suite_filter_sets(today):
+    """Named filters the suite microbenchmarks, from no filter to multi-value ranges"""
+    return {
+        'all': FilterSpec(),
+        'region': FilterSpec(region='North', date_range='365'),
+        'product': FilterSpec(product='Sports', date_range='90'),
+        'range': FilterSpec(start=today - 120, end=today - 90),
+        'in_list': FilterSpec(region=['North', 'East'], product=['Sports', 'Clothing'])
+    }
+
+
+def summarize(samples):
+    """Best, median and mean of timed runs, in milliseconds"""
+    values = np.array(samples) * 1000
+    return {'runs': len(values), 'best_ms': round(float(values.min()), 3),
+            'median_ms': round(float(np.median(values)), 3),
+            'mean_ms': round(float(values.mean()), 3)}
+
+
+def microbenchmarks(generator, repeat):
+    """get_filtered_data and stats per filter set, each prepare_* on the full frame and the served path"""
+    today = np.datetime64(datetime.now().date(), 'D')
+    results = {}
+
+    def measure(name, func, *args):
+        results[name] = summarize([timed(func, *args)[1] for _ in range(repeat)])
+
+    for label, filters in suite_filter_sets(today).items():
+        measure(f'get_filtered_data[{label}]', generator.get_filtered_data, filters)
+        measure(f'stats[{label}]', generator.snapshot.stats, filters, (90, 99))
+    df = generator.data
+    measure('prepare_sales_trend', main.prepare_sales_trend, df)
+    measure('prepare_region_data', main.prepare_region_data, df)
+    measure('prepare_product_data', main.prepare_product_data, df)
+    measure('prepare_growth_data', main.prepare_growth_data, df)
+    measure('prepare_heatmap_data', main.prepare_heatmap_data, df)
+    for engine in ('cube', 'fused'):
+        measure(f'compute_dashboard_data[{engine}]', main.compute_dashboard_data,
+                FilterSpec(), engine, 1000)
+    return results
+
+
+# Request builders for the load mix; each returns (endpoint, path, headers)
+COMPACT_HEADERS = {'Accept': main.COMPACT_MIMETYPE}
+
+
+def dashboard_request(rng):
+    return 'data', '/api/data?max_points=1000', COMPACT_HEADERS
+
+
+def filtered_request(rng):
+    return 'data', f'/api/data?max_points=1000&{random_filters(rng)}', COMPACT_HEADERS
+
+
+def range_request(rng):
+    start = datetime.now().date() - timedelta(days=rng.randrange(30, 700))
+    end = start + timedelta(days=rng.choice([7, 30, 90]))
+    regions = ','.join(rng.sample(FILTER_REGIONS[1:], 2))
+    return ('data', f'/api/data?max_points=1000&start={start}&end={end}&region={regions}',
+            COMPACT_HEADERS)
+
+
+def granularity_request(rng):
+    granularity = rng.choice(['week', 'month', 'quarter'])
+    return 'data', f'/api/data?granularity={granularity}&{random_filters(rng)}', {}
+
+
+def stats_request(rng):
+    return 'stats', '/api/stats', {}
+
+
+def export_request(rng):
+    region = rng.choice(FILTER_REGIONS[1:])
+    return 'export', f'/api/export?format=csv&region={region}&date_range=30', {}
+
+
+# Weighted after what the dashboard page sends: mostly the unfiltered view and
+# single dropdown changes, some custom ranges and coarser trends, few exports
+LOAD_MIX = [
+    (dashboard_request, 30), (filtered_request, 35), (range_request, 10),
+    (granularity_request, 10), (stats_request, 10), (export_request, 5)
+]
+
+
+def make_fetch(url=None):
+    """GET function returning a status code, in-process unless a server URL is given"""
+    if url is None:
+        client = main.app.test_client()
+
+        def fetch(path, headers):
+            response = client.get(path, headers=headers)
+            response.get_data()
+            return response.status_code
+        return fetch
+
+    def fetch(path, headers):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url + path, headers=headers)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+        except OSError:
+            return 0
+    return fetch
+
+
+def load_test(duration, clients, tick, seed, url=None):
+    """Replay LOAD_MIX from concurrent clients plus periodic realtime ticks.
+
+    Each tick appends through /api/realtime and then reloads the dashboard,
+    as a polling client does.
+    """
+    stop = threading.Event()
+    samples = {}  # endpoint -> [(seconds, status)]
+    lock = threading.Lock()
+    builders, weights = zip(*LOAD_MIX)
+
+    def record(fetch, endpoint, path, headers):
+        start = time.perf_counter()
+        status = fetch(path, headers)
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.setdefault(endpoint, []).append((elapsed, status))
+
+    def client(index):
+        rng = random.Random(seed + index)
+        fetch = make_fetch(url)
+        while not stop.is_set():
+            record(fetch, *rng.choices(builders, weights)[0](rng))
+
+    def ticker():
+        rng = random.Random(seed - 1)
+        fetch = make_fetch(url)
+        while not stop.wait(tick):
+            record(fetch, 'realtime', '/api/realtime', {})
+            record(fetch, *filtered_request(rng))
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    threads.append(threading.Thread(target=ticker))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    def report(entries):
+        return {'requests': len(entries),
+                'errors': sum(1 for _, status in entries if status != 200),
+                'throughput_rps': round(len(entries) / elapsed, 2),
+                'latency_ms': percentiles([seconds for seconds, _ in entries])}
+
+    everything = [entry for entries in samples.values() for entry in entries]
+    return dict(report(everything), duration_s=round(elapsed, 2), clients=clients, tick_s=tick,
+                endpoints={endpoint: report(entries) for endpoint, entries in sorted(samples.items())})
+
+
+def suite_run(rows, seed, repeat, duration, clients, tick):
+    """One dataset size: build it, microbenchmark it, then load test it in-process"""
+    np.random.seed(seed)  # /api/realtime draws from the global generator
+    generator, setup_time = timed(DataGenerator, num_records=rows, seed=seed)
+    main.data_gen = generator
+    result = {'rows': rows, 'setup_s': round(setup_time, 3),
+              'micro': microbenchmarks(generator, repeat)}
+    if duration > 0:
+        result['load'] = load_test(duration, clients, tick, seed)
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return result
+
+
+def environment():
+    """Versions and revision a suite result was produced with"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {'revision': revision, 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': multiprocessing.cpu_count(),
+            'numpy': np.__version__, 'pandas': pd.__version__}
+
+
+def bench_suite(sizes, seed, repeat, duration, clients, tick, url=None, output=None):
+    """Run every size in a fresh process (so peak RSS is per dataset) and emit JSON"""
+    results = {'created': datetime.now().isoformat(timespec='seconds'),
+               'environment': environment(),
+               'config': {'seed': seed, 'repeat': repeat, 'duration_s': duration,
+                          'clients': clients, 'tick_s': tick, 'url': url},
+               'runs': []}
+    if url:
+        # An external server holds its own dataset; only the load test applies
+        results['runs'].append({'url': url, 'load': load_test(duration, clients, tick, seed, url)})
+    else:
+        context = multiprocessing.get_context('spawn')
+        for rows in sizes:
+            print(f'suite:      {rows:,} rows', file=sys.stderr)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                run = pool.submit(suite_run, rows, seed, repeat, duration, clients, tick)
+                results['runs'].append(run.result())
+
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def suite_metrics(run):
+    """Flatten one suite run to {metric: (value, higher_is_better)}"""
+    flat = {f'{name} best_ms': (stats['best_ms'], False)
+            for name, stats in run.get('micro', {}).items()}
+    load = run.get('load')
+    if load:
+        for endpoint, stats in [('all', load)] + sorted(load['endpoints'].items()):
+            flat[f'load {endpoint} rps'] = (stats['throughput_rps'], True)
+            for quantile, value in stats['latency_ms'].items():
+                flat[f'load {endpoint} {quantile}_ms'] = (value, False)
+    if 'peak_rss_mb' in run:
+        flat['peak_rss_mb'] = (run['peak_rss_mb'], False)
+    return flat
+
+
+def compare_suites(before_path, after_path, threshold):
+    """Print metric changes between two suite results; True if nothing regressed"""
+    with open(before_path) as f:
+        before = {run.get('rows', run.get('url')): run for run in json.load(f)['runs']}
+    with open(after_path) as f:
+        after = {run.get('rows', run.get('url')): run for run in json.load(f)['runs']}
+
+    regressions = 0
+    for size in [size for size in after if size in before]:
+        print(f'{size:,} rows' if isinstance(size, int) else size)
+        old, new = suite_metrics(before[size]), suite_metrics(after[size])
+        for metric, (value, higher_is_better) in new.items():
+            if metric not in old or not old[metric][0]:
+                continue
+            ratio = value / old[metric][0]
+            worse = ratio < 1 - threshold if higher_is_better else ratio > 1 + threshold
+            regressions += worse
+            print(f'  {metric:<48} {old[metric][0]:>12,.3f} -> {value:>12,.3f}  '
+                  f'{ratio:6.2f}x{"  REGRESSED" if worse else ""}')
+    print(f'regressions: {regressions} (threshold {threshold:.0%})')
+    return not regressions
+
+
+def write_sales_file(rows, export_format, path):
+    """Write a seeded sample dataset to path, as /api/export would stream it"""
+    chunks = DataGenerator(num_records=rows).snapshot.iter_chunks(chunk_rows=main.EXPORT_CHUNK_ROWS)
+    with open(path, 'wb') as f:
+        for data in main.iter_export(chunks, export_format):
+            f.write(data)
+
+
+def load_sales_file(path, chunk_rows):
+    """Stream a sales file into a new store; returns (rows, seconds, peak RSS MB)"""
+    generator = DataGenerator(num_records=0)
+    cube = main.RollupCube(generator.regions, generator.products)
+    store, elapsed = timed(generator.load_file, path, cube, chunk_rows)
+    return len(store), elapsed, peak_rss_mb()
+
+
+def bench_load(rows, export_format, chunk_rows):
+    """Loader throughput and peak memory, loading in a fresh process"""
+    extension = main.EXPORT_FORMATS[export_format][0]
+    path = os.path.join(tempfile.mkdtemp(), f'sales.{extension}')
+    context = multiprocessing.get_context('spawn')
+    try:
+        # Separate processes: a child inherits its parent's peak RSS across fork and exec
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            pool.submit(write_sales_file, rows, export_format, path).result()
+        size = os.path.getsize(path)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            loaded, elapsed, peak = pool.submit(load_sales_file, path, chunk_rows).result()
+    finally:
+        shutil.rmtree(os.path.dirname(path))
+    print(f'load:       {loaded:,} rows from {size / 1e6:,.1f} MB of {export_format} '
+          f'in {elapsed:.2f}s ({loaded / elapsed:,.0f} rows/s)')
+    print(f'peak RSS:   {peak:,.0f} MB with {chunk_rows:,}-row chunks')
+
+
+def bench_backends(rows, repeat):
+    """SQLite pushdown vs the default pandas backend, per filter set and for /api/stats"""
+    generator = DataGenerator(num_records=rows)
+    path = os.path.join(tempfile.mkdtemp(), 'sales.db')
+    try:
+        backend, elapsed = timed(main.SqliteBackend, path, rows)
+        backend.checkpoint()
+        print(f'sqlite:     {rows:,} rows loaded and indexed in {elapsed:.2f}s, '
+              f'{os.path.getsize(path) / 1e6:,.1f} MB on disk')
+        today = np.datetime64(datetime.now().date(), 'D')
+        for label, filters in suite_filter_sets(today).items():
+            expected = generator.snapshot.dashboard_data(filters)['metrics']
+            if backend.snapshot.dashboard_data(filters)['metrics'] != expected:
+                raise SystemExit(f'{label}: sqlite metrics differ from pandas')
+            pandas_time = best_of(repeat, generator.snapshot.dashboard_data, filters)
+            sql_time = best_of(repeat, backend.snapshot.dashboard_data, filters)
+            print(f'{rows:>12,} rows  {label:<8}  pandas: {pandas_time * 1000:8.1f}ms  '
+                  f'sqlite: {sql_time * 1000:8.1f}ms')
+        pandas_time = best_of(repeat, generator.snapshot.stats)
+        sql_time = best_of(repeat, backend.snapshot.stats)
+        print(f'{rows:>12,} rows  {"stats":<8}  pandas: {pandas_time * 1000:8.1f}ms  '
+              f'sqlite: {sql_time * 1000:8.1f}ms')
+    finally:
+        shutil.rmtree(os.path.dirname(path))
+
+
+def legacy_frame(df):
+    """The frame as it used to be held: IDs as object strings, 64-bit numbers"""
+    legacy = pd.DataFrame({name: np.asarray(df[name]) for name in ('date', 'sales')})
+    legacy['region'] = df['region']
+    legacy['product'] = df['product']
+    for name in ('orders', 'customers'):
+        legacy[name] = np.asarray(df[name], dtype=np.int64)
+    for name, prefix in main.ID_PREFIXES.items():
+        legacy[name] = main._id_labels(np.asarray(df[name]), prefix)
+    return legacy[list(df.columns)]
+
+
+def bench_memory(rows):
+    """Bytes per column before and after compact IDs and narrow integers, and what they speed up"""
+    generator = DataGenerator(num_records=rows, distinct_mode='exact')
+    store = generator.store
+    df = generator.data
+    legacy = legacy_frame(df)
+
+    total_before = total_after = 0
+    print(f'{"column":<12} {"dtype":>14} {"before":>12} {"after":>12} {"saved":>7}')
+    for name in df.columns:
+        before = legacy[name].memory_usage(index=False, deep=True)
+        after = store.column(name).nbytes
+        if name in store.dictionaries:
+            after += store.dictionaries[name].nbytes
+        total_before += before
+        total_after += after
+        print(f'{name:<12} {str(store.schema[name]):>14} {before / 1e6:>10,.1f}MB '
+              f'{after / 1e6:>10,.1f}MB {1 - after / before:>7.0%}')
+    print(f'{"total":<12} {"":>14} {total_before / 1e6:>10,.1f}MB '
+          f'{total_after / 1e6:>10,.1f}MB {1 - total_after / total_before:>7.0%}')
+    # Not counted above: the exact distinct index numbers customers densely for its own use
+    print(f'customer codes in the exact distinct index: {generator.cube._distinct.code_nbytes / 1e6:,.1f}MB')
+
+    sample = slice(0, min(rows, main.EXPORT_CHUNK_ROWS))
+    checks = [
+        ('nunique(customer_id)', lambda frame: frame['customer_id'].nunique()),
+        ('copy()', lambda frame: frame.copy()),
+        (f'to_csv({sample.stop:,} rows)', lambda frame: main._export_frame(frame.iloc[sample]).to_csv(index=False))
+    ]
+    for label, check in checks:
+        before = best_of(3, check, legacy)
+        after = best_of(3, check, df)
+        print(f'{label:<28} before: {before * 1000:8.1f}ms  after: {after * 1000:8.1f}ms  '
+              f'({before / after:,.1f}x)')
+
+
+def bench_push(rows, clients, ticks, seed):
+    """CPU per realtime write for clients polling vs subscribed to /api/stream"""
+    np.random.seed(seed)
+    main.data_gen = DataGenerator(num_records=rows)
+    main.update_hub = main.UpdateHub(main.data_gen)
+    main.realtime_simulator = main.RealtimeSimulator(main.data_gen, interval=0)
+    rng = random.Random(seed)
+    queries = [random_filters(rng) + '&max_points=1000' for _ in range(clients)]
+    client = main.app.test_client()
+    print(f'{clients:,} clients over {len(set(queries))} filter combinations, {rows:,} rows')
+
+    # Polling: every client writes through /api/realtime, then reloads its dashboard
+    started = time.process_time()
+    for _ in range(ticks):
+        for query in queries:
+            client.get('/api/realtime')
+            client.get(f'/api/data?{query}', headers=COMPACT_HEADERS)
+    polling = (time.process_time() - started) / ticks
+
+    # Push: one write per tick, each filter combination computed once and fanned out
+    received = [0] * clients
+    ready = threading.Semaphore(0)
+
+    def subscriber(index):
+        response = main.app.test_client().get(f'/api/stream?{queries[index]}', buffered=False)
+        for _ in response.response:
+            received[index] += 1
+            if received[index] == 1:
+                ready.release()
+
+    threads = [threading.Thread(target=subscriber, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        ready.acquire()
+
+    def delivered(version):
+        hub = main.update_hub
+        with hub._lock:
+            groups = list(hub._groups.values())
+        return all(group.version == version and all(s.queue.empty() for s in group.subscribers)
+                   for group in groups)
+
+    latencies = []
+    started = time.process_time()
+    for _ in range(ticks):
+        records = main.data_gen.generate_realtime_records(np.random.randint(1, 6))
+        written = time.perf_counter()
+        version = main.data_gen.append_records(records).version
+        while not delivered(version):
+            time.sleep(0.001)
+        latencies.append(time.perf_counter() - written)
+    push = (time.process_time() - started) / ticks
+    main.update_hub.close()
+    for thread in threads:
+        thread.join()
+
+    per_thousand = 1000 / clients
+    print(f'polling:    {polling * per_thousand:8.3f} CPU s per write per 1,000 clients')
+    print(f'push:       {push * per_thousand:8.3f} CPU s per write per 1,000 clients '
+          f'({polling / push:,.0f}x less), fan-out in {max(latencies) * 1000:,.0f}ms, '
+          f'{sum(received) - clients:,} updates sent')
+
+
+def ingest_bodies(rows, batch, ingest_format):
+    """Request bodies of batch rows each, encoded as /api/ingest expects"""
+    chunks = main.data_gen.iter_sample_chunks(rows, seed=7, chunk_size=batch)
+    for chunk in chunks:
+        if ingest_format == 'ndjson':
+            yield main._export_frame(chunk).to_json(orient='records', lines=True,
+                                                    date_format='iso').encode('utf-8')
+        else:
+            yield b''.join(main.iter_export([chunk], 'arrow'))
+
+
+def bench_ingest(rows, ingest_format, batch, writers, readers):
+    """/api/ingest throughput with concurrent /api/data reads, then WAL replay time"""
+    main.data_gen = DataGenerator(num_records=rows)
+    workdir = tempfile.mkdtemp(prefix='ingest-bench-')
+    wal = os.path.join(workdir, 'ingest.wal')
+    main.ingest_log = main.IngestLog(wal, main.data_gen)
+    content_type = {'ndjson': 'application/x-ndjson',
+                    'arrow': 'application/vnd.apache.arrow.stream'}[ingest_format]
+    bodies = list(ingest_bodies(rows, batch, ingest_format))
+    print(f'{len(bodies):,} {ingest_format} batches of {batch:,} rows '
+          f'({sum(map(len, bodies)) / len(bodies) / 1024:,.0f} KiB each), '
+          f'{writers} writers, {readers} readers')
+
+    stop = threading.Event()
+    pending = iter(bodies)
+    lock = threading.Lock()
+    ingest_latencies, query_latencies, errors = [], [], []
+
+    def writer():
+        client = main.app.test_client()
+        while True:
+            with lock:
+                body = next(pending, None)
+            if body is None:
+                return
+            start = time.perf_counter()
+            response = client.post('/api/ingest', data=body, content_type=content_type)
+            ingest_latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.get_json()['message'])
+
+    def reader(seed):
+        rng = random.Random(seed)
+        client = main.app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.get(f'/api/data?{random_filters(rng)}')
+            query_latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    reader_threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(readers)]
+    writer_threads = [threading.Thread(target=writer) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+
+    ingested = len(main.data_gen.snapshot) - rows
+    log = main.ingest_log
+    print(f'ingested:   {ingested:,} rows in {elapsed:.1f}s ({ingested / elapsed:,.0f} rows/s), '
+          f'{len(errors)} errors')
+    print(f'ingest ms:  {percentiles(ingest_latencies)}')
+    print(f'commits:    {log.commits:,} for {log.batches:,} batches '
+          f'({log.batches / max(log.commits, 1):.1f} per fsync)')
+    print(f'queries:    {len(query_latencies):,} ({len(query_latencies) / elapsed:,.1f}/s)')
+    print(f'query ms:   {percentiles(query_latencies)}')
+
+    restarted = DataGenerator(num_records=rows)
+    replayed, seconds = timed(main.IngestLog(wal, restarted).replay)
+    print(f'replay:     {replayed:,} rows from a {os.path.getsize(wal) / 2**20:,.1f} MiB log '
+          f'in {seconds:.2f}s, dataset {"matches" if len(restarted.snapshot) == rows + ingested else "DIFFERS"}')
+    shutil.rmtree(workdir)
+
+
+def bench_batch(rows, sizes, engines, repeat, seed):
+    """/api/batch evaluation vs one compute_dashboard_data call per filter set"""
+    main.data_gen = DataGenerator(num_records=rows)
+    combinations = list(itertools.product(FILTER_REGIONS, FILTER_PRODUCTS, FILTER_DATE_RANGES))
+    random.Random(seed).shuffle(combinations)
+    print(f'{rows:,} rows, best of {repeat}')
+    for engine in engines:
+        for size in sizes:
+            filter_sets = [FilterSpec(region, product, date_range)
+                           for region, product, date_range in combinations[:size]]
+
+            def separately():
+                for filters in filter_sets:
+                    main.compute_dashboard_data(filters, engine, 1000)
+
+            separate = best_of(repeat, separately)
+            batch = best_of(repeat, main.compute_batch_data, filter_sets, engine, 1000)
+            print(f'{engine:<6} {size:>4} filter sets  separate: {separate * 1000:9.1f}ms  '
+                  f'batch: {batch * 1000:9.1f}ms ({batch / size * 1000:7.2f}ms per set, '
+                  f'{separate / batch:4.1f}x)')
+
+
+def same_data(a, b):
+    """Whether two dashboard payloads agree, up to float summation order"""
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same_data(a[key], b[key]) for key in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(map(same_data, a, b))
+    if isinstance(a, float):
+        return bool(np.isclose(a, b, rtol=1e-9, atol=0.01))
+    return a == b
+
+
+def bench_partition(rows, workers, repeat, seed):
+    """Fused scans split across worker processes vs in-process, checking the results agree"""
+    main.data_gen = DataGenerator(num_records=rows, store_dir=main.PartitionedAggregator.shared_dir())
+    combinations = list(itertools.product(FILTER_REGIONS, FILTER_PRODUCTS, FILTER_DATE_RANGES))
+    random.Random(seed).shuffle(combinations)
+    batch = [FilterSpec(region, product, date_range) for region, product, date_range in combinations[:16]]
+    cases = [('all rows', main.compute_dashboard_data, FilterSpec()),
+             ('North, 365 days', main.compute_dashboard_data, FilterSpec('North', 'all', '365')),
+             ('16-set batch', main.compute_batch_data, batch)]
+
+    def run(func, filters):
+        return func(filters, 'fused', 1000)
+
+    main.aggregator = main.PartitionedAggregator()
+    expected = {name: run(func, filters) for name, func, filters in cases}
+    baseline = {name: best_of(repeat, run, func, filters) for name, func, filters in cases}
+    print(f'{rows:,} rows, best of {repeat}, {os.cpu_count()} CPUs')
+    for name, _, _ in cases:
+        print(f'{name:<16} in-process: {baseline[name] * 1000:8.1f}ms')
+    for count in workers:
+        main.aggregator = main.PartitionedAggregator(count)
+        for name, func, filters in cases:
+            agrees = same_data(run(func, filters), expected[name])
+            seconds = best_of(repeat, run, func, filters)
+            print(f'{name:<16} {count:>2} workers: {seconds * 1000:8.1f}ms '
+                  f'({baseline[name] / seconds:4.2f}x){"" if agrees else "  RESULTS DIFFER"}')
+        main.aggregator.close()
+
+
+def bench_warm(rows, readers, duration, tick, engine, top, seed):
+    """/api/data latency and cache hits under skewed traffic and writes, with and without the warmer"""
+    main.data_gen = DataGenerator(num_records=rows)
+    combinations = list(itertools.product(FILTER_REGIONS, FILTER_PRODUCTS, FILTER_DATE_RANGES))
+    random.Random(seed).shuffle(combinations)
+    # Zipf-like popularity: the i-th combination is asked for 1/i as often as the first
+    weights = [1 / (i + 1) for i in range(len(combinations))]
+    print(f'{rows:,} rows, {engine} engine, {readers} readers, a write every {tick}s for {duration}s')
+
+    for warm_top in (0, top):
+        main.response_cache = main.ResponseCache()
+        main.cache_warmer = main.CacheWarmer(main.data_gen, main.response_cache, top=warm_top)
+        stop = threading.Event()
+        hits, misses = [], []
+
+        def writer():
+            while not stop.wait(tick):
+                main.data_gen.append_records(main.data_gen.generate_realtime_records(5))
+
+        def reader(reader_seed):
+            rng = random.Random(reader_seed)
+            client = main.app.test_client()
+            while not stop.is_set():
+                region, product, date_range = rng.choices(combinations, weights)[0]
+                query = urllib.parse.urlencode({'region': region, 'product': product,
+                                                'date_range': date_range, 'engine': engine})
+                start = time.perf_counter()
+                response = client.get(f'/api/data?{query}')
+                elapsed = time.perf_counter() - start
+                (hits if response.headers['X-Cache'] == 'HIT' else misses).append(elapsed)
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader, args=(seed + i,)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        cache = main.response_cache.stats()
+        print(f'warmer {"off" if not warm_top else f"top {warm_top}"}:')
+        print(f'  requests:      {len(hits) + len(misses):,}, hit ratio {cache["hit_rate"]:.3f}, '
+              f'warm-hit ratio {cache["warm_hit_rate"]:.3f}')
+        print(f'  all ms:        {percentiles(hits + misses)}')
+        print(f'  miss ms:       {percentiles(misses)}')
+    lag = [line for line in main.app.test_client().get('/api/metrics').get_data(as_text=True).splitlines()
+           if line.startswith(('dashboard_cache_warmer_lag_seconds{', 'dashboard_cache_warmer_builds_total{'))]
+    print('\n'.join(lag))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='sample data generation throughput')
+    generate.add_argument('--rows', type=int, default=1_000_000)
+    generate.add_argument('--legacy-rows', type=int, default=20_000,
+                          help='rows for the row-by-row baseline (0 to skip)')
+    generate.add_argument('--chunk-size', type=int, default=1_000_000)
+    generate.add_argument('--stream', action='store_true',
+                          help='iterate chunks instead of building one frame')
+
+    soak = commands.add_parser('soak', help='sustained appends with concurrent /api/data reads')
+    soak.add_argument('--rows', type=int, default=1_000_000, help='initial dataset size')
+    soak.add_argument('--rate', type=int, default=1000, help='appended rows per second')
+    soak.add_argument('--duration', type=float, default=3600, help='seconds to run')
+    soak.add_argument('--readers', type=int, default=4, help='concurrent reader threads')
+    soak.add_argument('--tick', type=float, default=0.1, help='seconds between append batches')
+
+    export = commands.add_parser('export', help='streamed /api/export throughput and memory')
+    export.add_argument('--rows', type=int, default=10_000_000)
+    export.add_argument('--format', default='csv', choices=['csv', 'csv.gz', 'parquet', 'arrow'])
+
+    kernel = commands.add_parser('kernel', help='fused aggregation kernel vs prepare_* builders')
+    kernel.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    kernel.add_argument('--repeat', type=int, default=3)
+
+    filter_cmd = commands.add_parser('filter', help='indexed date-range filters vs full scans')
+    filter_cmd.add_argument('--rows', type=int, default=10_000_000)
+    filter_cmd.add_argument('--repeat', type=int, default=5)
+
+    stress = commands.add_parser('stress', help='snapshot consistency under concurrent appends')
+    stress.add_argument('--rows', type=int, default=100_000, help='initial dataset size')
+    stress.add_argument('--writers', type=int, default=2, help='appending threads')
+    stress.add_argument('--readers', type=int, default=4, help='checking threads')
+    stress.add_argument('--duration', type=float, default=30, help='seconds to run')
+    stress.add_argument('--batch', type=int, default=50, help='rows per append')
+    stress.add_argument('--data-dir', help='run against a memory-mapped store in this directory')
+
+    load = commands.add_parser('load', help='streaming sales file loader throughput and memory')
+    load.add_argument('--rows', type=int, default=10_000_000)
+    load.add_argument('--format', default='csv.gz', choices=['csv', 'csv.gz', 'parquet', 'arrow'])
+    load.add_argument('--chunk-rows', type=int, default=500_000)
+
+    push = commands.add_parser('push', help='CPU per write, polling clients vs /api/stream')
+    push.add_argument('--rows', type=int, default=1_000_000)
+    push.add_argument('--clients', type=int, default=1000)
+    push.add_argument('--ticks', type=int, default=3, help='realtime writes to measure')
+    push.add_argument('--seed', type=int, default=42)
+
+    ingest = commands.add_parser('ingest', help='/api/ingest rows per second with concurrent reads')
+    ingest.add_argument('--rows', type=int, default=1_000_000, help='initial dataset size, and rows ingested')
+    ingest.add_argument('--format', default='arrow', choices=['ndjson', 'arrow'])
+    ingest.add_argument('--batch', type=int, default=5000, help='rows per request')
+    ingest.add_argument('--writers', type=int, default=8, help='concurrent ingest clients')
+    ingest.add_argument('--readers', type=int, default=4, help='concurrent reader threads')
+
+    batch = commands.add_parser('batch', help='/api/batch cost as the number of filter sets grows')
+    batch.add_argument('--rows', type=int, default=1_000_000)
+    batch.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    batch.add_argument('--engines', nargs='+', default=['fused', 'cube'], choices=['cube', 'fused', 'rows'])
+    batch.add_argument('--repeat', type=int, default=3)
+    batch.add_argument('--seed', type=int, default=42)
+
+    partition = commands.add_parser('partition', help='fused scans across 1-8 worker processes')
+    partition.add_argument('--rows', type=int, default=10_000_000)
+    partition.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    partition.add_argument('--repeat', type=int, default=3)
+    partition.add_argument('--seed', type=int, default=42)
+
+    warm = commands.add_parser('warm', help='/api/data cache hits under writes, with the cache warmer')
+    warm.add_argument('--rows', type=int, default=1_000_000)
+    warm.add_argument('--readers', type=int, default=4)
+    warm.add_argument('--duration', type=float, default=30, help='seconds to run each way')
+    warm.add_argument('--tick', type=float, default=2, help='seconds between writes')
+    warm.add_argument('--engine', default='fused', choices=['cube', 'fused', 'rows'])
+    warm.add_argument('--top', type=int, default=32, help='combinations the warmer keeps hot')
+    warm.add_argument('--seed', type=int, default=42)
+
+    memory = commands.add_parser('memory', help='per-column memory of compact IDs and narrow integers')
+    memory.add_argument('--rows', type=int, default=1_000_000)
+
+    backends = commands.add_parser('backends', help='sqlite pushdown vs the pandas backend')
+    backends.add_argument('--rows', type=int, default=1_000_000)
+    backends.add_argument('--repeat', type=int, default=3)
+
+    suite = commands.add_parser('suite', help='reproducible microbenchmarks and load test, as JSON')
+    suite.add_argument('--rows', type=int, nargs='+', default=[5000, 1_000_000, 10_000_000])
+    suite.add_argument('--seed', type=int, default=42)
+    suite.add_argument('--repeat', type=int, default=5, help='runs per microbenchmark')
+    suite.add_argument('--duration', type=float, default=60,
+                       help='seconds of load per dataset (0 to skip)')
+    suite.add_argument('--clients', type=int, default=8, help='concurrent load clients')
+    suite.add_argument('--tick', type=float, default=30, help='seconds between realtime ticks')
+    suite.add_argument('--url', help='load test a running server instead, e.g. http://127.0.0.1:5000')
+    suite.add_argument('--output', help='write JSON here instead of stdout')
+
+    compare = commands.add_parser('compare', help='diff two suite results')
+    compare.add_argument('before')
+    compare.add_argument('after')
+    compare.add_argument('--threshold', type=float, default=0.1,
+                         help='relative change reported as a regression')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        bench_generate(args.rows, args.legacy_rows, args.chunk_size, args.stream)
+    elif args.command == 'soak':
+        bench_soak(args.rows, args.rate, args.duration, args.readers, args.tick)
+    elif args.command == 'export':
+        bench_export(args.rows, args.format)
+    elif args.command == 'kernel':
+        bench_kernel(args.rows, args.repeat)
+    elif args.command == 'filter':
+        bench_filter(args.rows, args.repeat)
+    elif args.command == 'stress':
+        if not bench_stress(args.rows, args.writers, args.readers, args.duration, args.batch,
+                            args.data_dir):
+            raise SystemExit(1)
+    elif args.command == 'load':
+        bench_load(args.rows, args.format, args.chunk_rows)
+    elif args.command == 'push':
+        bench_push(args.rows, args.clients, args.ticks, args.seed)
+    elif args.command == 'ingest':
+        bench_ingest(args.rows, args.format, args.batch, args.writers, args.readers)
+    elif args.command == 'batch':
+        bench_batch(args.rows, args.sizes, args.engines, args.repeat, args.seed)
+    elif args.command == 'partition':
+        bench_partition(args.rows, args.workers, args.repeat, args.seed)
+    elif args.command == 'warm':
+        bench_warm(args.rows, args.readers, args.duration, args.tick, args.engine, args.top, args.seed)
+    elif args.command == 'memory':
+        bench_memory(args.rows)
+    elif args.command == 'backends':
+        bench_backends(args.rows, args.repeat)
+    elif args.command == 'suite':
+        bench_suite(args.rows, args.seed, args.repeat, args.duration, args.clients, args.tick,
+                    args.url, args.output)
+    elif args.command == 'compare':
+        if not compare_suites(args.before, args.after, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main_cli()
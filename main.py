@@ -1,99 +1,3796 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, g
 import pandas as pd
 import numpy as np
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
 from datetime import datetime, timedelta
+from functools import wraps
+from types import SimpleNamespace
+import atexit
+import base64
+import bisect
+import copy
+import fcntl
+import gzip
+import hashlib
+import heapq
+import io
 import json
+import multiprocessing
 import os
+import queue
+import resource
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Arrow exports are optional
+    pa = pq = None
 
 app = Flask(__name__)
 
 
-class DataGenerator:
-    """Generate and manage sample sales data"""
+class SalesBackend:
+    """Storage backend interface, plus the sample data all backends share.
 
-    def __init__(self):
+    A backend publishes its rows as immutable snapshots, and requests only
+    read the current snapshot. A snapshot has a version (bumped on every
+    write), len(), data, get_filtered_data(filters), count(filters),
+    iter_chunks(filters, chunk_rows), dashboard_data(filters, granularity),
+    stats(), date_span(), and ENGINES, the /api/data engines it can serve.
+    Writes go through append_records(df), which returns the new snapshot,
+    and wait_for_change() wakes up whoever is waiting for one.
+
+    Loaded and ingested rows must be dated within date_window_days of the
+    data already stored (see SalesFileReader.check_dates).
+    """
+
+    # Sales multipliers by calendar month (holiday season and summer peaks)
+    SEASONAL_MULTIPLIERS = np.array([
+        1.0, 1.0, 1.0, 1.0, 1.0, 1.2, 1.2, 1.2, 1.0, 1.0, 1.5, 1.5
+    ])
+    REGION_MULTIPLIERS = {
+        'North': 1.1, 'South': 0.9, 'East': 1.2, 'West': 1.0
+    }
+    BASE_PRICES = {
+        'Electronics': 500, 'Clothing': 80,
+        'Home & Garden': 150, 'Sports': 120
+    }
+
+    def __init__(self, date_window_days=None):
+        self.date_window_days = date_window_days
         self.regions = ['North', 'South', 'East', 'West']
         self.products = ['Electronics', 'Clothing', 'Home & Garden', 'Sports']
-        self.data = self.generate_sample_data()
-
-    def generate_sample_data(self, num_records=5000):
+        # Stored region/product codes index these sorted labels
+        self.categories = {'region': sorted(self.regions), 'product': sorted(self.products)}
+        self.snapshot = None
+        self._changed = threading.Condition()
+
+    @property
+    def persistent(self):
+        """Whether appended rows survive a restart"""
+        return False
+
+    @property
+    def data(self):
+        """Rows of the current snapshot as a read-only DataFrame"""
+        return self.snapshot.data
+
+    @property
+    def version(self):
+        """Bumped on every write so cached results can tell they are stale"""
+        return self.snapshot.version
+
+    def get_filtered_data(self, filters=None):
+        """Filter data based on parameters (see the snapshot's get_filtered_data)"""
+        return self.snapshot.get_filtered_data(filters)
+
+    def wait_for_change(self, version, timeout=None):
+        """The current snapshot, once its version is no longer version or timeout passes"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.snapshot.version != version, timeout)
+            return self.snapshot
+
+    def _set_snapshot(self, snapshot):
+        with self._changed:
+            self.snapshot = snapshot
+            self._changed.notify_all()
+
+    def append_records(self, df):
+        raise NotImplementedError
+
+    def check_dates(self, df, rows):
+        """Reject typed rows dated too far from the stored data; rows describes them for errors"""
+        SalesFileReader.check_dates(df['date'], self.snapshot.date_span(), rows, window_days=self.date_window_days)
+
+    def refresh(self):
+        """Fold in rows that other processes wrote, if the storage is shared"""
+
+    def checkpoint(self):
+        """Persist whatever makes the next start faster"""
+
+    def memory_usage(self):
+        """Bytes held by the dataset, by component"""
+        raise NotImplementedError
+
+    def generate_sample_data(self, num_records=5000, seed=42, chunk_size=1_000_000):
         """Generate realistic sample sales data"""
-        np.random.seed(42)  # For reproducible data
+        chunks = list(self.iter_sample_chunks(num_records, seed, chunk_size))
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True)
+
+    def iter_sample_chunks(self, num_records, seed=42, chunk_size=1_000_000):
+        """Yield sample data as DataFrames of at most chunk_size rows.
+
+        The same seed and chunk size always produce the same rows, so very
+        large datasets can be generated and consumed piecewise.
+        """
+        rng = np.random.default_rng(seed)
 
         # Date range: last 2 years
         start_date = datetime.now() - timedelta(days=730)
         end_date = datetime.now()
+        num_days = (end_date - start_date).days
+        start_day = np.datetime64(start_date.date(), 'D')
+
+        # An empty request still yields one (empty) chunk with the full schema
+        for offset in range(0, max(num_records, 1), chunk_size):
+            size = min(chunk_size, num_records - offset)
+            yield self._generate_chunk(rng, size, start_day, num_days)
+
+    def _generate_chunk(self, rng, size, start_day, num_days):
+        """Build one chunk of sample rows from NumPy arrays"""
+        dates = start_day + rng.integers(0, num_days, size)
+        region_codes = rng.integers(0, len(self.regions), size)
+        product_codes = rng.integers(0, len(self.products), size)
+
+        # Seasonal, regional and product patterns as lookup tables
+        months = dates.astype('datetime64[M]').astype(np.int64) % 12
+        seasonal_multiplier = self.SEASONAL_MULTIPLIERS[months]
+        region_multiplier = np.array(
+            [self.REGION_MULTIPLIERS[r] for r in self.regions]
+        )[region_codes]
+        base_price = np.array(
+            [self.BASE_PRICES[p] for p in self.products], dtype=np.float64
+        )[product_codes]
+
+        # Calculate sales with patterns
+        base_sales = base_price * (0.5 + rng.random(size) * 2)
+        sales = base_sales * seasonal_multiplier * region_multiplier
+
+        orders = rng.integers(1, 6, size)
+        customers = rng.integers(20, 101, size)
+        customer_numbers = rng.integers(1000, 9999, size)
+        order_numbers = rng.integers(10000, 99999, size)
+
+        # IDs are kept as their numbers (see ID_PREFIXES), in the narrowest types that fit
+        return pd.DataFrame({
+            'date': dates.astype('datetime64[ns]'),
+            'region': _categorical(region_codes, self.regions),
+            'product': _categorical(product_codes, self.products),
+            'sales': np.round(sales, 2),
+            'orders': orders.astype(np.int16),
+            'customers': customers.astype(np.int16),
+            'customer_id': customer_numbers.astype(np.int16),
+            'order_id': order_numbers.astype(np.int32)
+        })
+
+    def generate_realtime_records(self, count, rng=np.random):
+        """Random typed records dated today, as produced by live sales"""
+        today = np.datetime64(datetime.now().date(), 'ns')
+        return pd.DataFrame({
+            'date': np.full(count, today),
+            'region': _categorical(rng.randint(0, len(self.regions), count), self.regions),
+            'product': _categorical(rng.randint(0, len(self.products), count), self.products),
+            'sales': np.round(rng.uniform(50, 1000, count), 2),
+            'orders': rng.randint(1, 6, count).astype(np.int16),
+            'customers': rng.randint(20, 101, count).astype(np.int16),
+            'customer_id': (1000 + rng.randint(0, 8999, count)).astype(np.int16),
+            'order_id': (10000 + rng.randint(0, 89999, count)).astype(np.int32)
+        })
+
+    def to_typed_frame(self, df):
+        """Convert raw records to the stored column types.
+
+        Dates are kept as datetime64, region/product as categoricals over
+        the known values and IDs as their numbers, so filtering never has to
+        parse or hash strings.
+        """
+        df = df.copy()
+        df['date'] = pd.to_datetime(df['date']).astype('datetime64[ns]')
+        df['region'] = pd.Categorical(df['region'], categories=sorted(self.regions))
+        df['product'] = pd.Categorical(df['product'], categories=sorted(self.products))
+        for name, prefix in ID_PREFIXES.items():
+            df[name] = _id_numbers(df[name], prefix)
+        return df
 
-        data = []
 
-        for _ in range(num_records):
-            # Random date in range
-            random_date = start_date + timedelta(
-                days=np.random.randint(0, (end_date - start_date).days)
-            )
+class DataGenerator(SalesBackend):
+    """Sales rows in a NumPy column store with a rollup cube (the default backend).
+
+    The store is kept in data_dir across restarts. Without one, store_dir
+    puts its column files somewhere other processes can map them (see
+    PartitionedAggregator) but the rows are still regenerated every start.
+    """
+
+    def __init__(self, num_records=5000, seed=42, distinct_mode='exact', hll_error=0.02,
+                 data_dir=None, source=None, quantile_error=0.01, store_dir=None, date_window_days=None):
+        super().__init__(date_window_days)
+        self.data_dir = data_dir
+        self.store_dir = data_dir or store_dir
+
+        cube = None
+        # Processes starting together on an empty directory must not all create the store
+        with ColumnStore.lock(data_dir):
+            if data_dir and ColumnStore.exists(data_dir):
+                # Sample data is only generated (or a file loaded) the first time a directory is used
+                self.store = ColumnStore.open(data_dir)
+            elif source:
+                cube = RollupCube(self.regions, self.products, distinct_mode, hll_error, quantile_error)
+                self.store = self.load_file(source, cube)
+            else:
+                # Rows are stored in date order so date filters are binary searches
+                self.store = ColumnStore.from_frame(
+                    self.generate_sample_data(num_records, seed=seed),
+                    categories=self.categories,
+                    sort_key='date',
+                    path=self.store_dir
+                )
+
+            # A saved cube only needs the rows appended after it was checkpointed
+            if cube is None and data_dir:
+                cube = RollupCube.load(self._cube_file(), self.regions, self.products,
+                                       distinct_mode, hll_error, quantile_error)
+            if cube is None or cube.row_count > len(self.store):
+                cube = RollupCube(self.regions, self.products, distinct_mode, hll_error, quantile_error)
+            self._fold_rows(cube, cube.row_count, len(self.store))
+
+            # Readers pin the published snapshot; writes publish a new one under _writer
+            self._writer = threading.Lock()
+            self.snapshot = Snapshot(self.store, len(self.store), cube, version=0)
+            if data_dir:
+                self.checkpoint()
+
+    @property
+    def cube(self):
+        return self.snapshot.cube
+
+    @property
+    def persistent(self):
+        return bool(self.data_dir)
+
+    def load_file(self, path, cube, chunk_rows=500_000):
+        """Stream a sales file (see SalesFileReader) into a new column store.
+
+        Each chunk is folded into cube as soon as it is stored, so the file
+        is read once, and progress is reported on stderr as chunks arrive.
+        """
+        reader = SalesFileReader(path, self.regions, self.products, chunk_rows, self.date_window_days)
+        started = time.perf_counter()
+
+        def fold(store, chunk, start):
+            cube.add(chunk, store.column('customer_id')[start:])
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(f'Loading {path}: {reader.rows_read:,} rows ({reader.fraction_read:.0%}), '
+                  f'{reader.rows_read / elapsed:,.0f} rows/s', file=sys.stderr, flush=True)
+
+        return ColumnStore.from_chunks(
+            reader,
+            categories=self.categories,
+            sort_key='date',
+            path=self.store_dir,
+            on_append=fold
+        )
+
+    def get_row_selection(self, filters=None):
+        return self.snapshot.get_row_selection(filters)
+
+    def get_filtered_index(self, filters=None):
+        return self.snapshot.get_filtered_index(filters)
+
+    def append_records(self, df):
+        """Append typed records and publish a snapshot that includes them.
+
+        Only the new rows are touched: the store appends into spare capacity
+        past what any snapshot can see, and a copy-on-write copy of the cube
+        adds their totals to the affected cells. Returns the new snapshot.
+        """
+        with self._writer, self.store.write_lock():
+            # Rows other processes wrote must land in the cube before ours
+            self._refresh()
+            start = len(self.store)
+            # A batch the cube rejects must not stay in the store either
+            with self.store.transaction():
+                self.store.append(df)
+                cube = self.snapshot.cube.copy()
+                cube.add(df, self.store.column('customer_id')[start:])
+            self._publish(cube)
+        return self.snapshot
+
+    def refresh(self):
+        """Fold in rows that other processes appended to a shared store"""
+        # Readers never wait for a writer; they keep the snapshot they have
+        if self.store.stale() and self._writer.acquire(blocking=False):
+            try:
+                self._refresh()
+            finally:
+                self._writer.release()
+
+    def _refresh(self):
+        start, end = self.store.refresh()
+        if end > start:
+            cube = self.snapshot.cube.copy()
+            self._fold_rows(cube, start, end)
+            self._publish(cube)
+
+    def _fold_rows(self, cube, start, end):
+        if end > start:
+            cube.add(self.store.frame(end).iloc[start:end], self.store.column('customer_id')[start:end])
+
+    def _publish(self, cube):
+        self._set_snapshot(Snapshot(self.store, len(self.store), cube, self.snapshot.version + 1))
+
+    def _cube_file(self):
+        return os.path.join(self.data_dir, 'cube.npz')
+
+    def checkpoint(self):
+        """Save the cube next to the store so restarts don't rebuild it"""
+        if self.data_dir:
+            self.snapshot.cube.save(self._cube_file())
+
+    def memory_usage(self):
+        """Bytes of column data in use and allocated, label dictionaries and the current cube"""
+        store = self.store.memory_usage()
+        return {
+            'columns_used': store['used'],
+            'columns_allocated': store['allocated'],
+            'labels': store['labels'],
+            'cube': self.snapshot.cube.nbytes
+        }
+
+
+class Snapshot:
+    """Immutable view of the dataset as of one version.
+
+    The writer publishes the row count and cube together. Rows appended
+    later lie past size and are never read through the snapshot, and a
+    published cube is never modified, so a reader holding a snapshot sees
+    one consistent state however many writes happen meanwhile.
+    """
+
+    # /api/data engines this snapshot can serve
+    ENGINES = ('cube', 'fused', 'rows')
+    # Batches share one fused scan once their filter sets select this many times the rows of their union
+    SHARED_SCAN_OVERLAP = 1.0
+
+    def __init__(self, store, size, cube, version):
+        self.store = store
+        self.size = size
+        self.cube = cube
+        self.version = version
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def data(self):
+        """The snapshot's rows as a read-only DataFrame over the column store"""
+        return self.store.frame(self.size)
+
+    def column(self, name):
+        return self.store.column(name)[:self.size]
+
+    def get_row_selection(self, filters=None):
+        """Rows matching the filters.
+
+        The date range is found by binary search over the date-sorted store,
+        so only the rows inside it are compared against region/product
+        filters. Returns a slice when the rows are contiguous, otherwise an
+        ascending array of positions.
+        """
+        return select_labels(self.store, self.date_rows(filters), filters)
+
+    def date_rows(self, filters=None):
+        """Rows inside the filters' date range, as key_range() returns them"""
+        filters = filters or FilterSpec()
+        low = None if filters.start is None else np.datetime64(filters.start, 'ns')
+        high = None if filters.end is None else np.datetime64(filters.end + 1, 'ns')
+        return self.store.key_range(low, high, self.size)
+
+    def get_filtered_index(self, filters=None):
+        """Positions of the rows matching the filters"""
+        rows = self.get_row_selection(filters)
+        if isinstance(rows, slice):
+            return np.arange(rows.start, rows.stop)
+        return rows
+
+    def get_filtered_data(self, filters=None):
+        """Filter data based on parameters.
+
+        Without filters the stored frame itself is returned, so callers must
+        treat the result as read-only.
+        """
+        df = self.data
+        rows = self.get_row_selection(filters)
+        if isinstance(rows, slice) and rows == slice(0, len(df)):
+            return df
+        return df.iloc[rows]
+
+    def count(self, filters=None):
+        """Number of rows matching the filters"""
+        rows = self.get_row_selection(filters)
+        return rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+
+    def date_span(self):
+        """First and last day with rows, as datetime64[D], or None without rows"""
+        cube = self.cube
+        if cube.num_days == 0:
+            return None
+        return cube.start_day, cube.start_day + cube.num_days - 1
+
+    def iter_chunks(self, filters=None, chunk_rows=100_000):
+        """Matching rows as DataFrames of at most chunk_rows rows (always at least one)"""
+        df = self.data
+        rows = self.get_row_selection(filters)
+        if isinstance(rows, slice):
+            for start in range(rows.start, max(rows.stop, rows.start + 1), chunk_rows):
+                yield df.iloc[start:min(start + chunk_rows, rows.stop)]
+        else:
+            for start in range(0, max(len(rows), 1), chunk_rows):
+                yield df.take(rows[start:start + chunk_rows])
+
+    def dashboard_data(self, filters=None, granularity='day'):
+        """Metrics and chart data for the filters, read off the rollup cube"""
+        return cube_dashboard_data(self.cube, filters, granularity)
+
+    def batch_dashboard_data(self, filter_sets, granularity='day', engine='cube'):
+        """dashboard_data for each of filter_sets, sharing the work between them.
+
+        The cube engine reads each off the snapshot's cube. 'fused' finds
+        and scans the rows matching any of the filter sets once, into one
+        throwaway cube with a distinct index that each filter set is then a
+        slice of; 'rows' runs the per-chart builders for each.
+        """
+        if engine == 'rows':
+            return [build_dashboard_data(self.get_filtered_data(filters), granularity)
+                    for filters in filter_sets]
+        if engine == 'cube':
+            return [cube_dashboard_data(self.cube, filters, granularity) for filters in filter_sets]
+
+        union = FilterSpec.union(filter_sets)
+        # The shared scan also indexes distinct customers, which costs more per row than
+        # a single pass; with little overlap, scanning each set's own rows is cheaper
+        if sum(map(self.cube.count, filter_sets)) < self.SHARED_SCAN_OVERLAP * self.cube.count(union):
+            return [self._fused_dashboard_data(filters, granularity) for filters in filter_sets]
+        cube, _ = self._fused_cube(union, distinct_mode='exact')
+        return [cube_dashboard_data(cube, filters, granularity) for filters in filter_sets]
+
+    def _fused_cube(self, filters, distinct_mode=None):
+        """Throwaway cube over the rows matching the filters, and their distinct customers.
+
+        Large date ranges are split across the aggregator's worker processes
+        when it has any, otherwise the rows are scanned here.
+        """
+        rows = self.date_rows(filters)
+        if aggregator.accepts(self.store, rows):
+            with metrics.stage('partitioned_aggregate', rows=self.cube.count(filters)):
+                return aggregator.aggregate(self.store, rows, filters, distinct_mode)
+
+        with metrics.stage('filter') as stage:
+            rows = select_labels(self.store, rows, filters)
+            stage.rows = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+        with metrics.stage('fused_kernel', rows=self.cube.count(filters)):
+            cube = fused_cube(self.store, rows, distinct_mode)
+            if distinct_mode:
+                return cube, cube.distinct_customers()
+            return cube, _count_distinct(self.store.column('customer_id')[rows])
+
+    def _fused_dashboard_data(self, filters, granularity):
+        cube, unique_customers = self._fused_cube(filters)
+        cube_data = cube.dashboard_data(granularity=granularity)
+        return {
+            'metrics': calculate_metrics(
+                cube_data['total_sales'], cube_data['total_orders'], unique_customers
+            ),
+            'charts': cube_data['charts']
+        }
+
+    def stats(self, filters=None, percentiles=()):
+        """Summary statistics over the rows matching the filters.
+
+        They are read off the cube when it keeps sales sketches (median and
+        percentiles then within its quantile_error), otherwise computed from
+        the rows.
+        """
+        if self.cube.quantile_error:
+            with metrics.stage('stats_sketch'):
+                return self.cube.stats(filters, percentiles)
+
+        with metrics.stage('stats_rows') as stage:
+            df = self.get_filtered_data(filters)
+            stage.rows = len(df)
+            sales = df['sales']
+            empty = len(df) == 0
+            return {
+                'total_records': len(df),
+                'date_range': {
+                    'start': None if empty else df['date'].min().strftime('%Y-%m-%d'),
+                    'end': None if empty else df['date'].max().strftime('%Y-%m-%d')
+                },
+                'regions': df['region'].value_counts().to_dict(),
+                'products': df['product'].value_counts().to_dict(),
+                'sales_stats': {
+                    'min': None if empty else sales.min(),
+                    'max': None if empty else sales.max(),
+                    'mean': None if empty else sales.mean(),
+                    'median': None if empty else sales.median(),
+                    'percentiles': {
+                        _percentile_label(p): None if empty else sales.quantile(p / 100) for p in percentiles
+                    }
+                }
+            }
 
-            # Seasonal patterns
-            month = random_date.month
-            seasonal_multiplier = 1.0
-            if month in [11, 12]:  # Holiday season
-                seasonal_multiplier = 1.5
-            elif month in [6, 7, 8]:  # Summer
-                seasonal_multiplier = 1.2
-
-            # Regional patterns
-            region = np.random.choice(self.regions)
-            region_multiplier = {
-                'North': 1.1, 'South': 0.9, 'East': 1.2, 'West': 1.0
-            }[region]
-
-            # Product patterns
-            product = np.random.choice(self.products)
-            base_price = {
-                'Electronics': 500, 'Clothing': 80,
-                'Home & Garden': 150, 'Sports': 120
-            }[product]
-
-            # Calculate sales with patterns
-            base_sales = base_price * (0.5 + np.random.random() * 2)
-            sales = base_sales * seasonal_multiplier * region_multiplier
-
-            data.append({
-                'date': random_date.strftime('%Y-%m-%d'),
-                'region': region,
-                'product': product,
-                'sales': round(sales, 2),
-                'orders': np.random.randint(1, 6),
-                'customers': np.random.randint(20, 101),
-                'customer_id': f'CUST_{np.random.randint(1000, 9999)}',
-                'order_id': f'ORD_{np.random.randint(10000, 99999)}'
+
+class SqliteBackend(SalesBackend):
+    """Sales rows in an embedded SQLite database, with filters and aggregates run as SQL.
+
+    Dates are stored as day numbers and region/product as codes into the
+    sorted labels. A covering index on (day, region, product, measures,
+    customer_id) answers date-range aggregates from the index alone, and
+    indexes led by region and product serve selective label filters. Only
+    aggregated groups leave the database, so the dataset can be larger than
+    memory. Rows are never updated or deleted, which lets a snapshot be
+    just an id bound (see SqlSnapshot).
+
+    Connections are per thread and the database runs in WAL mode, so
+    readers never block the writer, including writers in other processes.
+    """
+
+    COLUMNS = ('day', 'region', 'product', 'sales', 'orders', 'customers', 'customer_id', 'order_id')
+    SCHEMA = """
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY,
+            day INTEGER NOT NULL,
+            region INTEGER NOT NULL,
+            product INTEGER NOT NULL,
+            sales REAL NOT NULL,
+            orders INTEGER NOT NULL,
+            customers INTEGER NOT NULL,
+            customer_id INTEGER NOT NULL,
+            order_id INTEGER NOT NULL
+        )
+    """
+    INDEXES = (
+        'CREATE INDEX sales_cells ON sales (day, region, product, sales, orders, customers, customer_id)',
+        'CREATE INDEX sales_region ON sales (region, day)',
+        'CREATE INDEX sales_product ON sales (product, day)',
+        'CREATE INDEX sales_amount ON sales (sales)'
+    )
+
+    def __init__(self, path, num_records=5000, seed=42, source=None, chunk_rows=500_000, date_window_days=None):
+        super().__init__(date_window_days)
+        self.path = path
+        self._local = threading.local()
+        self._writer = threading.Lock()
+
+        connection = self.connection()
+        connection.execute('PRAGMA journal_mode = WAL')
+        # The first process to get here loads the data; the others wait and then just open it
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if not connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'sales'").fetchone():
+                connection.execute(self.SCHEMA)
+                if source:
+                    chunks = SalesFileReader(source, self.regions, self.products, chunk_rows, date_window_days)
+                else:
+                    chunks = self.iter_sample_chunks(num_records, seed)
+                for chunk in chunks:
+                    self._insert(chunk)
+                # Indexing once after the bulk load is far cheaper than row by row
+                for statement in self.INDEXES:
+                    connection.execute(statement)
+                connection.execute('ANALYZE')
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self.snapshot = SqlSnapshot(self, self._last_id(), version=0)
+
+    @property
+    def persistent(self):
+        return True
+
+    def connection(self):
+        """This thread's connection (sqlite3 connections can't be shared between threads)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Transactions are explicit: isolation_level=None leaves them to BEGIN/COMMIT
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def _last_id(self):
+        return self.query('SELECT COALESCE(MAX(id), 0) FROM sales')[0][0]
+
+    def _insert(self, df):
+        days = df['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        codes = [
+            pd.Categorical(df[name], categories=self.categories[name]).codes
+            for name in ('region', 'product')
+        ]
+        rows = zip(
+            days.tolist(), codes[0].tolist(), codes[1].tolist(),
+            df['sales'].tolist(), df['orders'].tolist(), df['customers'].tolist(),
+            np.asarray(df['customer_id']).tolist(), np.asarray(df['order_id']).tolist()
+        )
+        self.connection().executemany(
+            f'INSERT INTO sales ({", ".join(self.COLUMNS)}) VALUES ({", ".join("?" * len(self.COLUMNS))})',
+            rows
+        )
+
+    def append_records(self, df):
+        """Insert typed records in one transaction and publish a snapshot that includes them"""
+        connection = self.connection()
+        with self._writer:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._insert(df)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            self._publish(self._last_id())
+        return self.snapshot
+
+    def refresh(self):
+        """Publish rows that other processes inserted"""
+        if self._writer.acquire(blocking=False):
+            try:
+                last_id = self._last_id()
+                if last_id > self.snapshot.size:
+                    self._publish(last_id)
+            finally:
+                self._writer.release()
+
+    def _publish(self, size):
+        self._set_snapshot(SqlSnapshot(self, size, self.snapshot.version + 1))
+
+    def checkpoint(self):
+        """Fold the write-ahead log back into the database file"""
+        self.connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def memory_usage(self):
+        """Bytes of the database file and its write-ahead log (pages are cached by the OS)"""
+        wal = f'{self.path}-wal'
+        return {
+            'database': os.path.getsize(self.path),
+            'wal': os.path.getsize(wal) if os.path.exists(wal) else 0
+        }
+
+    def to_frame(self, df):
+        """Rows as read from the table, converted back to the stored column types"""
+        days = df['day'].to_numpy(dtype=np.int64).astype('datetime64[D]')
+        return pd.DataFrame({
+            'date': days.astype('datetime64[ns]'),
+            'region': _categorical(df['region'].to_numpy(dtype=np.int8), self.categories['region']),
+            'product': _categorical(df['product'].to_numpy(dtype=np.int8), self.categories['product']),
+            'sales': df['sales'].to_numpy(dtype=np.float64),
+            **{
+                name: pd.to_numeric(df[name].to_numpy(dtype=np.int64), downcast='integer')
+                for name in ('orders', 'customers', 'customer_id', 'order_id')
+            }
+        })
+
+
+class SqlSnapshot:
+    """Rows of a SqliteBackend as of one version: those with id <= size.
+
+    Ids only grow and rows are never changed, so the bound alone pins a
+    consistent view however many rows are inserted meanwhile. Every
+    statement adds it to its WHERE clause, next to the filters.
+    """
+
+    ENGINES = ('cube', 'rows')
+
+    def __init__(self, backend, size, version):
+        self.backend = backend
+        self.size = size
+        self.version = version
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def data(self):
+        return self.get_filtered_data()
+
+    def _where(self, filters=None):
+        """WHERE clause and parameters for the filters within this snapshot"""
+        filters = filters or FilterSpec()
+        clauses, params = ['id <= ?'], [self.size]
+        if filters.start is not None:
+            clauses.append('day >= ?')
+            params.append(int(filters.start.astype(np.int64)))
+        if filters.end is not None:
+            clauses.append('day <= ?')
+            params.append(int(filters.end.astype(np.int64)))
+        for name, labels in (('region', filters.regions), ('product', filters.products)):
+            if labels is None:
+                continue
+            categories = self.backend.categories[name]
+            codes = [categories.index(label) for label in labels if label in categories]
+            clauses.append(f'{name} IN ({", ".join("?" * len(codes))})')
+            params.extend(codes)
+        return ' AND '.join(clauses), params
+
+    def _select(self, filters=None, chunk_rows=None):
+        where, params = self._where(filters)
+        sql = f'SELECT {", ".join(SqliteBackend.COLUMNS)} FROM sales WHERE {where} ORDER BY id'
+        return pd.read_sql_query(sql, self.backend.connection(), params=params, chunksize=chunk_rows)
+
+    def get_filtered_data(self, filters=None):
+        """Matching rows as a DataFrame (read into memory, so meant for small selections)"""
+        return self.backend.to_frame(self._select(filters))
+
+    def count(self, filters=None):
+        where, params = self._where(filters)
+        return self.backend.query(f'SELECT COUNT(*) FROM sales WHERE {where}', params)[0][0]
+
+    def date_span(self):
+        """First and last day with rows, as datetime64[D], or None without rows"""
+        first, last = self.backend.query('SELECT MIN(day), MAX(day) FROM sales WHERE id <= ?', [self.size])[0]
+        if first is None:
+            return None
+        return np.datetime64(first, 'D'), np.datetime64(last, 'D')
+
+    def iter_chunks(self, filters=None, chunk_rows=100_000):
+        """Matching rows as DataFrames of at most chunk_rows rows (always at least one)"""
+        empty = True
+        for chunk in self._select(filters, chunk_rows):
+            empty = False
+            yield self.backend.to_frame(chunk)
+        if empty:
+            yield self.backend.to_frame(self._select(filters).iloc[:0])
+
+    def dashboard_data(self, filters=None, granularity='day'):
+        """Metrics and chart data for the filters.
+
+        The database groups the matching rows into (day, region, product)
+        cells, which are summed into a throwaway RollupCube that lays out
+        the charts exactly as the pandas backend's cube does.
+        """
+        return self.batch_dashboard_data([filters or FilterSpec()], granularity)[0]
+
+    def batch_dashboard_data(self, filter_sets, granularity='day', engine='cube'):
+        """dashboard_data for each of filter_sets.
+
+        One GROUP BY over the rows matching any of the filter sets fills the
+        cube each filter set is a slice of; distinct customers are counted
+        by the database per filter set. 'rows' reads each set's rows instead.
+        """
+        if engine == 'rows':
+            return [build_dashboard_data(self.get_filtered_data(filters), granularity)
+                    for filters in filter_sets]
+        where, params = self._where(FilterSpec.union(filter_sets))
+        with metrics.stage('sql_aggregate') as stage:
+            cells = self.backend.query(
+                'SELECT day, region, product, SUM(sales), SUM(orders), SUM(customers), COUNT(*) '
+                f'FROM sales WHERE {where} GROUP BY day, region, product', params
+            )
+            stage.rows = len(cells)
+        with metrics.stage('cube'):
+            cube = RollupCube(self.backend.regions, self.backend.products, distinct_mode=None)
+            if cells:
+                columns = np.array(cells, dtype=np.float64).T
+                cube.add_codes(
+                    columns[0].astype(np.int64).astype('datetime64[D]'),
+                    columns[1].astype(np.int64), columns[2].astype(np.int64),
+                    dict(zip(('sales', 'orders', 'customers', 'rows'), columns[3:]))
+                )
+
+        results = []
+        for filters in filter_sets:
+            where, params = self._where(filters)
+            with metrics.stage('sql_distinct'):
+                unique_customers = self.backend.query(
+                    f'SELECT COUNT(DISTINCT customer_id) FROM sales WHERE {where}', params
+                )[0][0]
+            with metrics.stage('cube'):
+                cube_data = cube.dashboard_data(filters, granularity)
+            results.append({
+                'metrics': calculate_metrics(
+                    cube_data['total_sales'], cube_data['total_orders'], unique_customers
+                ),
+                'charts': cube_data['charts']
             })
+        return results
+
+    def stats(self, filters=None, percentiles=()):
+        """Summary statistics over the rows matching the filters, each computed by the database"""
+        where, params = self._where(filters)
+        query = self.backend.query
+        total, first, last, low, high, mean = query(
+            f'SELECT COUNT(*), MIN(day), MAX(day), MIN(sales), MAX(sales), AVG(sales) FROM sales WHERE {where}',
+            params
+        )[0]
+        # Median: the middle one or two values, walked to along the index on sales
+        middle = query(
+            f'SELECT sales FROM sales WHERE {where} ORDER BY sales LIMIT ? OFFSET ?',
+            params + [2 - total % 2, max(total - 1, 0) // 2]
+        )
+
+        def percentile(p):
+            # Nearest rank, as read off the sketches of the pandas backend
+            found = query(f'SELECT sales FROM sales WHERE {where} ORDER BY sales LIMIT 1 OFFSET ?',
+                          params + [int(p / 100 * (total - 1))])
+            return found[0][0] if found else None
+
+        def counts(name):
+            found = dict(query(f'SELECT {name}, COUNT(*) FROM sales WHERE {where} GROUP BY {name}', params))
+            labels = self.backend.categories[name]
+            counted = {label: found.get(code, 0) for code, label in enumerate(labels)}
+            return dict(sorted(counted.items(), key=lambda item: -item[1]))
+
+        def date(day):
+            return None if day is None else str(np.datetime64(day, 'D'))
+
+        return {
+            'total_records': total,
+            'date_range': {'start': date(first), 'end': date(last)},
+            'regions': counts('region'),
+            'products': counts('product'),
+            'sales_stats': {
+                'min': low,
+                'max': high,
+                'mean': mean,
+                'median': float(np.mean([value for value, in middle])) if middle else None,
+                'percentiles': {_percentile_label(p): percentile(p) for p in percentiles}
+            }
+        }
+
+
+class LabelDictionary:
+    """Interns labels (strings or numbers) to dense integer codes in first-seen order.
+
+    With a path, new labels are appended to a file (one JSON string per
+    line) so the codes stay valid across restarts.
+    """
+
+    def __init__(self, path=None, count=0):
+        self.labels = []
+        self._codes = {}
+        self._dtype = None
+        self.path = path
+        if path:
+            open(path, 'ab').close()
+            self.load(count, truncate=True)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def nbytes(self):
+        """Estimated bytes of the labels, their list and the code lookup"""
+        return sys.getsizeof(self.labels) + sys.getsizeof(self._codes) + sum(map(sys.getsizeof, self.labels))
+
+    @property
+    def dtype(self):
+        """Categorical dtype over the current labels, cached until new ones arrive"""
+        if self._dtype is None or len(self._dtype.categories) != len(self.labels):
+            self._dtype = pd.CategoricalDtype(self.labels)
+        return self._dtype
+
+    def load(self, count, truncate=False):
+        """Read the first count labels from the file.
+
+        With truncate, anything after them (labels from an append that was
+        never committed) is cut off so later codes line up again.
+        """
+        with open(self.path, 'r+b') as f:
+            lines = f.read().split(b'\n')[:count]
+            new_labels = json.loads(b'[' + b','.join(lines[len(self.labels):]) + b']')
+            self._codes.update(zip(new_labels, range(len(self.labels), count)))
+            self.labels.extend(new_labels)
+            if truncate:
+                f.truncate(sum(len(line) + 1 for line in lines))
+
+    def truncate(self, count):
+        """Forget every label after the first count (those of an append being rolled back)"""
+        for label in self.labels[count:]:
+            del self._codes[label]
+        del self.labels[count:]
+        if self.path:
+            with open(self.path, 'r+b') as f:
+                f.truncate(sum(len(line) + 1 for line in f.read().split(b'\n')[:count]))
+
+    def _add(self, label):
+        code = self._codes[label] = len(self.labels)
+        self.labels.append(label)
+        return code
+
+    def encode(self, values):
+        """Integer codes for an array of labels, adding unseen labels"""
+        # Only the distinct labels of the batch go through the Python dict
+        inverse, uniques = pd.factorize(values)
+        lookup = np.empty(len(uniques), dtype=np.int32)
+        new_labels = []
+        # tolist() turns NumPy scalars into plain values that JSON can write
+        for i, label in enumerate(np.asarray(uniques).tolist()):
+            code = self._codes.get(label)
+            if code is None:
+                code = self._add(label)
+                new_labels.append(label)
+            lookup[i] = code
+        if self.path and new_labels:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(label) + '\n' for label in new_labels)
+        return lookup[inverse]
+
+
+class ColumnStore:
+    """Append-optimized columnar storage.
+
+    Each column lives in a NumPy buffer that doubles in capacity when full,
+    so appending k rows costs amortized O(k) however many rows are stored.
+    Categorical columns are stored as integer codes, and dictionary columns
+    as codes into a LabelDictionary that grows as new labels arrive. Integer
+    columns, dictionary codes included, are widened if appended values
+    don't fit their type.
+
+    With a path, every column is a memory-mapped .npy file and the row count
+    is committed to meta.json after each append. Processes that open the
+    same directory share the page cache, and appends survive restarts.
+    Grown or widened columns are written to new files, which replace the
+    old ones only when the append commits.
+
+    A sort_key column is expected to arrive in non-decreasing order, so range
+    lookups on it are binary searches over the column itself. If an append
+    breaks that order, lookups go through a sorted index of the column that
+    is merged with newly appended rows on demand.
+    """
+
+    MIN_CAPACITY = 1024
+
+    def __init__(self, schema, categories, dictionary_columns=(), sort_key=None, path=None):
+        self.schema = {name: np.dtype(dtype) for name, dtype in schema.items()}
+        self.categories = categories
+        self.sort_key = sort_key
+        self.is_sorted = True
+        self.path = path
+        self._size = 0
+        self._sort_index = None
+        self._frame = None
+        self._meta_mtime = None
+        self._transaction = False
+        # Inode of each mapped column file, and columns rewritten to .tmp files since the last commit
+        self._inodes = {}
+        self._pending = set()
+        if path:
+            os.makedirs(path, exist_ok=True)
+        self.dictionaries = {
+            name: LabelDictionary(self._file(f'{name}.labels'))
+            for name in dictionary_columns
+        }
+        self._buffers = {
+            name: self._allocate(name, dtype, self.MIN_CAPACITY)
+            for name, dtype in self.schema.items()
+        }
+
+    @classmethod
+    def from_frame(cls, df, categories, dictionary_columns=(), sort_key=None, path=None):
+        """New store holding the rows of a typed frame, ordered by sort_key if given"""
+        return cls.from_chunks([df], categories, dictionary_columns, sort_key, path)
+
+    @classmethod
+    def from_chunks(cls, chunks, categories, dictionary_columns=(), sort_key=None, path=None,
+                    on_append=None):
+        """New store holding the rows of typed frames, ordered by sort_key if given.
+
+        The schema comes from the first chunk. on_append(store, chunk, start)
+        is called after each chunk is stored from row start, while rows are
+        still in arrival order; the rows are sorted once all chunks are in.
+        """
+        store = None
+        for df in chunks:
+            if store is None:
+                schema = {}
+                for name in df.columns:
+                    if name in categories:
+                        schema[name] = np.int8 if len(categories[name]) < 128 else np.int32
+                    elif name in dictionary_columns:
+                        schema[name] = np.int16
+                    else:
+                        schema[name] = df[name].dtype
+                store = cls(schema, categories, dictionary_columns, sort_key, path)
+            start = len(store)
+            store.append(df)
+            if on_append:
+                on_append(store, df, start)
+        if store is None:
+            raise ValueError('A store needs at least one (possibly empty) chunk')
+        if not store.is_sorted:
+            store._sort_rows()
+        return store
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, 'meta.json'))
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a store previously written to path"""
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        store = cls.__new__(cls)
+        store.schema = {name: np.dtype(dtype) for name, dtype in meta['schema'].items()}
+        store.categories = meta['categories']
+        store.sort_key = meta.get('sort_key')
+        store.is_sorted = meta.get('sorted', False)
+        store.path = path
+        store.dictionaries = {
+            name: LabelDictionary(store._file(f'{name}.labels'), count)
+            for name, count in meta['dictionaries'].items()
+        }
+        store._size = meta['size']
+        store._sort_index = None
+        store._frame = None
+        store._meta_mtime = os.stat(os.path.join(path, 'meta.json')).st_mtime_ns
+        store._transaction = False
+        store._inodes = {}
+        store._pending = set()
+        store._buffers = {name: store._map(name) for name in store.schema}
+        return store
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(next(iter(self._buffers.values())))
+
+    def _file(self, filename):
+        return os.path.join(self.path, filename) if self.path else None
+
+    def _allocate(self, name, dtype, capacity):
+        if not self.path:
+            return np.empty(capacity, dtype=dtype)
+        if dtype.kind == 'O':
+            raise TypeError(f'Column {name} must be numeric or dictionary-encoded to be stored on disk')
+        buffer = np.lib.format.open_memmap(self._file(f'{name}.npy'), mode='w+', dtype=dtype, shape=(capacity,))
+        self._inodes[name] = os.stat(self._file(f'{name}.npy')).st_ino
+        return buffer
+
+    def _map(self, name):
+        target = self._file(f'{name}.npy')
+        # The inode first: if the file is replaced meanwhile, the next refresh maps it again
+        self._inodes[name] = os.stat(target).st_ino
+        return np.load(target, mmap_mode='r+')
+
+    def _moved(self):
+        """Whether another process replaced a column file since it was mapped here"""
+        return any(os.stat(self._file(f'{name}.npy')).st_ino != inode for name, inode in self._inodes.items())
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * self.capacity)
+        for name, buffer in self._buffers.items():
+            self._rewrite(name, buffer.dtype, capacity)
+
+    def _rewrite(self, name, dtype, capacity):
+        """Move a column's stored rows to a new buffer of the given type and capacity"""
+        buffer = self._buffers[name]
+        if self.path:
+            # Fill a new file; _commit swaps it in, so the committed file never
+            # holds rows of an append that is rolled back
+            target = self._file(f'{name}.npy')
+            if name in self._pending:
+                # buffer maps the .tmp file itself; unlinking it keeps that mapping valid
+                os.remove(target + '.tmp')
+            rewritten = np.lib.format.open_memmap(target + '.tmp', mode='w+', dtype=dtype, shape=(capacity,))
+            rewritten[:self._size] = buffer[:self._size]
+            self._pending.add(name)
+        else:
+            rewritten = np.empty(capacity, dtype=dtype)
+            rewritten[:self._size] = buffer[:self._size]
+        self._buffers[name] = rewritten
+        self.schema[name] = np.dtype(dtype)
+
+    def _fit(self, name, values):
+        """Widen an integer column whose type can't hold values (assignment would wrap)"""
+        dtype = self.schema[name]
+        if dtype.kind not in 'iu' or values.dtype.kind not in 'iu' or not len(values):
+            return
+        low, high = values.min(), values.max()
+        limits = np.iinfo(dtype)
+        if low < limits.min or high > limits.max:
+            # Smallest signed type holding both the stored and the new values
+            wanted = next(candidate for candidate in (np.int16, np.int32, np.int64)
+                          if np.iinfo(candidate).min <= low and high <= np.iinfo(candidate).max)
+            self._rewrite(name, np.promote_types(dtype, wanted), self.capacity)
+
+    def append(self, df):
+        """Copy the rows of a typed frame into the buffers"""
+        needed = self._size + len(df)
+        if needed > self.capacity:
+            self._grow(needed)
+        if self.sort_key and self.is_sorted and len(df):
+            self._check_order(df[self.sort_key].to_numpy())
+
+        for name in self.schema:
+            column = df[name]
+            if name in self.categories:
+                values = pd.Categorical(column, categories=self.categories[name]).codes
+            elif name in self.dictionaries:
+                values = self.dictionaries[name].encode(column.array)
+                self._fit(name, values)
+            else:
+                values = column.to_numpy()
+                self._fit(name, values)
+            self._buffers[name][self._size:needed] = values
+
+        self._size = needed
+        self._frame = None
+        if self.path and not self._transaction:
+            self._commit()
+
+    @contextmanager
+    def transaction(self):
+        """Appends in the body are committed together at the end, or undone if it raises.
+
+        Rows past the committed size are never read, so undoing is forgetting
+        them and the labels they added, and going back to the buffers from
+        before any grow or widen (whose new files were never swapped in).
+        """
+        size, is_sorted = self._size, self.is_sorted
+        buffers, schema = dict(self._buffers), dict(self.schema)
+        labels = {name: len(dictionary) for name, dictionary in self.dictionaries.items()}
+        self._transaction = True
+        try:
+            yield
+        except BaseException:
+            self._size, self.is_sorted, self._frame = size, is_sorted, None
+            self._buffers, self.schema = buffers, schema
+            for name in self._pending:
+                os.remove(self._file(f'{name}.npy.tmp'))
+            self._pending = set()
+            if self._sort_index is not None and self._sort_index[2] > size:
+                self._sort_index = None
+            for name, count in labels.items():
+                self.dictionaries[name].truncate(count)
+            raise
+        finally:
+            self._transaction = False
+        if self.path:
+            self._commit()
+
+    def _check_order(self, values):
+        """Clear is_sorted if appending values would break the sort key order"""
+        previous = self._buffers[self.sort_key][self._size - 1] if self._size else values[0]
+        if values[0] < previous or np.any(values[1:] < values[:-1]):
+            self.is_sorted = False
+
+    def _sort_rows(self):
+        """Reorder the stored rows by the sort key, before anyone has read them"""
+        # Sorting the encoded buffers avoids shuffling string columns
+        order = np.argsort(self._buffers[self.sort_key][:self._size], kind='stable')
+        for buffer in self._buffers.values():
+            buffer[:self._size] = buffer[:self._size][order]
+        self.is_sorted = True
+        if self.path:
+            self._commit()
+
+    def _commit(self):
+        """Flush the columns, swap in rewritten column files, then publish the new row count"""
+        for buffer in self._buffers.values():
+            buffer.flush()
+        for name in sorted(self._pending):
+            target = self._file(f'{name}.npy')
+            # Existing mappings of the old file stay valid
+            os.replace(target + '.tmp', target)
+            self._inodes[name] = os.stat(target).st_ino
+        self._pending = set()
+        meta = {
+            'size': self._size,
+            'schema': {name: dtype.str for name, dtype in self.schema.items()},
+            'categories': self.categories,
+            'sort_key': self.sort_key,
+            'sorted': self.is_sorted,
+            'dictionaries': {name: len(labels) for name, labels in self.dictionaries.items()}
+        }
+        target = self._file('meta.json')
+        with open(target + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(target + '.tmp', target)
+        self._meta_mtime = os.stat(target).st_mtime_ns
+
+    def stale(self):
+        """Whether another process has committed since this store last looked"""
+        return bool(self.path) and os.stat(self._file('meta.json')).st_mtime_ns != self._meta_mtime
+
+    def refresh(self):
+        """Pick up rows appended by other processes; returns (old_size, new_size)"""
+        old_size = self._size
+        if not self.path:
+            return old_size, old_size
+        meta_path = self._file('meta.json')
+        # Appending through a mapping of a replaced file would write rows nobody reads
+        moved = self._moved()
+        if os.stat(meta_path).st_mtime_ns == self._meta_mtime and not moved:
+            return old_size, old_size
+
+        self._meta_mtime = os.stat(meta_path).st_mtime_ns
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['size'] > old_size or moved:
+            for name, count in meta['dictionaries'].items():
+                self.dictionaries[name].load(count)
+            # A column may have been widened meanwhile
+            self.schema = {name: np.dtype(dtype) for name, dtype in meta['schema'].items()}
+            self._buffers = {name: self._map(name) for name in self.schema}
+            self._size = meta['size']
+            self.is_sorted = meta.get('sorted', False)
+            self._frame = None
+        return old_size, self._size
+
+    def write_lock(self):
+        """Exclusive lock across processes sharing the store directory"""
+        return self.lock(self.path)
+
+    @staticmethod
+    @contextmanager
+    def lock(path):
+        """Exclusive lock on a store directory across processes (a no-op without one)"""
+        if not path:
+            yield
+            return
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def memory_usage(self):
+        """Bytes of column data in use and allocated, and an estimate for the label dictionaries"""
+        return {
+            'used': sum(buffer.itemsize * self._size for buffer in self._buffers.values()),
+            'allocated': sum(buffer.nbytes for buffer in self._buffers.values()),
+            'labels': sum(labels.nbytes for labels in self.dictionaries.values())
+        }
+
+    def column(self, name):
+        """Read-only view of the stored values of one column"""
+        view = self._buffers[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def key_range(self, low=None, high=None, size=None):
+        """Rows among the first size whose sort key is in [low, high).
+
+        Returns a slice while the store is sorted, otherwise an ascending
+        array of positions. A bound of None leaves that side open.
+        """
+        size = self._size if size is None else size
+        if low is None and high is None:
+            return slice(0, size)
+
+        if self.is_sorted:
+            keys = self.column(self.sort_key)[:size]
+            start = 0 if low is None else int(np.searchsorted(keys, low, side='left'))
+            stop = size if high is None else int(np.searchsorted(keys, high, side='left'))
+            return slice(start, max(start, stop))
+
+        keys, order = self._sorted_keys(size)
+        start = 0 if low is None else np.searchsorted(keys, low, side='left')
+        stop = len(keys) if high is None else np.searchsorted(keys, high, side='left')
+        rows = np.sort(order[start:stop])
+        return rows[:np.searchsorted(rows, size)]
+
+    def _sorted_keys(self, size):
+        """Sort key values in order and the rows they came from, covering at least size rows"""
+        if self._sort_index is None:
+            keys = np.empty(0, dtype=self.schema[self.sort_key])
+            order = np.empty(0, dtype=np.int64)
+            covered = 0
+        else:
+            keys, order, covered = self._sort_index
+        if covered < size:
+            # Merge the rows appended since the index was last used
+            new_keys = self._buffers[self.sort_key][covered:size]
+            new_order = np.argsort(new_keys, kind='stable')
+            new_keys = new_keys[new_order]
+            at = np.searchsorted(keys, new_keys, side='right')
+            keys = np.insert(keys, at, new_keys)
+            order = np.insert(order, at, new_order + covered)
+            self._sort_index = (keys, order, size)
+        return keys, order
+
+    def frame(self, size=None):
+        """DataFrame over views of the first size rows of the buffers, cached per size"""
+        size = self._size if size is None else size
+        frame = self._frame
+        if frame is None or len(frame) != size:
+            columns = {}
+            for name in self._buffers:
+                values = self.column(name)[:size]
+                if name in self.categories:
+                    columns[name] = pd.Categorical.from_codes(
+                        values, categories=self.categories[name], validate=False
+                    )
+                elif name in self.dictionaries:
+                    columns[name] = pd.Categorical.from_codes(
+                        values, dtype=self.dictionaries[name].dtype, validate=False
+                    )
+                else:
+                    columns[name] = pd.Series(values, dtype=values.dtype, copy=False)
+            frame = self._frame = pd.DataFrame(columns, copy=False)
+        return frame
+
+
+class SalesFileReader:
+    """Streams a sales file as typed DataFrames of at most chunk_rows rows.
+
+    CSV (optionally gzip-compressed), Parquet and Arrow IPC stream files are
+    read incrementally, so memory is bounded by the chunk size however large
+    the file is. The file needs the columns the dashboard exports, with
+    region and product values among the known labels and IDs formatted as
+    in exports (CUST_1234), or as bare numbers. Integer columns and ID
+    numbers are downcast to the smallest type that holds each chunk; sales
+    stay float64 so cents are exact. Dates must stay within
+    date_window_days of the rows read before them (see check_dates).
+    """
+
+    COLUMNS = ('date', 'region', 'product', 'sales', 'orders', 'customers', 'customer_id', 'order_id')
+    FORMATS = (('.csv.gz', 'csv.gz'), ('.csv', 'csv'), ('.parquet', 'parquet'), ('.arrows', 'arrow'))
+    # Default for how far outside the stored date range new rows may fall
+    DATE_WINDOW_DAYS = 5 * 366
+
+    def __init__(self, path, regions, products, chunk_rows=500_000, date_window_days=None):
+        self.path = path
+        self.format = next((fmt for suffix, fmt in self.FORMATS if path.lower().endswith(suffix)), None)
+        if self.format is None:
+            raise ValueError(f'Unsupported sales file type: {path}')
+        if self.format in ('parquet', 'arrow') and pa is None:
+            raise ValueError(f'Reading {self.format} files requires pyarrow')
+        self.categories = {'region': sorted(regions), 'product': sorted(products)}
+        self.chunk_rows = chunk_rows
+        self.date_window_days = date_window_days
+        self.rows_read = 0
+        # First and last day of the rows read so far
+        self.date_span = None
+        # Share of the file consumed so far, for progress reports
+        self.fraction_read = 0.0
+
+    def __iter__(self):
+        # Closed on errors too, so a rejected chunk doesn't leave the file open
+        with closing(self._read_chunks()) as chunks:
+            yield from self._typed_chunks(chunks)
+
+    def _typed_chunks(self, chunks):
+        for chunk in chunks:
+            where = f'rows {self.rows_read + 1}-{self.rows_read + len(chunk)} of {self.path}'
+            typed = self.typed_chunk(chunk, self.categories, where)
+            self.check_dates(typed['date'], self.date_span, where, self.rows_read + 1, self.date_window_days)
+            if len(typed):
+                days = typed['date'].to_numpy().astype('datetime64[D]')
+                first, last = days.min(), days.max()
+                if self.date_span is not None:
+                    first, last = min(first, self.date_span[0]), max(last, self.date_span[1])
+                self.date_span = (first, last)
+            self.rows_read += len(typed)
+            yield typed
+
+    def _read_chunks(self):
+        """Raw DataFrames of at most chunk_rows rows, in file order"""
+        total = max(os.path.getsize(self.path), 1)
+        with open(self.path, 'rb') as raw:
+            if self.format in ('csv', 'csv.gz'):
+                source = gzip.GzipFile(fileobj=raw) if self.format == 'csv.gz' else raw
+                # Label columns parse straight to categoricals, which encode without per-row
+                # strings; low_memory=False parses each chunk in one piece rather than
+                # merging categories across the parser's internal blocks
+                labels = {name: 'category' for name in ('region', 'product', 'customer_id', 'order_id')}
+                with pd.read_csv(source, usecols=lambda name: name in self.COLUMNS,
+                                 dtype=labels, chunksize=self.chunk_rows, low_memory=False) as chunks:
+                    for chunk in chunks:
+                        # Compressed bytes consumed, so gzip progress is right too
+                        self.fraction_read = raw.tell() / total
+                        yield chunk
+            elif self.format == 'parquet':
+                parquet = pq.ParquetFile(raw)
+                total = max(parquet.metadata.num_rows, 1)
+                columns = [name for name in self.COLUMNS if name in parquet.schema_arrow.names]
+                for batch in parquet.iter_batches(self.chunk_rows, columns=columns):
+                    self.fraction_read = (self.rows_read + batch.num_rows) / total
+                    yield batch.to_pandas(strings_to_categorical=True)
+            else:
+                for batch in pa.ipc.open_stream(raw):
+                    self.fraction_read = raw.tell() / total
+                    for offset in range(0, max(batch.num_rows, 1), self.chunk_rows):
+                        yield batch.slice(offset, self.chunk_rows).to_pandas(strings_to_categorical=True)
+
+    @classmethod
+    def typed_chunk(cls, chunk, categories, rows):
+        """Raw sales rows validated and converted to the stored column types.
+
+        Every check is a whole-column operation. Errors are ValueErrors that
+        name the offending rows (described by rows) and a few bad values.
+        """
+        missing = [name for name in cls.COLUMNS if name not in chunk.columns]
+        if missing:
+            raise ValueError(f'Missing columns in {rows}: {", ".join(missing)}')
+        columns = {}
+
+        dates = pd.to_datetime(chunk['date'], errors='coerce')
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        if dates.isna().any():
+            raise ValueError(f'Missing or unparseable dates in {rows}')
+        columns['date'] = dates.to_numpy(dtype='datetime64[ns]')
+
+        for name, labels in categories.items():
+            known = chunk[name].isin(labels).to_numpy()
+            if not known.all():
+                unknown = sorted(set(chunk[name][~known].astype(str)))
+                raise ValueError(f'Unknown {name} values in {rows}: {", ".join(unknown[:5])}')
+            columns[name] = pd.Categorical(chunk[name], categories=labels)
+
+        for name in ('sales', 'orders', 'customers'):
+            values = pd.to_numeric(chunk[name])
+            if values.isna().any():
+                raise ValueError(f'Missing {name} values in {rows}')
+            if not np.isfinite(values.to_numpy(dtype=np.float64)).all():
+                raise ValueError(f'Non-finite {name} values in {rows}')
+            if (values < 0).any():
+                raise ValueError(f'Negative {name} values in {rows}')
+            if name == 'sales':
+                columns[name] = values.to_numpy(dtype=np.float64)
+            elif values.dtype.kind == 'f' and (values % 1 != 0).any():
+                raise ValueError(f'Non-integer {name} values in {rows}')
+            else:
+                columns[name] = pd.to_numeric(values.to_numpy(dtype=np.int64), downcast='integer')
+
+        for name, prefix in ID_PREFIXES.items():
+            try:
+                columns[name] = _id_numbers(chunk[name], prefix)
+            except ValueError as error:
+                raise ValueError(f'Invalid {name} values in {rows}: {error}') from None
+        return pd.DataFrame(columns)
+
+    @classmethod
+    def check_dates(cls, dates, span, rows, first_row=1, window_days=None):
+        """Reject dates more than window_days days outside span, the (first, last) stored days.
+
+        The rollup cube has a cell for every day it covers, so a single row
+        dated centuries away would allocate all the days in between. Without
+        stored rows the window is around the median date. Errors name the
+        offending rows, numbered from first_row within rows.
+        """
+        days = np.asarray(dates, dtype='datetime64[D]')
+        if len(days) == 0:
+            return
+        window_days = window_days or cls.DATE_WINDOW_DAYS
+        if span is None:
+            middle = np.partition(days, len(days) // 2)[len(days) // 2]
+            span = (middle, middle)
+        earliest, latest = span[0] - window_days, span[1] + window_days
+        outside = np.flatnonzero((days < earliest) | (days > latest))
+        if len(outside):
+            examples = ', '.join(f'row {first_row + i} ({days[i]})' for i in outside[:5])
+            raise ValueError(f'Dates outside {earliest} to {latest} in {rows}: {examples}')
+
+
+class _DayBlocks:
+    """A vector per cube cell (days x regions x products x width), in blocks of days.
+
+    Copies share every block until they write to it, so a write duplicates
+    only the blocks for the days it touches.
+    """
+
+    def __init__(self, grid, dtype, width, block_days):
+        self.grid = grid
+        self.dtype = dtype
+        self.width = width
+        self.block_days = block_days
+        self.blocks = []
+        self._shared = set()
+
+    def copy(self):
+        blocks = copy.copy(self)
+        blocks.blocks = list(self.blocks)
+        blocks._shared = set(range(len(self.blocks)))
+        return blocks
+
+    @property
+    def nbytes(self):
+        return sum(block.nbytes for block in self.blocks)
+
+    def array(self, num_days):
+        """The first num_days days as one (days, regions, products, width) array"""
+        shape = (0,) + self.grid + (self.width,)
+        return np.concatenate([np.zeros(shape, dtype=self.dtype)] + self.blocks)[:num_days]
+
+    def assign(self, values):
+        """Replace every block by values, an array like array() returns"""
+        size = self.block_days
+        count = -(-len(values) // size)
+        padded = np.zeros((count * size,) + values.shape[1:], dtype=values.dtype)
+        padded[:len(values)] = values
+        self.dtype, self.width = values.dtype, values.shape[-1]
+        self.blocks = [padded[i * size:(i + 1) * size] for i in range(count)]
+        self._shared = set()
+
+    def shift(self, days, num_days):
+        """Move the first num_days days to start days later"""
+        values = self.array(num_days)
+        shifted = np.zeros((days + num_days,) + values.shape[1:], dtype=self.dtype)
+        shifted[days:] = values
+        self.assign(shifted)
+
+    def extend(self, num_days):
+        """Add empty blocks until num_days days fit"""
+        shape = (self.block_days,) + self.grid + (self.width,)
+        while len(self.blocks) * self.block_days < num_days:
+            self.blocks.append(np.zeros(shape, dtype=self.dtype))
+
+    def widen(self, width, offset=0):
+        """Grow every vector to width entries, moving the existing ones offset places up"""
+        for i, values in enumerate(self.blocks):
+            grown = np.zeros(values.shape[:-1] + (width,), dtype=self.dtype)
+            grown[..., offset:offset + values.shape[-1]] = values
+            self.blocks[i] = grown
+        self.width = width
+        self._shared = set()
+
+    def retype(self, dtype):
+        """Convert every block to dtype"""
+        self.blocks = [block.astype(dtype) for block in self.blocks]
+        self.dtype = dtype
+        self._shared = set()
+
+    def merge(self, ufunc, first_day, values):
+        """ufunc values, an array like array() returns, into the days from first_day on.
+
+        values may have fewer columns than the blocks; the rest are left as they are.
+        """
+        size = self.block_days
+        last_day = first_day + len(values)
+        for i in range(first_day // size, -(-last_day // size)):
+            self._own(i)
+            start, stop = max(first_day, i * size), min(last_day, (i + 1) * size)
+            target = self.blocks[i][start - i * size:stop - i * size, ..., :values.shape[-1]]
+            ufunc(target, values[start - first_day:stop - first_day], out=target)
+
+    def apply(self, ufunc, cells, columns, values):
+        """ufunc.at each (flat cell, column) entry with values, block by block"""
+        for rows, positions, flat in self._by_block(cells, columns):
+            ufunc.at(flat, positions, values[rows])
+
+    def count(self, cells, columns):
+        """Add one to each (flat cell, column) entry, block by block"""
+        for _, positions, flat in self._by_block(cells, columns):
+            flat += np.bincount(positions, minlength=len(flat)).astype(self.dtype, copy=False)
+
+    def _by_block(self, cells, columns):
+        """Input rows, their positions in the flattened block and that block, per block written.
+
+        Blocks are duplicated first if they are shared.
+        """
+        if len(cells) == 0:
+            return
+        cells_per_block = self.block_days * int(np.prod(self.grid))
+        blocks = cells // cells_per_block
+        # Rows mostly arrive in date order, which a stable sort handles in linear time
+        order = np.argsort(blocks, kind='stable')
+        for rows in np.split(order, np.flatnonzero(np.diff(blocks[order])) + 1):
+            i = int(blocks[rows[0]])
+            self._own(i)
+            positions = (cells[rows] - i * cells_per_block) * self.width + columns[rows]
+            yield rows, positions, self.blocks[i].reshape(-1)
+
+    def _own(self, i):
+        """Duplicate block i first if it is shared with a copy"""
+        if i in self._shared:
+            self._shared.discard(i)
+            self.blocks[i] = self.blocks[i].copy()
+
+    def reduce(self, ufunc, index, dtype=None):
+        """ufunc over the vectors of the cells selected by a cube index"""
+        days, regions, products = index
+        merged = np.zeros(self.width, dtype=dtype or self.dtype)
+        size = self.block_days
+        for i in range(days.start // size, -(-days.stop // size)):
+            block_days = slice(max(days.start - i * size, 0), min(days.stop - i * size, size))
+            selected = RollupCube._take(self.blocks[i], (block_days, regions, products))
+            if selected.size:
+                ufunc(merged, ufunc.reduce(selected.reshape(-1, self.width), axis=0, dtype=merged.dtype),
+                      out=merged)
+        return merged
+
+
+class _CustomerSets:
+    """The set of customers in each cube cell, in blocks of days.
+
+    Customers are added by ID number and numbered densely from 0 in the
+    order they are first seen; numbers keeps the IDs sorted and codes
+    their codes, so the ID columns themselves stay plain integers.
+
+    A block starts sparse, as sorted keys (cell within the block << 32 |
+    code) for its distinct (cell, customer) pairs, and turns into a dense
+    (days, regions, products, words) bitmap once that would be smaller.
+    Memory is then about the smaller of the two per block, rather than
+    cells x customers for bitmaps everywhere. Blocks and the code arrays
+    are replaced, never modified, so copies share them until they write.
+    """
+
+    def __init__(self, grid, block_days):
+        self.grid = grid
+        self.block_days = block_days
+        self.cells_per_day = int(np.prod(grid))
+        # 64-bit words covering the largest customer code seen
+        self.width = 1
+        self.blocks = []
+        self.numbers = np.empty(0, dtype=np.int64)
+        self.codes = np.empty(0, dtype=np.int64)
+
+    def copy(self):
+        sets = copy.copy(self)
+        sets.blocks = list(self.blocks)
+        return sets
+
+    @property
+    def nbytes(self):
+        return sum(block.nbytes for block in self.blocks) + self.code_nbytes
+
+    @property
+    def code_nbytes(self):
+        """Bytes mapping customer IDs to their codes"""
+        return self.numbers.nbytes + self.codes.nbytes
+
+    def encode(self, numbers):
+        """Codes of customer ID numbers, giving unseen customers the next free codes"""
+        unique, inverse = np.unique(np.asarray(numbers, dtype=np.int64), return_inverse=True)
+        at = np.searchsorted(self.numbers, unique)
+        known = at < len(self.numbers)
+        known[known] = self.numbers[at[known]] == unique[known]
+        codes = np.empty(len(unique), dtype=np.int64)
+        codes[known] = self.codes[at[known]]
+        new = ~known
+        if new.any():
+            codes[new] = np.arange(len(self.numbers), len(self.numbers) + np.count_nonzero(new))
+            self.numbers = np.insert(self.numbers, at[new], unique[new])
+            self.codes = np.insert(self.codes, at[new], codes[new])
+        return codes[inverse]
+
+    def decode(self, codes):
+        """Customer ID numbers of codes"""
+        numbers = np.empty(len(self.numbers), dtype=np.int64)
+        numbers[self.codes] = self.numbers
+        return numbers[codes]
+
+    def extend(self, num_days):
+        """Add empty blocks until num_days days fit"""
+        while len(self.blocks) * self.block_days < num_days:
+            self.blocks.append(np.empty(0, dtype=np.int64))
+
+    def shift(self, days, num_days):
+        """Move the first num_days days to start days later"""
+        cells, codes = self._pairs()
+        self.blocks = []
+        self.extend(days + num_days)
+        self._add(cells + days * self.cells_per_day, codes)
+
+    def pairs(self):
+        """(flat cell, customer ID number) of every customer in every cell"""
+        cells, codes = self._pairs()
+        return cells, self.decode(codes)
+
+    def _pairs(self):
+        """(flat cell, code) of every customer in every cell"""
+        cells, codes = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        cells_per_block = self.block_days * self.cells_per_day
+        for i, block in enumerate(self.blocks):
+            if block.ndim == 1:
+                block_cells, block_codes = block >> 32, block & 0xFFFFFFFF
+            else:
+                bits = np.unpackbits(block.reshape(-1, block.shape[-1]).view(np.uint8), axis=1, bitorder='little')
+                block_cells, block_codes = np.nonzero(bits)
+            cells.append(block_cells + i * cells_per_block)
+            codes.append(block_codes.astype(np.int64))
+        return np.concatenate(cells), np.concatenate(codes)
+
+    def merge(self, first_day, other):
+        """Add the sets of another index, its day 0 being first_day here"""
+        cells, numbers = other.pairs()
+        self.add(cells + first_day * self.cells_per_day, numbers)
+
+    def add(self, cells, numbers):
+        """Add customers, by ID number, to their flat cells"""
+        if len(cells):
+            self._add(cells, self.encode(numbers))
+
+    def _add(self, cells, codes):
+        """Add customer codes to their flat cells, block by block"""
+        if len(cells) == 0:
+            return
+        self.width = max(self.width, int(codes.max() >> 6) + 1)
+        cells_per_block = self.block_days * self.cells_per_day
+        blocks = cells // cells_per_block
+        # Rows mostly arrive in date order, which a stable sort handles in linear time
+        order = np.argsort(blocks, kind='stable')
+        for rows in np.split(order, np.flatnonzero(np.diff(blocks[order])) + 1):
+            i = int(blocks[rows[0]])
+            block_cells, block_codes = cells[rows] - i * cells_per_block, codes[rows]
+            block = self.blocks[i]
+            if block.ndim == 1:
+                keys = np.unique((block_cells << 32) | block_codes)
+                at = np.searchsorted(block, keys)
+                new = keys[(at == len(block)) | (block[np.minimum(at, len(block) - 1)] != keys)] \
+                    if len(block) else keys
+                block = np.insert(block, np.searchsorted(block, new), new)
+                if len(block) > cells_per_block * self.width:
+                    block = self._dense(block >> 32, block & 0xFFFFFFFF, self.width)
+                self.blocks[i] = block
+            else:
+                words = block.shape[-1]
+                if self.width > words:
+                    # Widen to double, so new customers stay amortized O(1)
+                    words = max(self.width, 2 * words)
+                    grown = np.zeros(block.shape[:-1] + (words,), dtype=np.uint64)
+                    grown[..., :block.shape[-1]] = block
+                    block = grown
+                else:
+                    block = block.copy()
+                flat = block.reshape(-1)
+                np.bitwise_or.at(flat, block_cells * words + (block_codes >> 6),
+                                 np.left_shift(np.uint64(1), (block_codes & 63).astype(np.uint64)))
+                self.blocks[i] = block
+
+    def _dense(self, cells, codes, words):
+        block = np.zeros((self.block_days,) + self.grid + (words,), dtype=np.uint64)
+        np.bitwise_or.at(block.reshape(-1), cells * words + (codes >> 6),
+                         np.left_shift(np.uint64(1), (codes & 63).astype(np.uint64)))
+        return block
+
+    def count(self, index):
+        """Number of distinct customers over the cells selected by a cube index"""
+        days, regions, products = index
+        region_mask = np.zeros(self.grid[0], dtype=bool)
+        region_mask[regions] = True
+        product_mask = np.zeros(self.grid[1], dtype=bool)
+        product_mask[products] = True
+        selected = (region_mask[:, None] & product_mask[None, :]).reshape(-1)
+        every_cell = selected.all()
+
+        seen = np.zeros(self.width * 64, dtype=bool)
+        size = self.block_days
+        for i in range(days.start // size, -(-days.stop // size)):
+            first, last = max(days.start - i * size, 0), min(days.stop - i * size, size)
+            block = self.blocks[i]
+            if block.ndim == 1:
+                # Keys are ordered by cell, and cells by day, so the days are one run of keys
+                keys = block[np.searchsorted(block, (first * self.cells_per_day) << 32):
+                             np.searchsorted(block, (last * self.cells_per_day) << 32)]
+                if not every_cell:
+                    keys = keys[selected[(keys >> 32) % self.cells_per_day]]
+                seen[keys & 0xFFFFFFFF] = True
+            else:
+                cells = RollupCube._take(block, (slice(first, last), regions, products))
+                if cells.size:
+                    words = np.bitwise_or.reduce(cells.reshape(-1, block.shape[-1]), axis=0)
+                    # Codes past width were never added, so any wider words are zero there
+                    words = words[:self.width]
+                    seen[:len(words) * 64] |= np.unpackbits(words.view(np.uint8), bitorder='little').view(bool)
+        return int(np.count_nonzero(seen))
+
+
+class RollupCube:
+    """Materialized day x region x product totals.
+
+    Every dashboard filter is a slice of this grid, so charts and KPIs can be
+    answered in time proportional to the number of cells rather than rows.
+    The day axis has spare capacity, so new rows are folded in incrementally.
+
+    Distinct customers are indexed per cell too: 'exact' mode keeps the set
+    of customers per cell (see _CustomerSets), 'hll' mode keeps a
+    HyperLogLog sketch per cell sized for the requested relative error.
+
+    With a quantile_error, each cell also keeps the exact minimum and
+    maximum sale and a DDSketch of its sales: counts in logarithmic buckets,
+    each bucket's midpoint within quantile_error of every value in it.
+    Sketches merge by adding counts, so the median or any percentile of a
+    filter costs time proportional to the selected cells, not rows.
+
+    Coarser time levels (weeks starting Monday, months, quarters) form a
+    pyramid over the day axis. Each level is summed from the level below it,
+    and only the buckets covering newly added days are re-derived, so charts
+    over long ranges cost time proportional to the number of buckets.
+
+    A published cube is never modified: writers add to a copy(), which
+    duplicates shared arrays only when it first writes to them. The distinct
+    index and sketches are split into blocks of BLOCK_DAYS days, so a write
+    only duplicates the blocks for the days it touches.
+    """
+
+    MEASURES = ('sales', 'orders', 'customers', 'rows')
+    DISTINCT_MODES = ('exact', 'hll', None)
+    BLOCK_DAYS = 32
+    # Sales closer to zero than this share the sketch's zero bucket
+    SKETCH_MIN_VALUE = 0.01
+    # Sketch buckets kept per cell; sales beyond them count in the outermost one
+    SKETCH_MAX_BUCKETS = 1024
+    GRANULARITIES = ('day', 'week', 'month', 'quarter')
+    # Pyramid levels in build order, each with the level it is derived from
+    PYRAMID = (('week', 'day'), ('month', 'day'), ('quarter', 'month'))
+
+    def __init__(self, regions, products, distinct_mode='exact', hll_error=0.02, quantile_error=None):
+        if distinct_mode not in self.DISTINCT_MODES:
+            raise ValueError(f'Unknown distinct mode: {distinct_mode}')
+        if quantile_error is not None and not 0 < quantile_error < 1:
+            raise ValueError(f'Quantile error must be between 0 and 1: {quantile_error}')
+        self.regions = sorted(regions)
+        self.products = sorted(products)
+        self.distinct_mode = distinct_mode
+        self.start_day = np.datetime64(datetime.now().date(), 'D')
+        self.num_days = 0
+
+        grid = (0, len(self.regions), len(self.products))
+        self._cells = {measure: np.zeros(grid) for measure in self.MEASURES}
+        # Distinct index: a bitmap of customer codes (uint64 words) or HLL registers per cell
+        self._distinct_name, self._distinct = None, None
+        if distinct_mode == 'exact':
+            self._distinct_name = 'customer_numbers'
+            self._distinct = _CustomerSets(grid[1:], self.BLOCK_DAYS)
+        elif distinct_mode == 'hll':
+            # Standard error of HyperLogLog is about 1.04 / sqrt(registers)
+            self.hll_precision = int(np.clip(np.ceil(np.log2((1.04 / hll_error) ** 2)), 4, 18))
+            self._distinct_name = 'customer_hll'
+            self._distinct = _DayBlocks(grid[1:], np.uint8, 1 << self.hll_precision, self.BLOCK_DAYS)
+        # Sales distribution: exact extremes (meaningful where rows > 0) and
+        # sketch bucket counts, column 0 holding bucket id _sketch_low
+        self.quantile_error = quantile_error
+        self._sketch, self._sketch_low = None, 0
+        if quantile_error:
+            self._gamma = (1 + quantile_error) / (1 - quantile_error)
+            self._cells['sales_min'] = np.zeros(grid)
+            self._cells['sales_max'] = np.zeros(grid)
+            self._sketch = _DayBlocks(grid[1:], np.uint16, 0, self.BLOCK_DAYS)
+        self._pyramid = {}
+        # Keys of the arrays still shared with the cube this one was copied from
+        self._shared = set()
+        self._update_pyramid()
+
+    def copy(self):
+        """Copy of the cube sharing all arrays until it writes to them"""
+        cube = copy.copy(self)
+        cube._cells = dict(self._cells)
+        if self._distinct:
+            cube._distinct = self._distinct.copy()
+        if self._sketch:
+            cube._sketch = self._sketch.copy()
+        cube._pyramid = dict(self._pyramid)
+        cube._shared = set(self._cells) | {('level', level) for level in self._pyramid}
+        return cube
+
+    def _own(self, key):
+        """Take ownership of a shared array; True if the caller must duplicate it first"""
+        if key in self._shared:
+            self._shared.discard(key)
+            return True
+        return False
+
+    @classmethod
+    def from_frame(cls, df, regions, products):
+        """Aggregate typed rows into a new cube (without a distinct index)"""
+        cube = cls(regions, products, distinct_mode=None)
+        cube.add(df)
+        return cube
+
+    @classmethod
+    def load(cls, path, regions, products, distinct_mode='exact', hll_error=0.02, quantile_error=None):
+        """Cube saved by save(), or None if missing or built with other settings"""
+        if not os.path.exists(path):
+            return None
+        cube = cls(regions, products, distinct_mode, hll_error, quantile_error)
+        expected = set(cube._cells) | {'start_day', cube._distinct_name} - {None}
+        if cube._sketch:
+            expected |= {'sales_sketch', 'sketch_low', 'quantile_error'}
+        with np.load(path) as saved:
+            if set(saved.files) != expected:
+                return None
+            for name in cube._cells:
+                if saved[name].shape[1:] != cube._cells[name].shape[1:]:
+                    return None
+                cube._cells[name] = saved[name]
+            if cube._distinct:
+                distinct = saved[cube._distinct_name]
+                if distinct_mode == 'hll' and distinct.shape[-1] != cube._distinct.width:
+                    return None
+            if cube._sketch:
+                # Bucket boundaries depend on the error
+                if float(saved['quantile_error']) != quantile_error:
+                    return None
+                sketch = saved['sales_sketch']
+                cube._sketch_low = int(saved['sketch_low'])
+            cube.start_day = np.datetime64(int(saved['start_day']), 'D')
+        cube.num_days = len(cube._cells['rows'])
+        if distinct_mode == 'exact':
+            cube._distinct.extend(cube.num_days)
+            cube._distinct.add(*distinct)
+        elif cube._distinct:
+            cube._distinct.assign(distinct)
+        if cube._sketch:
+            cube._sketch.assign(sketch)
+        cube._update_pyramid()
+        return cube
+
+    def save(self, path):
+        """Write the populated cells to an .npz file, atomically replacing path"""
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            arrays = {name: values[:self.num_days] for name, values in self._cells.items()}
+            if self.distinct_mode == 'exact':
+                arrays[self._distinct_name] = np.stack(self._distinct.pairs())
+            elif self._distinct:
+                arrays[self._distinct_name] = self._distinct.array(self.num_days)
+            if self._sketch:
+                arrays['sales_sketch'] = self._sketch.array(self.num_days)
+                arrays['sketch_low'] = np.int64(self._sketch_low)
+                arrays['quantile_error'] = np.float64(self.quantile_error)
+            np.savez(f, start_day=np.int64(self.start_day.astype(np.int64)), **arrays)
+        os.replace(temporary, path)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the cells, distinct index, sketches and pyramid (shared arrays included)"""
+        arrays = list(self._cells.values())
+        arrays += [values for _, cells in self._pyramid.values() for values in cells.values()]
+        return sum(values.nbytes for values in arrays) + sum(blocks.nbytes for blocks in self._day_blocks())
+
+    @property
+    def row_count(self):
+        """Number of rows folded into the cube"""
+        return int(self.rows.sum())
+
+    @property
+    def sales(self):
+        return self._cells['sales'][:self.num_days]
+
+    @property
+    def orders(self):
+        return self._cells['orders'][:self.num_days]
+
+    @property
+    def customers(self):
+        return self._cells['customers'][:self.num_days]
+
+    @property
+    def rows(self):
+        return self._cells['rows'][:self.num_days]
+
+    def _day_blocks(self):
+        """The per-cell vectors kept in day blocks: distinct index and sketches"""
+        return [blocks for blocks in (self._distinct, self._sketch) if blocks]
+
+    def _reserve(self, first_day, last_day):
+        """Make room for days first_day..last_day, moving start_day back if needed"""
+        shift = 0
+        if self.num_days == 0:
+            self.start_day = first_day
+        elif first_day < self.start_day:
+            shift = int((self.start_day - first_day).astype(np.int64))
+
+        num_days = max(self.num_days + shift, int((last_day - self.start_day).astype(np.int64)) + shift + 1)
+        capacity = len(self._cells['rows'])
+        if shift or num_days > capacity:
+            capacity = max(num_days, 2 * capacity) if num_days > capacity else capacity
+            for name, values in self._cells.items():
+                grown = np.zeros((capacity,) + values.shape[1:], dtype=values.dtype)
+                grown[shift:shift + self.num_days] = values[:self.num_days]
+                self._cells[name] = grown
+                self._shared.discard(name)
+            self.start_day -= shift
+
+        for blocks in self._day_blocks():
+            if shift:
+                blocks.shift(shift, self.num_days)
+            blocks.extend(num_days)
+        self.num_days = num_days
+
+    def add(self, df, customer_ids=None):
+        """Add the totals (and customer ID numbers, if indexed) of typed rows to their cells"""
+        self.add_codes(
+            df['date'].to_numpy(),
+            pd.Categorical(df['region'], categories=self.regions).codes,
+            pd.Categorical(df['product'], categories=self.products).codes,
+            {measure: df[measure].to_numpy() for measure in ('sales', 'orders', 'customers')},
+            customer_ids
+        )
+
+    def add_codes(self, dates, region_codes, product_codes, measures, customer_ids=None):
+        """Add rows given as column arrays: dates, category codes and measure values.
+
+        A cube with sketches must be given single rows, not pre-aggregated counts.
+        """
+        if len(dates) == 0:
+            return
+        if 'sales' in measures and not np.isfinite(measures['sales']).all():
+            raise ValueError('Sales must be finite')
+        days = dates.astype('datetime64[D]')
+        self._reserve(days.min(), days.max())
+
+        # In-place arithmetic keeps temporaries down on large batches
+        cells = (days - self.start_day).astype(np.int64)
+        cells *= len(self.regions)
+        cells += region_codes
+        cells *= len(self.products)
+        cells += product_codes
+
+        if self._sketch:
+            # Before the row counts change: they tell which cells were empty
+            self._add_sales(cells, np.asarray(measures['sales'], dtype=np.float64))
+
+        # Only the span of cells touched by the new rows is updated
+        low, high = cells.min(), cells.max() + 1
+        # Rows count one each unless the caller passes pre-aggregated counts
+        weights = {'rows': None, **measures}
+        for measure in self.MEASURES:
+            if self._own(measure):
+                self._cells[measure] = self._cells[measure].copy()
+            flat = self._cells[measure].reshape(-1)
+            flat[low:high] += np.bincount(cells - low, weights=weights[measure], minlength=high - low)
+
+        if self.distinct_mode and customer_ids is not None:
+            self._add_customers(cells, np.asarray(customer_ids, dtype=np.int64))
+
+        day = int(self.start_day.astype(np.int64))
+        cells_per_day = len(self.regions) * len(self.products)
+        self._update_pyramid((day + int(low) // cells_per_day, day + int(high - 1) // cells_per_day))
+
+    def merge(self, other):
+        """Add the cells of a cube over other rows (same labels and distinct index) to this one.
+
+        Totals add up and distinct indexes combine (bitmaps are ORed, HLL
+        registers take the maximum), so partial cubes over disjoint rows
+        merge into the cube of all of them. Sketches can't be merged: their
+        bucket ranges differ between cubes.
+        """
+        if (self.regions, self.products, self.distinct_mode) != (other.regions, other.products, other.distinct_mode):
+            raise ValueError('Only cubes with the same labels and distinct mode can be merged')
+        if self._sketch or other._sketch:
+            raise ValueError('Cubes with sales sketches cannot be merged')
+        if self.distinct_mode == 'hll' and self.hll_precision != other.hll_precision:
+            raise ValueError('Only HLL registers of the same precision can be merged')
+        if other.num_days == 0:
+            return
+        self._reserve(other.start_day, other.start_day + (other.num_days - 1))
+        offset = int((other.start_day - self.start_day).astype(np.int64))
+        days = slice(offset, offset + other.num_days)
+        for measure in self.MEASURES:
+            if self._own(measure):
+                self._cells[measure] = self._cells[measure].copy()
+            self._cells[measure][days] += other._cells[measure][:other.num_days]
+
+        if self.distinct_mode == 'exact':
+            self._distinct.merge(offset, other._distinct)
+        elif self.distinct_mode == 'hll':
+            self._distinct.merge(np.maximum, offset, other._distinct.array(other.num_days))
+
+        day = int(self.start_day.astype(np.int64)) + offset
+        self._update_pyramid((day, day + other.num_days - 1))
+
+    def _level(self, level):
+        """First bucket and cells by measure of a time level ('day' is the cube itself)"""
+        if level == 'day':
+            return int(self.start_day.astype(np.int64)), {
+                measure: self._cells[measure][:self.num_days] for measure in self.MEASURES
+            }
+        return self._pyramid[level]
+
+    def _update_pyramid(self, touched_days=None):
+        """Re-derive the pyramid buckets covering the (first, last) touched day numbers.
+
+        Without touched_days every level is rebuilt from scratch.
+        """
+        touched = {'day': touched_days}
+        for level, parent in self.PYRAMID:
+            if touched_days is not None and touched[parent] is None:
+                touched[level] = None
+                continue
+            touched[level] = self._derive(level, parent, touched[parent])
+
+    def _derive(self, level, parent, touched=None):
+        """Sum parent buckets into level buckets; returns the (first, last) level buckets changed.
+
+        touched is the span of parent buckets that changed; when given (and
+        the level's first bucket is unchanged) only buckets covering it are
+        recomputed.
+        """
+        parent_first, parent_cells = self._level(parent)
+        count = len(parent_cells['rows'])
+        buckets = _bucket_of(level, _bucket_start(parent, parent_first + np.arange(count)))
+        first = int(buckets[0]) if count else 0
+        size = int(buckets[-1]) - first + 1 if count else 0
+        grid = (len(self.regions), len(self.products))
+
+        current = self._pyramid.get(level)
+        if touched is None or current is None or current[0] != first:
+            cells = {measure: np.zeros((size,) + grid) for measure in self.MEASURES}
+            low, high = 0, count
+        else:
+            cells = current[1]
+            if len(cells['rows']) < size:
+                cells = {
+                    measure: np.concatenate([values, np.zeros((size - len(values),) + grid)])
+                    for measure, values in cells.items()
+                }
+            elif ('level', level) in self._shared:
+                cells = {measure: values.copy() for measure, values in cells.items()}
+            # Widen the touched span to whole level buckets
+            low = int(np.clip(touched[0] - parent_first, 0, count - 1))
+            high = int(np.clip(touched[1] - parent_first, 0, count - 1))
+            low = int(np.searchsorted(buckets, buckets[low], side='left'))
+            high = int(np.searchsorted(buckets, buckets[high], side='right'))
+
+        self._pyramid[level] = (first, cells)
+        self._shared.discard(('level', level))
+        if high <= low:
+            return None
+        segment = buckets[low:high]
+        starts = np.flatnonzero(np.diff(segment, prepend=segment[0] - 1))
+        for measure, values in cells.items():
+            values[segment[starts] - first] = np.add.reduceat(parent_cells[measure][low:high], starts, axis=0)
+        return int(segment[0]), int(segment[-1])
+
+    def _add_customers(self, cells, customer_ids):
+        if self.distinct_mode == 'exact':
+            self._distinct.add(cells, customer_ids)
+        else:
+            columns, values = _hll_registers(customer_ids, self.hll_precision)
+            self._distinct.apply(np.maximum, cells, columns, values)
+
+    def _add_sales(self, cells, sales):
+        """Fold sale values into their cells' extremes and sketches"""
+        rows = self._cells['rows'].reshape(-1)[cells]
+        empty = rows == 0
+        for name, extreme, initial in (('sales_min', np.minimum, np.inf), ('sales_max', np.maximum, -np.inf)):
+            if self._own(name):
+                self._cells[name] = self._cells[name].copy()
+            flat = self._cells[name].reshape(-1)
+            flat[cells[empty]] = initial
+            extreme.at(flat, cells, sales)
+
+        buckets = self._sketch_buckets(sales)
+        self._cover_buckets(buckets)
+        # Counts are uint16 until some cell could hold more rows than that
+        if self._sketch.dtype == np.uint16 and rows.max() + len(cells) > np.iinfo(np.uint16).max:
+            self._sketch.retype(np.uint32)
+        high = self._sketch_low + self._sketch.width - 1
+        self._sketch.count(cells, np.clip(buckets, self._sketch_low, high) - self._sketch_low)
+
+    def _cover_buckets(self, buckets):
+        """Widen the sketches towards the buckets of new sales, up to SKETCH_MAX_BUCKETS.
+
+        Sales rarely leave the range seen so far, so no spare buckets are
+        kept. Past the bound, the range grows upwards first, like a
+        DDSketch collapsing its lowest buckets: sales outside it count in
+        the nearest kept bucket, so only quantiles among those outliers
+        lose their accuracy (and are still clipped to the exact extremes).
+        The first range is centred on the median sale.
+        """
+        limit = self.SKETCH_MAX_BUCKETS
+        low, high = int(buckets.min()), int(buckets.max())
+        if self._sketch.width == 0:
+            new_low = max(low, min(int(np.median(buckets)) - limit // 2, high - limit + 1))
+            new_high = min(high, new_low + limit - 1)
+        else:
+            new_low, new_high = self._sketch_low, self._sketch_low + self._sketch.width - 1
+            if low >= new_low and high <= new_high:
+                return
+            new_high = max(new_high, min(high, new_low + limit - 1))
+            new_low = min(new_low, max(low, new_high - limit + 1))
+        offset = self._sketch_low - new_low if self._sketch.width else 0
+        self._sketch.widen(new_high - new_low + 1, offset)
+        self._sketch_low = new_low
+
+    def _sketch_buckets(self, values):
+        """Sketch bucket ids, ordered like the values: 0 near zero, +-k beyond it.
+
+        Bucket k > 0 holds magnitudes in (m * gamma^(k-2), m * gamma^(k-1)],
+        m being SKETCH_MIN_VALUE; bucket -k the same values negated.
+        """
+        magnitudes = np.abs(values)
+        buckets = np.ceil(np.log(np.maximum(magnitudes, self.SKETCH_MIN_VALUE) / self.SKETCH_MIN_VALUE)
+                          / np.log(self._gamma)).astype(np.int64) + 1
+        buckets[magnitudes < self.SKETCH_MIN_VALUE] = 0
+        return np.where(values < 0, -buckets, buckets)
+
+    def _sketch_values(self, buckets):
+        """The value each sketch bucket stands for: the midpoint of its range"""
+        magnitudes = self.SKETCH_MIN_VALUE * 2 * self._gamma ** (np.abs(buckets) - 1) / (self._gamma + 1)
+        return np.sign(buckets) * magnitudes
+
+    def _index(self, filters=None):
+        """First selected day and the (days, regions, products) cube index for the filters"""
+        filters = filters or FilterSpec()
+        first = 0 if filters.start is None else self._day_offset(filters.start)
+        last = self.num_days if filters.end is None else self._day_offset(filters.end + 1)
+        days = slice(first, max(first, last))
+
+        regions = self._positions(self.regions, filters.regions)
+        products = self._positions(self.products, filters.products)
+        return self.start_day + first, (days, regions, products)
+
+    def _day_offset(self, day):
+        return int(np.clip((day - self.start_day).astype(np.int64), 0, self.num_days))
+
+    @staticmethod
+    def _take(values, index):
+        """Cells of values selected by a cube index, one axis at a time"""
+        days, regions, products = index
+        values = values[days]
+        if not isinstance(regions, slice):
+            values = values[:, regions]
+        if not isinstance(products, slice):
+            values = values[:, :, products]
+        return values
+
+    def select(self, filters=None):
+        """Sub-cube (sales, orders, rows) and first day for the filters"""
+        first_day, index = self._index(filters)
+        return (first_day,) + tuple(self._take(values, index) for values in (self.sales, self.orders, self.rows))
+
+    def count(self, filters=None):
+        """Number of rows in the selected cells"""
+        _, index = self._index(filters)
+        return int(self._take(self.rows, index).sum())
+
+    def distinct_customers(self, filters=None):
+        """Number of distinct customers over the selected cells"""
+        if not self.distinct_mode:
+            raise ValueError('This cube has no distinct customer index')
+        _, index = self._index(filters)
+        if self.distinct_mode == 'exact':
+            return self._distinct.count(index)
+        return _hll_estimate(self._distinct.reduce(np.maximum, index))
+
+    def stats(self, filters=None, percentiles=()):
+        """Row counts, date range and sales distribution over the selected cells.
+
+        The median and percentiles (0-100) come from the merged sketches,
+        nearest-rank, clipped to the exact minimum and maximum.
+        """
+        if not self._sketch:
+            raise ValueError('This cube has no sales sketches')
+        first_day, index = self._index(filters)
+        _, regions, products = index
+        rows = self._take(self.rows, index)
+        total = int(rows.sum())
+        days = np.flatnonzero(rows.sum(axis=(1, 2)))
+
+        def counts(labels, selected, axis):
+            # Every label is listed, like value_counts() of a categorical
+            counted = np.zeros(len(labels), dtype=np.int64)
+            counted[selected] = rows.sum(axis=axis)
+            return dict(sorted(zip(labels, counted.tolist()), key=lambda item: -item[1]))
+
+        quantiles, low, high = [None] * (len(percentiles) + 1), None, None
+        if total:
+            present = rows > 0
+            low = float(self._take(self._cells['sales_min'][:self.num_days], index)[present].min())
+            high = float(self._take(self._cells['sales_max'][:self.num_days], index)[present].max())
+            counts_by_bucket = self._sketch.reduce(np.add, index, dtype=np.uint64)
+            ranks = np.array([50] + list(percentiles), dtype=np.float64) / 100 * (total - 1)
+            buckets = np.searchsorted(np.cumsum(counts_by_bucket), ranks, side='right') + self._sketch_low
+            quantiles = np.clip(self._sketch_values(buckets), low, high)
+            # The extremes are exact, even where the sketch range had to be bounded
+            quantiles[ranks == 0], quantiles[ranks == total - 1] = low, high
+            quantiles = quantiles.tolist()
+
+        return {
+            'total_records': total,
+            'date_range': {
+                'start': str(first_day + days[0]) if total else None,
+                'end': str(first_day + days[-1]) if total else None
+            },
+            'regions': counts(self.regions, regions, (0, 2)),
+            'products': counts(self.products, products, (0, 1)),
+            'sales_stats': {
+                'min': low,
+                'max': high,
+                'mean': float(self._take(self.sales, index).sum()) / total if total else None,
+                'median': quantiles[0],
+                'percentiles': dict(zip(map(_percentile_label, percentiles), quantiles[1:]))
+            }
+        }
+
+    @staticmethod
+    def _positions(labels, selected):
+        """Index selecting the given labels in order (all of them for None)"""
+        if selected is None:
+            return slice(None)
+        return np.array([labels.index(label) for label in selected if label in labels], dtype=np.intp)
+
+    def _buckets(self, level, index):
+        """Bucket start days and per-bucket cells of a time level over a cube index.
+
+        Whole buckets are read from the pyramid; buckets that the selected
+        day range only partly covers are summed from the day cells instead.
+        """
+        days, regions, products = index
+        day_first = int(self.start_day.astype(np.int64))
+        level_first, level_cells = self._level(level)
+        measures = ('sales', 'orders', 'rows')
+        if days.stop <= days.start:
+            empty = self._take(self.rows, index)
+            return np.zeros(0, dtype=np.int64), {measure: empty for measure in measures}
+
+        first_id, last_id = day_first + days.start, day_first + days.stop - 1
+        first_bucket, last_bucket = _bucket_of(level, np.array([first_id, last_id]))
+        bounds = _bucket_start(level, np.arange(first_bucket, last_bucket + 2))
+        span = slice(first_bucket - level_first, last_bucket - level_first + 1)
+        cells = {measure: self._take(level_cells[measure], (span, regions, products)).copy()
+                 for measure in measures}
+
+        for i in {0, len(bounds) - 2}:
+            low, high = max(bounds[i], first_id), min(bounds[i + 1] - 1, last_id)
+            if low != bounds[i] or high != bounds[i + 1] - 1:
+                edge = (slice(low - day_first, high - day_first + 1), regions, products)
+                for measure in measures:
+                    cells[measure][i] = self._take(self._cells[measure], edge).sum(axis=0)
+        return bounds[:-1], cells
+
+    def dashboard_data(self, filters=None, granularity='day'):
+        """Totals and chart series for the filters, shaped like the row-based builders.
+
+        The sales trend is bucketed at granularity, and growth rates are
+        monthly for a daily trend and at the trend's granularity otherwise.
+        """
+        _, index = self._index(filters)
+        _, regions, products = index
+        region_labels = np.array(self.regions, dtype=object)[regions].tolist()
+        product_labels = np.array(self.products, dtype=object)[products].tolist()
+
+        trend_days, trend = self._buckets(granularity, index)
+        growth_level = 'month' if granularity == 'day' else granularity
+        growth_days, growth = trend_days, trend
+        if growth_level != granularity:
+            growth_days, growth = self._buckets(growth_level, index)
+        # Totals come from the coarsest level, a handful of buckets
+        _, totals = self._buckets(self.GRANULARITIES[-1], index)
+        sales, orders, rows = (totals[measure].sum(axis=0) for measure in ('sales', 'orders', 'rows'))
+
+        # Only buckets, regions and products that actually have rows are reported
+        trend_present = trend['rows'].sum(axis=(1, 2)) > 0
+        growth_present = growth['rows'].sum(axis=(1, 2)) > 0
+        region_present = rows.sum(axis=1) > 0
+        product_present = rows.sum(axis=0) > 0
+
+        return {
+            'total_sales': sales.sum(),
+            'total_orders': int(orders.sum()),
+            'charts': {
+                'sales_trend': {
+                    'dates': _day_labels(trend_days[trend_present]),
+                    'sales': trend['sales'].sum(axis=(1, 2))[trend_present].tolist()
+                },
+                'region_data': {
+                    'regions': [r for r, present in zip(region_labels, region_present) if present],
+                    'sales': sales.sum(axis=1)[region_present].tolist()
+                },
+                'product_data': {
+                    'products': [p for p, present in zip(product_labels, product_present) if present],
+                    'sales': sales.sum(axis=0)[product_present].tolist()
+                },
+                'growth_data': {
+                    'months': _period_labels(growth_level, growth_days[growth_present]),
+                    'growth_rates': _growth_rates(growth['sales'].sum(axis=(1, 2))[growth_present]).tolist()
+                },
+                'heatmap_data': {
+                    'regions': [r for r, present in zip(region_labels, region_present) if present],
+                    'products': [p for p, present in zip(product_labels, product_present) if present],
+                    'values': sales[region_present][:, product_present].tolist()
+                }
+            }
+        }
+
 
-        return pd.DataFrame(data)
+class InvalidFilter(ValueError):
+    """A filter parameter that could not be parsed"""
 
-    def get_filtered_data(self, region=None, product=None, date_range=None):
-        """Filter data based on parameters"""
-        df = self.data.copy()
 
-        # Convert date column to datetime for filtering
-        df['date'] = pd.to_datetime(df['date'])
+class FilterSpec:
+    """Normalized dashboard filters.
 
-        # Apply filters
-        if region and region != 'all':
-            df = df[df['region'] == region]
+    regions and products are sorted tuples of the selected labels (None
+    selects all of them), and start/end are inclusive datetime64[D] bounds
+    (None leaves that side open). A "days back" date_range becomes a start
+    bound, so filters that select the same rows have the same key().
+    """
 
-        if product and product != 'all':
-            df = df[df['product'] == product]
+    def __init__(self, region=None, product=None, date_range=None, start=None, end=None):
+        self.regions = self._labels(region)
+        self.products = self._labels(product)
+        self.start = self._day(start, 'start')
+        self.end = self._day(end, 'end')
 
         if date_range and date_range != 'all':
-            days_back = int(date_range)
-            cutoff_date = datetime.now() - timedelta(days=days_back)
-            df = df[df['date'] >= cutoff_date]
+            try:
+                cutoff = np.datetime64(_cutoff_date(date_range))
+            except (ValueError, OverflowError):
+                raise InvalidFilter(f'Invalid date_range: {date_range}') from None
+            # First whole day on or after the cutoff
+            first_day = cutoff.astype('datetime64[D]')
+            if first_day < cutoff:
+                first_day += 1
+            self.start = first_day if self.start is None else max(self.start, first_day)
+
+    @classmethod
+    def from_args(cls, args):
+        """Filters from query parameters; region and product may be repeated or comma-separated"""
+        def values(name):
+            return [value for item in args.getlist(name) for value in item.split(',')]
+
+        return cls(values('region'), values('product'), args.get('date_range'),
+                   args.get('start'), args.get('end'))
+
+    @classmethod
+    def from_dict(cls, spec):
+        """Filters from a JSON object with the query parameter names; labels may be lists"""
+        if not isinstance(spec, dict):
+            raise InvalidFilter(f'Filters must be an object: {spec!r}')
+        unknown = set(spec) - {'region', 'product', 'date_range', 'start', 'end'}
+        if unknown:
+            raise InvalidFilter(f'Unknown filters: {", ".join(sorted(unknown))}')
+
+        def values(name):
+            value = spec.get(name) or []
+            items = [value] if isinstance(value, str) else value
+            if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                raise InvalidFilter(f'Invalid {name}: {value!r}')
+            return [label for item in items for label in item.split(',')]
+
+        def day(name):
+            value = spec.get(name)
+            if value is not None and not isinstance(value, str):
+                raise InvalidFilter(f'Invalid {name} date: {value!r}')
+            return value
+
+        return cls(values('region'), values('product'), spec.get('date_range'), day('start'), day('end'))
+
+    @classmethod
+    def union(cls, filter_sets):
+        """Smallest filters selecting every row that any of filter_sets selects"""
+        def labels(selections):
+            return None if any(s is None for s in selections) else sorted(set().union(*selections))
+
+        def bound(days, pick):
+            return None if any(day is None for day in days) else pick(days)
+
+        union = cls(labels([f.regions for f in filter_sets]), labels([f.products for f in filter_sets]))
+        union.start = bound([f.start for f in filter_sets], min)
+        union.end = bound([f.end for f in filter_sets], max)
+        return union
+
+    @staticmethod
+    def _labels(value):
+        values = [value] if isinstance(value, str) else list(value or [])
+        values = [value for value in values if value]
+        if not values or 'all' in values:
+            return None
+        return tuple(sorted(set(values)))
+
+    @staticmethod
+    def _day(value, name):
+        if not value:
+            return None
+        try:
+            day = np.datetime64(value, 'D')
+        except ValueError:
+            day = np.datetime64('NaT')
+        if np.isnat(day):
+            raise InvalidFilter(f'Invalid {name} date: {value}')
+        return day
+
+    def key(self):
+        """Hashable form of the filters, for cache keys"""
+        return (
+            self.regions, self.products,
+            None if self.start is None else str(self.start),
+            None if self.end is None else str(self.end)
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, FilterSpec) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+def _cutoff_date(date_range):
+    """Earliest datetime included by a 'days back from now' date range"""
+    return datetime.now() - timedelta(days=int(date_range))
+
+
+def _bucket_of(level, days):
+    """Bucket numbers of a time level for day numbers (days since 1970-01-01)"""
+    if level == 'day':
+        return days
+    if level == 'week':
+        # 1970-01-01 was a Thursday; weeks start on Monday
+        return (days + 3) // 7
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    return months // 3 if level == 'quarter' else months
+
+
+def _bucket_start(level, buckets):
+    """Day numbers on which buckets of a time level start"""
+    if level == 'day':
+        return buckets
+    if level == 'week':
+        return buckets * 7 - 3
+    months = buckets * 3 if level == 'quarter' else buckets
+    return months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def _percentile_label(p):
+    """Key of percentile p in stats responses, e.g. 'p99' or 'p99.9'"""
+    return f'p{p:g}'
+
+
+def _day_labels(days):
+    return np.datetime_as_string(days.astype('datetime64[D]'), unit='D').tolist()
+
+
+def _period_labels(level, days):
+    """Labels for buckets starting on days, formatted like str() of the pandas Period"""
+    if level == 'month':
+        return np.datetime_as_string(days.astype('datetime64[D]').astype('datetime64[M]'), unit='M').tolist()
+    if level == 'quarter':
+        months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        return [f'{1970 + month // 12}Q{month % 12 // 3 + 1}' for month in months]
+    # Weeks are labelled by their first day
+    return _day_labels(days)
+
+
+def _hash64(values):
+    """SplitMix64 finalizer: well-mixed 64-bit hashes of integer codes"""
+    with np.errstate(over='ignore'):
+        h = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return h ^ (h >> np.uint64(31))
+
+
+def _hll_registers(values, precision):
+    """HyperLogLog register index and rank for each integer value"""
+    hashes = _hash64(values)
+    registers = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    remaining = hashes & np.uint64((1 << (64 - precision)) - 1)
+
+    # Rank is the position of the leftmost 1 bit in the remaining bits
+    bit_length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        wide = remaining >= (np.uint64(1) << np.uint64(shift))
+        bit_length[wide] += shift
+        remaining[wide] >>= np.uint64(shift)
+    bit_length += (remaining > 0)
+    ranks = (64 - precision) - bit_length + 1
+    return registers, ranks.astype(np.uint8)
+
+
+def _hll_estimate(registers):
+    """Cardinality estimate from merged HyperLogLog registers.
+
+    Uses Ertl's improved estimator (arXiv:1702.01284), which corrects the
+    raw HyperLogLog bias at small and mid-range cardinalities from the
+    register histogram, so no linear counting switch-over is needed.
+    """
+    m = len(registers)
+    q = 64 - int(np.log2(m))
+    counts = np.bincount(registers.astype(np.int64), minlength=q + 2)
+    z = m * _hll_tau(1 - counts[q + 1] / m)
+    for k in range(q, 0, -1):
+        z = 0.5 * (z + counts[k])
+    z += m * _hll_sigma(counts[0] / m)
+    return int(round(m * m / (2 * np.log(2)) / z))
+
+
+def _hll_sigma(x):
+    if x == 1:
+        return np.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _hll_tau(x):
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = np.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+def _growth_rates(values):
+    """Period-over-period percentage change, 0 for the first period (like pct_change)"""
+    if len(values) == 0:
+        return np.zeros(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.diff(values) / values[:-1] * 100
+    return np.nan_to_num(np.concatenate([[0.0], rates]), nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+
+def _categorical(codes, labels):
+    """Categorical over sorted labels from integer codes into labels"""
+    categories = sorted(labels)
+    remap = np.array([categories.index(label) for label in labels])
+    return pd.Categorical.from_codes(remap[codes], categories=categories)
+
+
+# Customer and order IDs are stored as their numbers. The prefix is removed
+# where IDs come in (files, raw records) and added back where they leave (exports).
+# Digits with leading zeros are stored negated with a 1 in front (0012 -> -10012),
+# so they stay apart from the same number without them and format back as given.
+ID_PREFIXES = {'customer_id': 'CUST_', 'order_id': 'ORD_'}
+
+
+def _id_numbers(values, prefix):
+    """Numbers of IDs formatted as prefix + n, in the smallest integer type holding them.
+
+    The prefix is optional, so bare numbers are accepted too. Raises ValueError
+    naming a few values that are missing or not of that form.
+    """
+    # Each distinct value is parsed once
+    ids = pd.Series(values).astype('category')
+    labels = ids.cat.categories
+    if labels.dtype.kind in 'iu':
+        parsed = labels.to_numpy()
+        if (parsed < 0).any():
+            raise ValueError(f'expected non-negative numbers, got {", ".join(map(str, parsed[parsed < 0][:5]))}')
+    else:
+        labels = labels.astype(str)
+        digits = labels.str.removeprefix(prefix)
+        # At most 18 digits, so even padded ones fit an int64
+        valid = digits.str.fullmatch(r'[0-9]{1,18}')
+        if not valid.all():
+            raise ValueError(f'expected {prefix}<number>, got {", ".join(labels[~valid][:5])}')
+        padded = (digits.str.len() > 1) & digits.str.startswith('0')
+        parsed = np.where(padded, -('1' + digits).astype(np.int64), digits.astype(np.int64))
+    if ids.isna().any():
+        raise ValueError('missing IDs')
+    numbers = parsed[ids.cat.codes.to_numpy()]
+    return pd.to_numeric(numbers.astype(np.int64), downcast='integer')
+
+
+def _id_labels(numbers, prefix):
+    """IDs formatted as prefix + n, each distinct number formatted once"""
+    uniques, inverse = np.unique(numbers, return_inverse=True)
+    labels = np.array([f'{prefix}{n}' if n >= 0 else f'{prefix}{str(-n)[1:]}' for n in uniques.tolist()],
+                      dtype=object)
+    return labels[inverse]
+
+
+def _export_frame(df):
+    """Chunk as exported, with ID numbers formatted back into IDs (1234 -> CUST_1234)"""
+    ids = {}
+    for name, prefix in ID_PREFIXES.items():
+        # Categorical ID columns hold their numbers as categories
+        numbers = np.asarray(df[name])
+        if numbers.dtype.kind in 'iu':
+            ids[name] = _id_labels(numbers, prefix)
+    return df.assign(**ids) if ids else df
+
+
+class ResponseCache:
+    """Bounded LRU cache of serialized API responses.
+
+    Keys include the data version, so a write makes every older entry stale;
+    those are dropped as soon as a newer version is seen. Entries also expire
+    after a TTL, and the least recently used ones are evicted to stay within
+    both an entry count and a memory budget. Entries the CacheWarmer put in
+    ahead of any request are marked, so hits on them are counted apart.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.warm_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _invalidate_older(self, version):
+        if self._version is not None and version > self._version:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+        self._version = version if self._version is None else max(self._version, version)
+
+    def get(self, key, version):
+        """Cached (body, etag) for key at version, or None"""
+        with self._lock:
+            self._invalidate_older(version)
+            entry = self._entries.get((key, version))
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._remove((key, version))
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, version))
+            self.hits += 1
+            self.warm_hits += entry[3]
+            return entry[0], entry[1]
+
+    def contains(self, key, version):
+        """Whether key has an unexpired entry at version (not counted as a lookup)"""
+        with self._lock:
+            entry = self._entries.get((key, version))
+            return entry is not None and entry[2] >= time.monotonic()
+
+    def put(self, key, version, body, etag, warmed=False):
+        with self._lock:
+            self._invalidate_older(version)
+            if version < self._version or len(body) > self.max_bytes:
+                return
+            if (key, version) in self._entries:
+                self._remove((key, version))
+            self._entries[(key, version)] = (body, etag, time.monotonic() + self.ttl, warmed)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_key):
+        body = self._entries.pop(entry_key)[0]
+        self._bytes -= len(body)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'warm_hits': self.warm_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'warm_hit_rate': self.warm_hits / lookups if lookups else 0.0
+            }
 
-        return df
+
+class Metrics:
+    """Thread-safe latency histograms and counters in Prometheus text format.
+
+    Histograms use fixed buckets, so recording is O(1) and p50/p95/p99 are
+    estimated from the bucket counts the way histogram_quantile() does.
+    Every histogram is also rendered as a summary carrying those quantiles.
+    """
+
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    # name: (type, help, summary name for histograms)
+    FAMILIES = {
+        'dashboard_request_duration_seconds': (
+            'histogram', 'Time to produce a response, by endpoint', 'dashboard_request_latency_seconds'),
+        'dashboard_stage_duration_seconds': (
+            'histogram', 'Time spent in each processing stage', 'dashboard_stage_latency_seconds'),
+        'dashboard_requests_total': ('counter', 'Requests by endpoint and status', None),
+        'dashboard_stage_rows_total': ('counter', 'Rows handled by each processing stage', None),
+        'dashboard_response_cache_lookups_total': (
+            'counter', 'Response cache lookups by endpoint and result', None),
+        'dashboard_push_events_total': ('counter', 'Server-Sent Events queued for subscribers', None),
+        'dashboard_ingest_commits_total': ('counter', 'Group commits of ingested batches', None),
+        'dashboard_cache_warm_duration_seconds': (
+            'histogram', 'Time from a new data version to its hottest responses being cached',
+            'dashboard_cache_warmer_lag_seconds'),
+        'dashboard_cache_warmer_builds_total': (
+            'counter', 'Hot responses the warmer built, found cached or gave up on as stale', None),
+    }
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        """Record one value in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Time the body as stage name; rows (or the yielded object's .rows) count handled rows"""
+        timing = SimpleNamespace(rows=rows)
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            self.observe('dashboard_stage_duration_seconds', time.perf_counter() - start, stage=name)
+            if timing.rows is not None:
+                self.increment('dashboard_stage_rows_total', int(timing.rows), stage=name)
+
+    def timed(self, name):
+        """Decorator timing every call of a function as stage name"""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def quantile(self, counts, q):
+        """Estimate the q-quantile from per-bucket counts by linear interpolation"""
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts[:-1]):
+            if count and cumulative + count >= rank:
+                lower = self.BUCKETS[i - 1] if i else 0.0
+                return lower + (self.BUCKETS[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        # Past the last finite bucket, the best estimate is its upper bound
+        return self.BUCKETS[-1]
+
+    def render(self, gauges=()):
+        """Prometheus text exposition of all metrics plus (name, help, [(labels, value)]) gauges"""
+        with self._lock:
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name, (kind, help_text, summary) in self.FAMILIES.items():
+            if kind == 'counter':
+                samples = sorted((labels, value) for (family, labels), value in counters.items()
+                                 if family == name)
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{_prometheus_labels(labels)} {value}' for labels, value in samples]
+                continue
+
+            series = sorted((labels, h) for (family, labels), h in histograms.items() if family == name)
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for labels, (counts, total, count) in series:
+                cumulative = 0
+                for bound, bucket_count in zip(self.BUCKETS + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    le = (('le', bound if isinstance(bound, str) else repr(bound)),)
+                    lines.append(f'{name}_bucket{_prometheus_labels(labels + le)} {cumulative}')
+                lines.append(f'{name}_sum{_prometheus_labels(labels)} {total!r}')
+                lines.append(f'{name}_count{_prometheus_labels(labels)} {count}')
+
+            lines += [f'# HELP {summary} {help_text} (quantiles estimated from histogram buckets)',
+                      f'# TYPE {summary} summary']
+            for labels, (counts, total, count) in series:
+                for q in self.QUANTILES:
+                    value = self.quantile(counts, q)
+                    lines.append(f'{summary}{_prometheus_labels(labels + (("quantile", str(q)),))} {value!r}')
+                lines.append(f'{summary}_sum{_prometheus_labels(labels)} {total!r}')
+                lines.append(f'{summary}_count{_prometheus_labels(labels)} {count}')
+
+        for name, help_text, samples in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            lines += [f'{name}{_prometheus_labels(tuple(sorted(labels.items())))} {value!r}'
+                      for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_labels(labels):
+    """{name="value",...} with values escaped, or '' without labels"""
+    if not labels:
+        return ''
+
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval.
+
+    write() produces the collapsed ("folded") stack format read by
+    flamegraph.pl, speedscope and similar tools: one line per distinct
+    stack, frames root-first separated by ';', then the sample count.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
+
+
+class UpdateHub:
+    """Fans dashboard updates out to Server-Sent Events subscribers.
+
+    Subscribers with the same filters form a group. When a new snapshot is
+    published, each group's dashboard data is computed once and only what
+    changed since the group's last update is queued for its subscribers,
+    so the cost of a write grows with the number of distinct filter
+    combinations being watched, not with the number of clients.
+
+    A subscriber whose queue is full is dropped rather than slowing the
+    others down; its stream ends, and an EventSource reconnects and starts
+    again from a full dashboard.
+
+    Compact subscribers get their sales trends, in snapshots and updates
+    alike, in the typed-array encoding of compact_dashboard_data.
+    """
+
+    QUEUE_SIZE = 64
+
+    def __init__(self, backend, refresh_interval=1.0):
+        self.backend = backend
+        # How often to look for rows other processes wrote, which nothing here announces
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._thread = None
+
+    def subscribe(self, filters, granularity='day', max_points=None, compact=False):
+        """New subscriber whose queue starts with the full dashboard for the filters"""
+        key = filters.key() + (granularity, max_points, compact)
+        subscriber = _Subscriber(key, self.QUEUE_SIZE)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = SimpleNamespace(
+                    filters=filters, granularity=granularity, max_points=max_points, compact=compact,
+                    lock=threading.Lock(), subscribers=set(), data=None, version=None
+                )
+            with group.lock:
+                # Later updates are differences from this, so both happen under the group lock
+                if group.data is None:
+                    snapshot = self.backend.snapshot
+                    group.data = self._compute(group, snapshot)
+                    group.version = snapshot.version
+                data = group.data
+                if group.compact:
+                    # group.data stays plain JSON, as later updates are diffed against it
+                    data = compact_dashboard_data(dict(data, charts=dict(data['charts'])))
+                subscriber.queue.put(self._event('snapshot', group.version, data))
+                group.subscribers.add(subscriber)
+            metrics.increment('dashboard_push_events_total', event='snapshot')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='update-hub', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            group = self._groups.get(subscriber.key)
+            if group is None:
+                return
+            with group.lock:
+                group.subscribers.discard(subscriber)
+                if not group.subscribers:
+                    del self._groups[subscriber.key]
+
+    def close(self):
+        """End every subscriber's stream"""
+        with self._lock:
+            groups = list(self._groups.values())
+        for group in groups:
+            with group.lock:
+                for subscriber in list(group.subscribers):
+                    self._drop(group, subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(group.subscribers) for group in self._groups.values())
+
+    def _run(self):
+        version = self.backend.version
+        while True:
+            snapshot = self.backend.wait_for_change(version, self.refresh_interval)
+            if snapshot.version == version:
+                self.backend.refresh()
+                continue
+            # Versions published while the last round ran are folded into this one
+            version = snapshot.version
+            with self._lock:
+                groups = list(self._groups.values())
+            for group in groups:
+                self._update(group, snapshot)
+
+    def _update(self, group, snapshot):
+        with group.lock:
+            if not group.subscribers or group.version >= snapshot.version:
+                return
+            with metrics.stage('push_update'):
+                data = self._compute(group, snapshot)
+                changes = self._changes(group.data, data)
+                group.data, group.version = data, snapshot.version
+                if not changes:
+                    return
+                changes['total_records'] = len(snapshot)
+                if group.compact and 'trend' in changes:
+                    trend = changes['trend']
+                    changes['trend'] = dict(compact_trend(trend), replace=trend.get('replace', False))
+                event = self._event('update', snapshot.version, changes)
+            for subscriber in list(group.subscribers):
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    self._drop(group, subscriber)
+            metrics.increment('dashboard_push_events_total', len(group.subscribers), event='update')
+
+    def _drop(self, group, subscriber):
+        group.subscribers.discard(subscriber)
+        subscriber.closed = True
+        try:
+            # Wake the stream so it notices; a full queue is drained first anyway
+            subscriber.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _compute(self, group, snapshot):
+        return compute_dashboard_data(group.filters, 'cube', group.max_points, group.granularity, snapshot)
+
+    @staticmethod
+    def _changes(old, new):
+        """The KPIs, trend points and charts of new that differ from old"""
+        changes = {}
+        metrics_changed = {
+            name: value for name, value in new['metrics'].items() if old['metrics'].get(name) != value
+        }
+        if metrics_changed:
+            changes['metrics'] = metrics_changed
+
+        old_trend, trend = old['charts']['sales_trend'], new['charts']['sales_trend']
+        if trend['dates'][:len(old_trend['dates'])] != old_trend['dates']:
+            # Points were dropped or moved (e.g. a different downsampling): resend them all
+            changes['trend'] = dict(trend, replace=True)
+        else:
+            old_sales = dict(zip(old_trend['dates'], old_trend['sales']))
+            points = [
+                (date, sales) for date, sales in zip(trend['dates'], trend['sales'])
+                if old_sales.get(date) != sales
+            ]
+            if points:
+                dates, sales = zip(*points)
+                changes['trend'] = {'dates': list(dates), 'sales': list(sales),
+                                    'resolution': trend['resolution']}
+
+        charts = {
+            name: chart for name, chart in new['charts'].items()
+            if name != 'sales_trend' and old['charts'].get(name) != chart
+        }
+        if charts:
+            changes['charts'] = charts
+        return changes
+
+    @staticmethod
+    def _event(name, version, data):
+        """One encoded Server-Sent Event, shared by every subscriber it goes to"""
+        return f'event: {name}\nid: {version}\ndata: {app.json.dumps(data)}\n\n'.encode('utf-8')
+
+
+class CacheWarmer:
+    """Rebuilds the most requested responses in the background after every write.
+
+    Requests record their cache key and how to build the response. Counts
+    are halved every DECAY_EVERY requests, so popularity follows recent
+    traffic and keys nobody asks for any more drop out. When a new
+    snapshot is published, the top entries that aren't cached for it yet
+    are built on at most concurrency threads. After each build a thread
+    stays idle in proportion to the CPU time it used, so together they
+    average at most cpu_budget of one CPU. Entries still queued when a
+    newer snapshot arrives are skipped as stale, and the warmer moves on
+    to the new one.
+    """
+
+    DECAY_EVERY = 1000
+    MAX_TRACKED = 1024
+
+    def __init__(self, backend, cache, top=32, concurrency=2, cpu_budget=0.5):
+        if top and not 0 < cpu_budget <= concurrency:
+            raise ValueError(f'CPU budget must be between 0 and the number of threads: {cpu_budget}')
+        self.backend = backend
+        self.cache = cache
+        self.top = top
+        self.concurrency = concurrency
+        self.cpu_budget = cpu_budget
+        self._lock = threading.Lock()
+        self._tracked = {}
+        self._recorded = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def record(self, key, build):
+        """Count a request for key; build(snapshot) returns its (body, etag)"""
+        if not self.top:
+            return
+        with self._lock:
+            entry = self._tracked.get(key)
+            if entry is None:
+                entry = self._tracked[key] = SimpleNamespace(key=key, build=build, requests=0.0)
+            entry.requests += 1
+            self._recorded += 1
+            if self._recorded % self.DECAY_EVERY == 0 or len(self._tracked) > self.MAX_TRACKED:
+                self._decay()
+            if self._thread is None:
+                for i in range(self.concurrency):
+                    threading.Thread(target=self._work, name=f'cache-warmer-{i}', daemon=True).start()
+                self._thread = threading.Thread(target=self._run, name='cache-warmer', daemon=True)
+                self._thread.start()
+
+    def tracked_count(self):
+        with self._lock:
+            return len(self._tracked)
+
+    def hottest(self):
+        """Tracked entries, most requested first, up to top of them"""
+        with self._lock:
+            return heapq.nlargest(self.top, self._tracked.values(), key=lambda entry: entry.requests)
+
+    def _decay(self):
+        for key, entry in list(self._tracked.items()):
+            entry.requests /= 2
+            if entry.requests < 0.5:
+                del self._tracked[key]
+
+    def _run(self):
+        version = self.backend.version
+        while True:
+            snapshot = self.backend.wait_for_change(version)
+            version = snapshot.version
+            changed = time.perf_counter()
+            for entry in self.hottest():
+                self._queue.put((entry, snapshot))
+            self._queue.join()
+            # A round cut short by a newer snapshot is not a lag; the next round's is
+            if self.backend.version == version:
+                metrics.observe('dashboard_cache_warm_duration_seconds', time.perf_counter() - changed)
+
+    def _work(self):
+        resume = 0.0
+        while True:
+            entry, snapshot = self._queue.get()
+            try:
+                time.sleep(max(resume - time.monotonic(), 0))
+                spent = self._warm(entry, snapshot)
+                resume = time.monotonic() + spent * (self.concurrency / self.cpu_budget - 1)
+            finally:
+                self._queue.task_done()
+
+    def _warm(self, entry, snapshot):
+        """Build entry's response for snapshot unless that is pointless; returns the CPU time used"""
+        spent = 0.0
+        if self.backend.version != snapshot.version:
+            result = 'stale'
+        elif self.cache.contains(entry.key, snapshot.version):
+            result = 'cached'
+        else:
+            started = time.thread_time()
+            try:
+                body, etag = entry.build(snapshot)
+                self.cache.put(entry.key, snapshot.version, body, etag, warmed=True)
+                result = 'built'
+            except Exception:
+                # The next request for the key gets the error itself
+                result = 'failed'
+            spent = time.thread_time() - started
+        metrics.increment('dashboard_cache_warmer_builds_total', result=result)
+        return spent
+
+
+class IngestLogFull(Exception):
+    """The ingest log of a backend that persists nothing has reached its size limit"""
+
+
+class IngestLog:
+    """Append-only write-ahead log for /api/ingest, with group commit.
+
+    A batch is written to the log and fsynced before it is appended to the
+    backend. Concurrent batches are committed together: whichever caller
+    gets the commit lock takes every batch queued by then, logs them as one
+    record with one fsync and appends them as one batch, so the fsync and
+    the per-append costs (a cube copy, a snapshot) are shared.
+
+    Each record stores the row count the backend had before its batch. On
+    start, replay() appends the batches the backend doesn't hold yet: all
+    of them for the in-memory backend, which starts over from sample data,
+    and none that a persistent backend already stored. A torn record at
+    the end, from a crash mid-write, was never acknowledged and is cut off.
+
+    A batch the backend rejects is cut from the log again, so it is never
+    replayed. If one is left behind anyway (another process logged after
+    it), replay() moves it to a .rejected file instead of failing.
+
+    The log is emptied whenever it passes max_bytes and the backend has
+    persisted everything in it. The in-memory backend persists nothing, so
+    its log is the only copy of ingested rows and is replayed in full on
+    every start; once it reaches max_bytes, append() raises IngestLogFull
+    rather than let it grow without bound.
+    """
+
+    MAGIC = b'SWAL'
+    # magic, payload bytes, CRC-32 of the payload, rows stored before the batch
+    HEADER = struct.Struct('<4sIIQ')
+
+    def __init__(self, path, backend, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.commits = 0
+        self.batches = 0
+        self._file = None
+        self._queue = []
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+
+    def append(self, df):
+        """Log a typed batch durably, then append it; returns the snapshot that includes it"""
+        entry = SimpleNamespace(frame=df, done=False, snapshot=None, error=None)
+        with self._lock:
+            self._queue.append(entry)
+        with self._commit_lock:
+            # A previous leader may have committed this batch while we waited
+            if not entry.done:
+                with self._lock:
+                    group, self._queue = self._queue, []
+                self._commit(group)
+        if entry.error is not None:
+            raise entry.error
+        return entry.snapshot
+
+    def _commit(self, group):
+        record = offset = None
+        try:
+            frames = [entry.frame for entry in group]
+            frame = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            with metrics.stage('wal_write', rows=len(frame)):
+                record = self._record(frame, len(self.backend.snapshot))
+                if not self.backend.persistent and self._size() + len(record) > self.max_bytes:
+                    raise IngestLogFull(f'The ingest log has reached {self.max_bytes} bytes; '
+                                        f'use a persistent store (DATA_DIR) to ingest more rows')
+                offset = self._write(record)
+            snapshot = self.backend.append_records(frame)
+            for entry in group:
+                entry.snapshot = snapshot
+        except Exception as error:
+            if offset is not None:
+                self._unwrite(offset, len(record))
+            if len(group) > 1:
+                # One bad batch must not fail the others committed with it
+                for entry in group:
+                    self._commit([entry])
+                return
+            for entry in group:
+                entry.error = error
+            return
+        finally:
+            for entry in group:
+                entry.done = True
+        self.commits += 1
+        self.batches += len(group)
+        metrics.increment('dashboard_ingest_commits_total')
+        if self.backend.persistent and self._size() > self.max_bytes:
+            self._truncate()
+
+    def _size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def _write(self, record):
+        """Append a record durably; returns the offset it starts at"""
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        # Other processes may append to the same log
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            offset = os.fstat(self._file.fileno()).st_size
+            self._file.write(record)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            return offset
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _unwrite(self, offset, size):
+        """Cut a record the backend rejected off the log, unless something was logged after it"""
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._file.fileno()).st_size == offset + size:
+                os.truncate(self.path, offset)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _record(self, df, start):
+        """Header plus payload: a JSON line describing the columns, then their raw bytes"""
+        columns, buffers = [], []
+        for name in SalesFileReader.COLUMNS:
+            values = df[name]
+            categorical = name in self.backend.categories
+            if categorical:
+                values = pd.Categorical(values, categories=self.backend.categories[name]).codes
+            array = np.ascontiguousarray(values)
+            columns.append([name, array.dtype.str, categorical])
+            buffers.append(array.tobytes())
+        payload = json.dumps({'rows': len(df), 'columns': columns}).encode('utf-8') + b'\n' + b''.join(buffers)
+        return self.HEADER.pack(self.MAGIC, len(payload), zlib.crc32(payload), start) + payload
+
+    def _frame(self, payload):
+        header, _, data = payload.partition(b'\n')
+        meta = json.loads(header)
+        columns, offset = {}, 0
+        for name, dtype, categorical in meta['columns']:
+            values = np.frombuffer(data, np.dtype(dtype), meta['rows'], offset)
+            offset += values.nbytes
+            if categorical:
+                values = pd.Categorical.from_codes(values, categories=self.backend.categories[name])
+            columns[name] = values
+        return pd.DataFrame(columns)
+
+    def _scan(self):
+        """(start, frame, record) of each intact record, and the length of the intact part of the log"""
+        records, end = [], 0
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    break
+                magic, size, checksum, start = self.HEADER.unpack(header)
+                payload = f.read(size)
+                if magic != self.MAGIC or len(payload) < size or zlib.crc32(payload) != checksum:
+                    break
+                records.append((start, self._frame(payload), header + payload))
+                end = f.tell()
+        return records, end
+
+    def replay(self):
+        """Append logged batches the backend doesn't hold yet; returns how many rows"""
+        if not os.path.exists(self.path):
+            return 0
+        with self._commit_lock:
+            records, end = self._scan()
+            if end < os.path.getsize(self.path):
+                os.truncate(self.path, end)
+            stored = len(self.backend.snapshot)
+            pending = [(frame, record) for start, frame, record in records if start + len(frame) > stored]
+            if not pending:
+                return 0
+            try:
+                self.backend.append_records(pd.concat([frame for frame, _ in pending], ignore_index=True))
+                return sum(len(frame) for frame, _ in pending)
+            except Exception:
+                pass
+
+            # Something in the log can't be applied: apply batch by batch and set the rest aside
+            replayed, rejected = 0, []
+            for frame, record in pending:
+                try:
+                    self.backend.append_records(frame)
+                    replayed += len(frame)
+                except Exception as error:
+                    print(f'Skipping a logged batch of {len(frame):,} rows that cannot be applied ({error}); '
+                          f'moved to {self.path}.rejected', file=sys.stderr)
+                    rejected.append(record)
+            if rejected:
+                with open(f'{self.path}.rejected', 'ab') as f:
+                    f.writelines(rejected)
+                self._rewrite([record for _, _, record in records if all(record is not bad for bad in rejected)])
+            return replayed
+
+    def _rewrite(self, records):
+        """Replace the log by the given records"""
+        with open(f'{self.path}.tmp', 'wb') as f:
+            f.writelines(records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{self.path}.tmp', self.path)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """Close the log file; the next append reopens it"""
+        with self._commit_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def checkpoint(self):
+        """Empty the log once a persistent backend holds everything in it"""
+        with self._commit_lock:
+            if self.backend.persistent and os.path.exists(self.path):
+                self._truncate()
+
+    def _truncate(self):
+        with open(self.path, 'ab') as f:
+            # Not while another process is writing a record
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                os.truncate(self.path, 0)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class _Subscriber:
+    """One event stream: its group's key and its queue of encoded events"""
+
+    def __init__(self, key, queue_size):
+        self.key = key
+        self.queue = queue.Queue(queue_size)
+        self.closed = False
+
+
+class RealtimeSimulator:
+    """Appends a few random sales every interval seconds, standing in for live sales.
+
+    This replaces the page's old habit of writing through /api/realtime
+    on every refresh, which made each open dashboard a writer.
+    """
+
+    def __init__(self, backend, interval=30.0):
+        self.backend = backend
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start appending in the background (once, and only with a positive interval)"""
+        with self._lock:
+            if self._thread is None and self.interval > 0:
+                self._thread = threading.Thread(target=self._run, name='realtime-simulator', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        rng = np.random.RandomState()
+        while True:
+            time.sleep(self.interval)
+            records = self.backend.generate_realtime_records(rng.randint(1, 6), rng)
+            with metrics.stage('append', rows=len(records)):
+                self.backend.append_records(records)
+
+
+def _aggregate_partition(path, categories, start, stop, filters, distinct_mode):
+    """Cube of rows start:stop of the store at path that the filters select (in a worker).
+
+    Without a distinct index the customer codes present are returned too.
+    """
+    columns = {}
+
+    def column(name):
+        # The same pages the parent maps, so nothing is copied in
+        if name not in columns:
+            columns[name] = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')[start:stop]
+        return columns[name]
+
+    store = SimpleNamespace(categories=categories, column=column)
+    rows = select_labels(store, slice(0, stop - start), filters)
+    cube = fused_cube(store, rows, distinct_mode)
+    if distinct_mode:
+        return cube, None
+    return cube, np.unique(column('customer_id')[rows])
+
+
+class PartitionedAggregator:
+    """Splits fused scans of a stored ColumnStore across worker processes.
+
+    The rows are cut into ranges of about partition_rows (a few per worker
+    so an uneven range doesn't hold up the rest). Workers memory-map the
+    store's column files, so with the store on a RAM-backed filesystem
+    every process reads the same pages. Each returns a partial cube and the
+    parent merges them: totals add, distinct indexes combine, and without
+    one the partitions' customer IDs are unioned.
+
+    The pool forks when the aggregator is created, which must happen before
+    the app starts any threads. With no workers nothing is accepted and
+    callers scan in-process.
+    """
+
+    def __init__(self, workers=0, partition_rows=250_000):
+        self.workers = workers
+        self.partition_rows = partition_rows
+        self._pool = None
+        if workers:
+            self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+            # A forking pool starts every worker on the first task
+            self._pool.submit(int).result()
+
+    @staticmethod
+    def shared_dir():
+        """A scratch directory in shared memory (if there is one) for a store, removed at exit"""
+        path = tempfile.mkdtemp(prefix='sales-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        atexit.register(shutil.rmtree, path, ignore_errors=True)
+        return path
+
+    def accepts(self, store, rows):
+        """Whether rows of store (from key_range) are worth splitting across the workers"""
+        return (self._pool is not None and bool(store.path) and isinstance(rows, slice)
+                and rows.stop - rows.start >= 2 * self.partition_rows)
+
+    def aggregate(self, store, rows, filters=None, distinct_mode=None):
+        """Cube and distinct customer count of the rows in a slice that the filters select"""
+        parts = min(4 * self.workers, -(-(rows.stop - rows.start) // self.partition_rows))
+        bounds = np.linspace(rows.start, rows.stop, parts + 1).astype(np.int64).tolist()
+        tasks = [(store.path, store.categories, start, stop, filters, distinct_mode)
+                 for start, stop in zip(bounds, bounds[1:])]
+
+        cube = RollupCube(store.categories['region'], store.categories['product'], distinct_mode)
+        customer_ids = []
+        for partial, ids in self._pool.map(_aggregate_partition, *zip(*tasks)):
+            cube.merge(partial)
+            customer_ids.append(ids)
+        if distinct_mode:
+            return cube, cube.distinct_customers()
+        return cube, len(np.unique(np.concatenate(customer_ids)))
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(cancel_futures=True)
+
+
+# Initialize data generator ('hll' trades exact unique customer counts for speed).
+# /api/stats percentiles come from sales sketches with QUANTILE_ERROR relative
+# error (0 computes them from the rows instead).
+# With DATA_DIR set, the dataset is memory-mapped from disk and survives restarts.
+# With DATA_FILE set, sales are loaded from that CSV, .csv.gz, Parquet or Arrow
+# file instead of being generated. STORAGE_BACKEND=sqlite keeps the rows in an
+# SQLite database at SQLITE_PATH instead, with filters and aggregates run as SQL.
+# AGGREGATION_WORKERS > 0 splits large fused scans across that many processes;
+# without DATA_DIR the store is then kept in shared memory for them to map.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'pandas')
+AGGREGATION_WORKERS = int(os.environ.get('AGGREGATION_WORKERS', '0'))
+# Loaded and ingested rows may be dated at most this many days before the
+# first stored day or after the last (the cube covers every day in between)
+DATE_WINDOW_DAYS = int(os.environ.get('DATE_WINDOW_DAYS', str(SalesFileReader.DATE_WINDOW_DAYS)))
+if STORAGE_BACKEND == 'sqlite':
+    data_gen = SqliteBackend(
+        os.environ.get('SQLITE_PATH', 'sales.db'),
+        source=os.environ.get('DATA_FILE'),
+        date_window_days=DATE_WINDOW_DAYS
+    )
+elif STORAGE_BACKEND == 'pandas':
+    data_gen = DataGenerator(
+        distinct_mode=os.environ.get('DISTINCT_MODE', 'exact'),
+        hll_error=float(os.environ.get('HLL_ERROR', '0.02')),
+        data_dir=os.environ.get('DATA_DIR'),
+        source=os.environ.get('DATA_FILE'),
+        quantile_error=float(os.environ.get('QUANTILE_ERROR', '0.01')) or None,
+        store_dir=PartitionedAggregator.shared_dir() if AGGREGATION_WORKERS and not os.environ.get('DATA_DIR') else None,
+        date_window_days=DATE_WINDOW_DAYS
+    )
+else:
+    raise ValueError(f'Unknown STORAGE_BACKEND: {STORAGE_BACKEND}')
+atexit.register(data_gen.checkpoint)
+# Before anything starts a thread: the workers are forked here
+aggregator = PartitionedAggregator(AGGREGATION_WORKERS if STORAGE_BACKEND == 'pandas' else 0)
+atexit.register(aggregator.close)
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_ENTRIES', '512')),
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_BYTES', str(64 * 1024 * 1024))),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', '300'))
+)
+metrics = Metrics()
+# After every write, the CACHE_WARM_TOP most requested /api/data responses are
+# rebuilt on CACHE_WARM_THREADS threads using at most CACHE_WARM_CPU of one CPU
+# between them (CACHE_WARM_TOP=0 turns this off)
+cache_warmer = CacheWarmer(
+    data_gen, response_cache,
+    top=int(os.environ.get('CACHE_WARM_TOP', '32')),
+    concurrency=int(os.environ.get('CACHE_WARM_THREADS', '2')),
+    cpu_budget=float(os.environ.get('CACHE_WARM_CPU', '0.5'))
+)
+# Dashboards subscribe to /api/stream; the simulator writes every REALTIME_INTERVAL
+# seconds while at least one stream has been opened (0 turns it off)
+update_hub = UpdateHub(data_gen)
+realtime_simulator = RealtimeSimulator(data_gen, float(os.environ.get('REALTIME_INTERVAL', '30')))
+# Batches posted to /api/ingest are logged to INGEST_WAL before they are applied;
+# the ones the dataset doesn't hold yet are replayed here on start. Without
+# DATA_DIR the log is the only copy of ingested rows, so it is capped at
+# INGEST_WAL_MAX_BYTES; a persistent store lets it be emptied at that size.
+ingest_log = IngestLog(
+    os.environ.get('INGEST_WAL', 'ingest.wal'), data_gen,
+    max_bytes=int(os.environ.get('INGEST_WAL_MAX_BYTES', str(256 * 1024 * 1024)))
+)
+ingest_log.replay()
+atexit.register(ingest_log.checkpoint)
+atexit.register(ingest_log.close)
+INGEST_MAX_BYTES = int(os.environ.get('INGEST_MAX_BYTES', str(64 * 1024 * 1024)))
+# With PROFILE_DIR set, requests with ?profile=1 write a collapsed stack file there
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.001'))
+
+
+def cached_json_response(key, build, mimetype='application/json', compress=False, warm=False):
+    """JSON response for key, built by build(snapshot) only on a cache miss.
+
+    The snapshot is pinned once, so the body and the version it is cached
+    under always describe the same data.
+
+    Responses carry an ETag derived from the body, so clients sending a
+    matching If-None-Match get an empty 304 instead. With compress, the
+    cached body is gzip-encoded once and served as such. With warm, the
+    request counts towards the keys the cache warmer rebuilds after writes.
+    """
+    key = key + (mimetype, compress)
+    if warm:
+        cache_warmer.record(key, lambda snapshot: response_body(build(snapshot), compress))
+    snapshot = data_gen.snapshot
+    version = snapshot.version
+    cached = response_cache.get(key, version)
+    metrics.increment('dashboard_response_cache_lookups_total', endpoint=request.endpoint,
+                      result='miss' if cached is None else 'hit')
+    if cached is None:
+        body, etag = response_body(build(snapshot), compress)
+        response_cache.put(key, version, body, etag)
+        cache_status = 'MISS'
+    else:
+        body, etag = cached
+        cache_status = 'HIT'
+
+    response = Response(body, mimetype=mimetype)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    response.headers['X-Cache'] = cache_status
+    return response.make_conditional(request)
+
+
+def response_body(data, compress=False):
+    """Serialized (and with compress, gzip-encoded) body of data and its ETag"""
+    with metrics.stage('serialize'):
+        body = app.json.dumps(data).encode('utf-8')
+    if compress:
+        with metrics.stage('compress'):
+            body = gzip.compress(body, compresslevel=6)
+    return body, hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+# Opt-in chart payload with typed-array series (see compact_dashboard_data)
+COMPACT_MIMETYPE = 'application/vnd.dashboard.compact+json'
+
+
+def wants_compact():
+    """Whether the client prefers the compact payload over plain JSON"""
+    best = request.accept_mimetypes.best_match(['application/json', COMPACT_MIMETYPE])
+    return best == COMPACT_MIMETYPE
+
+
+def compact_dashboard_data(data):
+    """Re-encode the sales trend as base64 little-endian typed arrays.
+
+    Dates become Int32 day offsets from base_day (days since 1970-01-01) and
+    sales become Float32, which the dashboard decodes straight into typed
+    arrays for Plotly instead of parsing long JSON lists of strings and floats.
+    """
+    data['charts']['sales_trend'] = compact_trend(data['charts']['sales_trend'])
+    return data
+
+
+def compact_trend(trend):
+    """A sales trend (or some of its points) in the compact encoding"""
+    days = np.array(trend['dates'], dtype='datetime64[D]').astype(np.int64)
+    base_day = int(days[0]) if len(days) else 0
+    return {
+        'encoding': 'compact',
+        'base_day': base_day,
+        'day_offsets': _base64_array(days - base_day, '<i4'),
+        'sales': _base64_array(trend['sales'], '<f4'),
+        'resolution': trend.get('resolution')
+    }
+
+
+def _base64_array(values, dtype):
+    return base64.b64encode(np.asarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+@app.before_request
+def start_request():
+    """Start the request timer, and the profiler if this request asked for it"""
+    g.request_started = time.perf_counter()
+    g.profiler = None
+    if PROFILE_DIR and request.args.get('profile') == '1':
+        g.profiler = SamplingProfiler(threading.get_ident(), PROFILE_INTERVAL).start()
+
+
+@app.before_request
+def refresh_shared_store():
+    """Pick up rows other worker processes appended to the shared store"""
+    data_gen.refresh()
 
 
-# Initialize data generator
-data_gen = DataGenerator()
+@app.after_request
+def finish_request(response):
+    """Record the request's latency; stop the profiler once the body is sent"""
+    endpoint = request.endpoint or 'unknown'
+    metrics.observe('dashboard_request_duration_seconds', time.perf_counter() - g.request_started,
+                    endpoint=endpoint)
+    metrics.increment('dashboard_requests_total', endpoint=endpoint, status=response.status_code)
+
+    profiler = g.get('profiler')
+    if profiler is not None:
+        # Streamed bodies are produced after this hook, so stop on close instead
+        filename = f'{endpoint}_{datetime.now():%Y%m%d_%H%M%S_%f}.folded'
+
+        def write_profile():
+            profiler.stop()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.write(os.path.join(PROFILE_DIR, filename))
+
+        response.call_on_close(write_profile)
+        response.headers['X-Profile'] = filename
+    return response
+
+
+@app.errorhandler(InvalidFilter)
+def invalid_filter(error):
+    return jsonify({
+        'success': False,
+        'message': str(error)
+    }), 400
 
 
 @app.route('/')
@@ -102,48 +3799,312 @@ def dashboard():
     return render_template('dashboard.html')
 
 
+def parse_max_points(value):
+    """max_points from a query string or JSON value: None, or an int of at least 3"""
+    if value is None:
+        return None
+    number = int(value) if isinstance(value, str) and value.isdigit() else value
+    # bool is an int subclass, but true is not a point count
+    if not isinstance(number, int) or isinstance(number, bool):
+        raise ValueError(f'Invalid max_points: {value!r}')
+    # LTTB keeps the first and last points, so fewer than 3 leaves nothing to pick
+    if number < 3:
+        raise ValueError(f'max_points must be at least 3, got {value!r}')
+    return number
+
+
 @app.route('/api/data')
 def get_data():
     """API endpoint to get filtered data"""
-    # Get filter parameters
-    region = request.args.get('region', 'all')
-    product = request.args.get('product', 'all')
-    date_range = request.args.get('date_range', 'all')
+    # Get filter parameters (region/product IN lists, date_range or start/end)
+    filters = FilterSpec.from_args(request.args)
+    # 'fused' aggregates the filtered rows in one pass, 'rows' uses the original
+    # per-chart pandas builders; both are fallbacks and checks for the cube
+    engine = request.args.get('engine', 'cube')
+    if engine not in data_gen.snapshot.ENGINES:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown engine for the {STORAGE_BACKEND} backend: {engine}'
+        }), 400
+    # Upper bound on sales trend points; longer series are downsampled
+    try:
+        max_points = parse_max_points(request.args.get('max_points'))
+    except ValueError as error:
+        return jsonify({
+            'success': False,
+            'message': str(error)
+        }), 400
+    # Sales trend bucket size; stored dates have no time of day, so no 'hour'
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in RollupCube.GRANULARITIES:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown granularity: {granularity}'
+        }), 400
+
+    def build(snapshot):
+        return compute_dashboard_data(filters, engine, max_points, granularity, snapshot)
+
+    key = ('data',) + filters.key() + (engine, max_points, granularity)
+    if wants_compact():
+        return cached_json_response(
+            key,
+            lambda snapshot: compact_dashboard_data(build(snapshot)),
+            mimetype=COMPACT_MIMETYPE,
+            compress='gzip' in request.accept_encodings,
+            warm=True
+        )
+    return cached_json_response(key, build, warm=True)
+
+
+def compute_dashboard_data(filters=None, engine='cube', max_points=None, granularity='day',
+                           snapshot=None):
+    """Metrics and chart data for one filter combination (over the current snapshot by default)"""
+    snapshot = snapshot or data_gen.snapshot
+    if engine == 'rows':
+        with metrics.stage('filter') as stage:
+            df = snapshot.get_filtered_data(filters)
+            stage.rows = len(df)
+        data = build_dashboard_data(df, granularity)
+    elif engine == 'fused':
+        data = snapshot.batch_dashboard_data([filters or FilterSpec()], granularity, engine)[0]
+    else:
+        data = snapshot.dashboard_data(filters, granularity)
+
+    with metrics.stage('downsample'):
+        data['charts']['sales_trend'] = downsample_trend(data['charts']['sales_trend'], max_points)
+    return data
+
+
+BATCH_MAX_FILTER_SETS = 100
+
+
+@app.route('/api/batch', methods=['POST'])
+def get_batch_data():
+    """Dashboard data for several filter sets in one request.
+
+    The JSON body holds "filters", a list of objects with /api/data's filter
+    parameters, and optionally "engine", "granularity" and "max_points".
+    Results come back in the same order.
+    """
+    body = request.get_json(silent=True)
+    filter_specs = body.get('filters') if isinstance(body, dict) else None
+    if not isinstance(filter_specs, list) or not 0 < len(filter_specs) <= BATCH_MAX_FILTER_SETS:
+        return jsonify({
+            'success': False,
+            'message': f'Expected a JSON object with "filters", a list of 1 to {BATCH_MAX_FILTER_SETS} filter sets'
+        }), 400
+    filter_sets = [FilterSpec.from_dict(spec) for spec in filter_specs]
+    engine = body.get('engine', 'cube')
+    if engine not in data_gen.snapshot.ENGINES:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown engine for the {STORAGE_BACKEND} backend: {engine}'
+        }), 400
+    max_points = body.get('max_points')
+    try:
+        if isinstance(max_points, str):
+            # Only query strings carry max_points as text
+            raise ValueError(f'Invalid max_points: {max_points!r}')
+        max_points = parse_max_points(max_points)
+    except ValueError as error:
+        return jsonify({
+            'success': False,
+            'message': str(error)
+        }), 400
+    granularity = body.get('granularity', 'day')
+    if granularity not in RollupCube.GRANULARITIES:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown granularity: {granularity}'
+        }), 400
+
+    def build(snapshot):
+        return {'results': compute_batch_data(filter_sets, engine, max_points, granularity, snapshot)}
+
+    key = ('batch', tuple(filters.key() for filters in filter_sets), engine, max_points, granularity)
+    return cached_json_response(key, build)
+
+
+def compute_batch_data(filter_sets, engine='cube', max_points=None, granularity='day', snapshot=None):
+    """compute_dashboard_data for each of filter_sets, evaluated together; repeats are computed once"""
+    snapshot = snapshot or data_gen.snapshot
+    unique = list({filters.key(): filters for filters in filter_sets}.values())
+    with metrics.stage('batch'):
+        results = snapshot.batch_dashboard_data(unique, granularity, engine)
+    with metrics.stage('downsample'):
+        for data in results:
+            data['charts']['sales_trend'] = downsample_trend(data['charts']['sales_trend'], max_points)
+    by_key = {filters.key(): data for filters, data in zip(unique, results)}
+    return [by_key[filters.key()] for filters in filter_sets]
+
+
+def downsample_trend(trend, max_points=None):
+    """Sales trend reduced to at most max_points with LTTB, plus the resolution used"""
+    dates, sales = trend['dates'], trend['sales']
+    resolution = {'method': 'none', 'points': len(dates), 'source_points': len(dates)}
+
+    if max_points and len(dates) > max_points:
+        days = np.array(dates, dtype='datetime64[D]').astype(np.float64)
+        keep = lttb_indices(days, np.asarray(sales, dtype=np.float64), max_points)
+        dates = [dates[i] for i in keep]
+        sales = np.asarray(sales)[keep].tolist()
+        resolution.update(method='lttb', points=len(keep))
+
+    return {'dates': dates, 'sales': sales, 'resolution': resolution}
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of threshold points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; the rest are split into equal
+    buckets, and each bucket keeps the point forming the largest triangle
+    with the previously kept point and the next bucket's average. Bucket
+    averages come from cumulative sums, and areas are computed a whole
+    bucket at a time.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sum_x = np.concatenate([[0.0], np.cumsum(x)])
+    sum_y = np.concatenate([[0.0], np.cumsum(y)])
+    sizes = ends - starts
+    next_x = np.append(((sum_x[ends] - sum_x[starts]) / sizes)[1:], x[-1])
+    next_y = np.append(((sum_y[ends] - sum_y[starts]) / sizes)[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        areas = np.abs(
+            (x[anchor] - next_x[i]) * (bucket_y - y[anchor])
+            - (x[anchor] - bucket_x) * (next_y[i] - y[anchor])
+        )
+        anchor = start + int(np.argmax(areas))
+        selected[i + 1] = anchor
+    return selected
+
+
+def select_labels(store, rows, filters=None):
+    """The rows (a slice or positions) whose region and product the filters select"""
+    filters = filters or FilterSpec()
+    for name, labels in (('region', filters.regions), ('product', filters.products)):
+        if labels is None:
+            continue
+        # Lookup table over the category codes: one gather instead of one compare per label
+        selected = np.isin(store.categories[name], labels)
+        keep = selected[store.column(name)[rows]]
+        rows = rows.start + np.flatnonzero(keep) if isinstance(rows, slice) else rows[keep]
+    return rows
+
+
+def fused_cube(store, rows=None, distinct_mode=None):
+    """Throwaway rollup cube over the integer-coded rows, in one pass.
+
+    The rows' day, region and product codes are combined into one cell
+    code and bincounted, instead of a groupby per chart. rows is a slice
+    or an array of positions; None (every row) and slices are read without
+    any gather.
+    """
+    index = slice(0, len(store)) if rows is None else rows
+    cube = RollupCube(store.categories['region'], store.categories['product'], distinct_mode)
+    cube.add_codes(
+        store.column('date')[index],
+        store.column('region')[index],
+        store.column('product')[index],
+        {measure: store.column(measure)[index] for measure in ('sales', 'orders', 'customers')},
+        store.column('customer_id')[index] if distinct_mode else None
+    )
+    return cube
 
-    # Get filtered data
-    df = data_gen.get_filtered_data(region, product, date_range)
 
-    # Calculate metrics
-    total_sales = df['sales'].sum()
-    total_orders = df['orders'].sum()
-    avg_order_value = total_sales / total_orders if total_orders > 0 else 0
-    unique_customers = df['customer_id'].nunique()
-    conversion_rate = (total_orders / unique_customers * 100) if unique_customers > 0 else 0
+def _count_distinct(values):
+    """Number of distinct integers: a bincount when their range is compact, else a sort"""
+    if len(values) == 0:
+        return 0
+    low, high = int(values.min()), int(values.max())
+    if high - low < 4 * len(values) + 65536:
+        return int(np.count_nonzero(np.bincount(values.astype(np.int64) - low)))
+    return len(np.unique(values))
+
+
+def fused_dashboard_data(store, rows=None, granularity='day'):
+    """Metrics and chart data from one pass over the integer-coded filtered rows.
+
+    Every chart and KPI is read off a fused_cube() of the rows; distinct
+    customers are counted from their ID numbers (see _count_distinct).
+    """
+    cube = fused_cube(store, rows)
+    unique_customers = _count_distinct(store.column('customer_id')[slice(0, len(store)) if rows is None else rows])
+
+    cube_data = cube.dashboard_data(granularity=granularity)
+    return {
+        'metrics': calculate_metrics(
+            cube_data['total_sales'], cube_data['total_orders'], unique_customers
+        ),
+        'charts': cube_data['charts']
+    }
+
 
-    # Prepare data for charts
-    response_data = {
-        'metrics': {
-            'total_sales': round(total_sales, 2),
-            'total_orders': int(total_orders),
-            'avg_order_value': round(avg_order_value, 2),
-            'conversion_rate': round(conversion_rate, 1)
-        },
+def cube_dashboard_data(cube, filters=None, granularity='day'):
+    """Metrics and chart data for the filters, read off a rollup cube with a distinct index"""
+    with metrics.stage('cube'):
+        cube_data = cube.dashboard_data(filters, granularity)
+    with metrics.stage('distinct_customers'):
+        unique_customers = cube.distinct_customers(filters)
+    return {
+        'metrics': calculate_metrics(
+            cube_data['total_sales'], cube_data['total_orders'], unique_customers
+        ),
+        'charts': cube_data['charts']
+    }
+
+
+def build_dashboard_data(df, granularity='day'):
+    """Metrics and chart data computed directly from filtered rows"""
+    return {
+        'metrics': calculate_metrics(
+            df['sales'].sum(), df['orders'].sum(), df['customer_id'].nunique()
+        ),
         'charts': {
-            'sales_trend': prepare_sales_trend(df),
+            'sales_trend': prepare_sales_trend(df, granularity),
             'region_data': prepare_region_data(df),
             'product_data': prepare_product_data(df),
-            'growth_data': prepare_growth_data(df),
+            'growth_data': prepare_growth_data(df, 'month' if granularity == 'day' else granularity),
             'heatmap_data': prepare_heatmap_data(df)
         }
     }
 
-    return jsonify(response_data)
 
+def calculate_metrics(total_sales, total_orders, unique_customers):
+    """KPI block shared by the cube and row-based paths"""
+    avg_order_value = total_sales / total_orders if total_orders > 0 else 0
+    conversion_rate = (total_orders / unique_customers * 100) if unique_customers > 0 else 0
+
+    return {
+        'total_sales': round(total_sales, 2),
+        'total_orders': int(total_orders),
+        'avg_order_value': round(avg_order_value, 2),
+        'conversion_rate': round(conversion_rate, 1)
+    }
+
+
+# pandas period frequencies of the coarser granularities (weeks start on Monday)
+PERIOD_FREQUENCIES = {'week': 'W-SUN', 'month': 'M', 'quarter': 'Q'}
 
-def prepare_sales_trend(df):
+
+@metrics.timed('prepare_sales_trend')
+def prepare_sales_trend(df, granularity='day'):
     """Prepare data for sales trend chart"""
-    # Group by date and sum sales
-    daily_sales = df.groupby('date')['sales'].sum().reset_index()
+    # Group by date (or the first day of its period) and sum sales
+    dates = df['date']
+    if granularity != 'day':
+        dates = dates.dt.to_period(PERIOD_FREQUENCIES[granularity]).dt.start_time.rename('date')
+    daily_sales = df.groupby(dates, observed=True)['sales'].sum().reset_index()
     daily_sales['date'] = daily_sales['date'].dt.strftime('%Y-%m-%d')
 
     return {
@@ -152,9 +4113,10 @@ def prepare_sales_trend(df):
     }
 
 
+@metrics.timed('prepare_region_data')
 def prepare_region_data(df):
     """Prepare data for region pie chart"""
-    region_sales = df.groupby('region')['sales'].sum().reset_index()
+    region_sales = df.groupby('region', observed=True)['sales'].sum().reset_index()
 
     return {
         'regions': region_sales['region'].tolist(),
@@ -162,9 +4124,10 @@ def prepare_region_data(df):
     }
 
 
+@metrics.timed('prepare_product_data')
 def prepare_product_data(df):
     """Prepare data for product bar chart"""
-    product_sales = df.groupby('product')['sales'].sum().reset_index()
+    product_sales = df.groupby('product', observed=True)['sales'].sum().reset_index()
 
     return {
         'products': product_sales['product'].tolist(),
@@ -172,12 +4135,16 @@ def prepare_product_data(df):
     }
 
 
-def prepare_growth_data(df):
+@metrics.timed('prepare_growth_data')
+def prepare_growth_data(df, granularity='month'):
     """Prepare data for growth rate chart"""
-    # Group by month and calculate growth rate
-    df['month'] = df['date'].dt.to_period('M')
-    monthly_sales = df.groupby('month')['sales'].sum().reset_index()
-    monthly_sales['month'] = monthly_sales['month'].astype(str)
+    # Group by period and calculate growth rate (without touching the caller's frame)
+    month = df['date'].dt.to_period(PERIOD_FREQUENCIES[granularity]).rename('month')
+    monthly_sales = df.groupby(month)['sales'].sum().reset_index()
+    if granularity == 'week':
+        monthly_sales['month'] = monthly_sales['month'].dt.start_time.dt.strftime('%Y-%m-%d')
+    else:
+        monthly_sales['month'] = monthly_sales['month'].astype(str)
 
     # Calculate growth rate
     monthly_sales['growth_rate'] = monthly_sales['sales'].pct_change() * 100
@@ -189,6 +4156,7 @@ def prepare_growth_data(df):
     }
 
 
+@metrics.timed('prepare_heatmap_data')
 def prepare_heatmap_data(df):
     """Prepare data for heatmap chart"""
     # Create pivot table for heatmap
@@ -197,7 +4165,8 @@ def prepare_heatmap_data(df):
         index='region',
         columns='product',
         aggfunc='sum',
-        fill_value=0
+        fill_value=0,
+        observed=True
     )
 
     return {
@@ -207,83 +4176,296 @@ def prepare_heatmap_data(df):
     }
 
 
+# Rows serialized per chunk of a streamed export
+EXPORT_CHUNK_ROWS = 100_000
+
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream')
+}
+
+
 @app.route('/api/export')
 def export_data():
-    """Export filtered data as CSV"""
-    region = request.args.get('region', 'all')
-    product = request.args.get('product', 'all')
-    date_range = request.args.get('date_range', 'all')
+    """Stream filtered data as CSV, gzip-compressed CSV, Parquet or Arrow IPC"""
+    filters = FilterSpec.from_args(request.args)
+    export_format = request.args.get('format', 'csv')
+
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown export format: {export_format}'
+        }), 400
+    if export_format in ('parquet', 'arrow') and pa is None:
+        return jsonify({
+            'success': False,
+            'message': f'{export_format} export requires pyarrow'
+        }), 501
+
+    # Pin the rows now; later appends don't change what this export contains
+    snapshot = data_gen.snapshot
+    records = snapshot.count(filters)
 
-    df = data_gen.get_filtered_data(region, product, date_range)
-
-    # Create export filename
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'sales_data_{timestamp}.csv'
+    extension, mimetype = EXPORT_FORMATS[export_format]
+    filename = f'sales_data_{timestamp}.{extension}'
+
+    chunks = snapshot.iter_chunks(filters, EXPORT_CHUNK_ROWS)
+    response = Response(iter_timed_export(chunks, records, export_format), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Export-Records'] = str(records)
+    return response
+
+
+def iter_timed_export(chunks, records, export_format):
+    """iter_export() recorded as the export stage once the whole body is produced"""
+    with metrics.stage(f'export_{export_format}', rows=records):
+        yield from iter_export(chunks, export_format)
+
+
+def iter_export(chunks, export_format):
+    """Encoded export body for an iterable of DataFrames, one chunk at a time so memory stays flat"""
+    if export_format in ('csv', 'csv.gz'):
+        compressor = zlib.compressobj(wbits=31) if export_format == 'csv.gz' else None
+        for i, chunk in enumerate(chunks):
+            data = _export_frame(chunk).to_csv(index=False, header=(i == 0)).encode('utf-8')
+            yield compressor.compress(data) if compressor else data
+        if compressor:
+            yield compressor.flush()
+        return
+
+    sink = _StreamSink()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(_export_frame(chunk), preserve_index=False)
+        if writer is None:
+            if export_format == 'parquet':
+                writer = pq.ParquetWriter(sink, table.schema)
+            else:
+                writer = pa.ipc.new_stream(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file whose contents are handed off as they are produced.
+
+    tell() keeps counting drained bytes, since Parquet records absolute
+    offsets in its footer.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
 
-    # Save to temporary file
-    export_path = os.path.join('exports', filename)
-    os.makedirs('exports', exist_ok=True)
-    df.to_csv(export_path, index=False)
+    def writable(self):
+        return True
 
-    return jsonify({
-        'success': True,
-        'filename': filename,
-        'records': len(df),
-        'message': f'Exported {len(df)} records to {filename}'
-    })
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
 
 
 @app.route('/api/realtime')
 def get_realtime_data():
     """Simulate real-time data updates"""
-    # Add new random records
-    new_records = []
-    for _ in range(np.random.randint(1, 6)):
-        new_record = {
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'region': np.random.choice(data_gen.regions),
-            'product': np.random.choice(data_gen.products),
-            'sales': round(np.random.uniform(50, 1000), 2),
-            'orders': np.random.randint(1, 6),
-            'customers': np.random.randint(20, 101),
-            'customer_id': f'CUST_{np.random.randint(1000, 9999)}',
-            'order_id': f'ORD_{np.random.randint(10000, 99999)}'
-        }
-        new_records.append(new_record)
-
-    # Add to main dataset
-    new_df = pd.DataFrame(new_records)
-    data_gen.data = pd.concat([data_gen.data, new_df], ignore_index=True)
+    # Add new random records to the main dataset
+    new_records = data_gen.generate_realtime_records(np.random.randint(1, 6))
+    with metrics.stage('append', rows=len(new_records)):
+        snapshot = data_gen.append_records(new_records)
 
     return jsonify({
         'success': True,
         'new_records': len(new_records),
-        'total_records': len(data_gen.data)
+        'total_records': len(snapshot)
     })
 
 
+# Seconds between keepalive comments on an idle event stream
+STREAM_KEEPALIVE = 15
+
+
+@app.route('/api/stream')
+def stream_updates():
+    """Server-Sent Events: the dashboard for the filters, then only what changes.
+
+    EventSource cannot send an Accept header, so encoding=compact in the
+    query string asks for the compact sales trend instead.
+    """
+    filters = FilterSpec.from_args(request.args)
+    try:
+        max_points = parse_max_points(request.args.get('max_points'))
+    except ValueError as error:
+        return jsonify({
+            'success': False,
+            'message': str(error)
+        }), 400
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in RollupCube.GRANULARITIES:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown granularity: {granularity}'
+        }), 400
+
+    encoding = request.args.get('encoding', 'json')
+    if encoding not in ('json', 'compact'):
+        return jsonify({
+            'success': False,
+            'message': f'Unknown encoding: {encoding}'
+        }), 400
+
+    realtime_simulator.start()
+    subscriber = update_hub.subscribe(filters, granularity, max_points, encoding == 'compact')
+
+    def events():
+        try:
+            while True:
+                try:
+                    event = subscriber.queue.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # Comments keep proxies from timing out, and find closed connections
+                    event = b': keepalive\n\n'
+                if subscriber.closed:
+                    return
+                yield event
+        finally:
+            update_hub.unsubscribe(subscriber)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+INGEST_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/vnd.apache.arrow.stream': 'arrow'
+}
+
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_records():
+    """Append a batch of sales rows posted as NDJSON or an Arrow IPC stream"""
+    ingest_format = INGEST_FORMATS.get(request.mimetype)
+    if ingest_format is None:
+        return jsonify({
+            'success': False,
+            'message': f'Unsupported content type: {request.mimetype or "(none)"}; '
+                       f'send {" or ".join(INGEST_FORMATS)}'
+        }), 415
+    if ingest_format == 'arrow' and pa is None:
+        return jsonify({
+            'success': False,
+            'message': 'Arrow ingest requires pyarrow'
+        }), 501
+    if request.content_length is not None and request.content_length > INGEST_MAX_BYTES:
+        return jsonify({
+            'success': False,
+            'message': f'Request body exceeds {INGEST_MAX_BYTES} bytes'
+        }), 413
+
+    try:
+        with metrics.stage('ingest_parse'):
+            raw = read_ingest_body(request.get_data(), ingest_format)
+        with metrics.stage('ingest_validate', rows=len(raw)):
+            rows = f'rows 1-{len(raw)} of the request'
+            records = SalesFileReader.typed_chunk(raw, data_gen.categories, rows)
+            data_gen.check_dates(records, rows)
+    except ValueError as error:
+        return jsonify({
+            'success': False,
+            'message': str(error)
+        }), 400
+
+    try:
+        with metrics.stage('ingest_commit', rows=len(records)):
+            snapshot = ingest_log.append(records)
+    except IngestLogFull as error:
+        return jsonify({
+            'success': False,
+            'message': str(error)
+        }), 507
+    return jsonify({
+        'success': True,
+        'ingested': len(records),
+        'total_records': len(snapshot)
+    })
+
+
+def read_ingest_body(body, ingest_format):
+    """Raw rows of an NDJSON or Arrow IPC stream request body"""
+    if not body.strip():
+        raise ValueError('The request has no rows')
+    if ingest_format == 'ndjson':
+        # Values are kept as sent; typed_chunk does every conversion
+        return pd.read_json(io.BytesIO(body), lines=True, dtype=False, convert_dates=False)
+    return pa.ipc.open_stream(body).read_pandas(strings_to_categorical=True)
+
+
 @app.route('/api/stats')
 def get_stats():
     """Get dataset statistics"""
-    df = data_gen.data
-
-    stats = {
-        'total_records': len(df),
-        'date_range': {
-            'start': df['date'].min(),
-            'end': df['date'].max()
-        },
-        'regions': df['region'].value_counts().to_dict(),
-        'products': df['product'].value_counts().to_dict(),
-        'sales_stats': {
-            'min': df['sales'].min(),
-            'max': df['sales'].max(),
-            'mean': df['sales'].mean(),
-            'median': df['sales'].median()
-        }
-    }
-
-    return jsonify(stats)
+    # Same filters as /api/data, plus percentiles=90,99 for sales percentiles besides the median
+    filters = FilterSpec.from_args(request.args)
+    try:
+        percentiles = tuple(float(p) for p in request.args.get('percentiles', '').split(',') if p.strip())
+        if not all(0 <= p <= 100 for p in percentiles):
+            raise ValueError
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid percentiles: {request.args["percentiles"]}'
+        }), 400
+
+    def build(snapshot):
+        return compute_stats(snapshot, filters, percentiles)
+
+    return cached_json_response(('stats',) + filters.key() + (percentiles,), build)
+
+
+def compute_stats(snapshot=None, filters=None, percentiles=()):
+    """Summary statistics over the rows matching the filters (the whole dataset by default)"""
+    return (snapshot or data_gen.snapshot).stats(filters, percentiles)
+
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Latency histograms, row counts, cache and memory figures in Prometheus text format"""
+    snapshot = data_gen.snapshot
+    cache = response_cache.stats()
+    gauges = [
+        ('dashboard_dataset_rows', 'Rows in the current snapshot', [({}, len(snapshot))]),
+        ('dashboard_dataset_version', 'Version of the current snapshot', [({}, snapshot.version)]),
+        ('dashboard_dataset_bytes', 'Bytes held by the dataset, by component', [
+            ({'component': component}, size) for component, size in data_gen.memory_usage().items()
+        ]),
+        ('dashboard_response_cache_entries', 'Responses in the cache', [({}, cache['entries'])]),
+        ('dashboard_response_cache_bytes', 'Bytes of cached responses', [({}, cache['bytes'])]),
+        ('dashboard_response_cache_hit_ratio', 'Share of cache lookups that hit', [({}, cache['hit_rate'])]),
+        ('dashboard_response_cache_warm_hit_ratio', 'Share of cache lookups served by a warmed entry',
+         [({}, cache['warm_hit_rate'])]),
+        ('dashboard_cache_warmer_tracked_keys', 'Request keys the cache warmer is counting',
+         [({}, cache_warmer.tracked_count())]),
+        ('dashboard_response_cache_evictions', 'Entries evicted or invalidated so far', [({}, cache['evictions'])]),
+        ('dashboard_stream_subscribers', 'Open /api/stream connections', [({}, update_hub.subscriber_count())]),
+        ('dashboard_process_peak_rss_bytes', 'Peak resident set size of this process',
+         [({}, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)])
+    ]
+    return Response(metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 if __name__ == '__main__':
@@ -605,6 +4787,15 @@ if __name__ == '__main__':
                         <option value="365">Last Year</option>
                     </select>
                 </div>
+                <div class="filter-group">
+                    <label for="granularity">Trend Granularity</label>
+                    <select id="granularity">
+                        <option value="day">Daily</option>
+                        <option value="week">Weekly</option>
+                        <option value="month">Monthly</option>
+                        <option value="quarter">Quarterly</option>
+                    </select>
+                </div>
                 <div class="filter-group">
                     <button class="btn" onclick="applyFilters()">Apply Filters</button>
                 </div>
@@ -660,12 +4851,42 @@ if __name__ == '__main__':
     <script>
         let currentData = null;
 
+        // Decode a base64 little-endian buffer into a typed array
+        const decodeTypedArray = (text, ArrayType) => {
+            const bytes = Uint8Array.from(atob(text), (c) => c.charCodeAt(0));
+            return new ArrayType(bytes.buffer);
+        };
+
+        // Expand a compact sales trend into typed arrays Plotly can use as-is
+        const decodeCompactTrend = (trend) => {
+            if (trend.encoding !== 'compact') {
+                return trend;
+            }
+            const offsets = decodeTypedArray(trend.day_offsets, Int32Array);
+            const dates = new Float64Array(offsets.length);
+            offsets.forEach((offset, i) => { dates[i] = (trend.base_day + offset) * 86400000; });
+            return {
+                dates: dates,
+                sales: decodeTypedArray(trend.sales, Float32Array),
+                resolution: trend.resolution,
+                replace: trend.replace
+            };
+        };
+
+        const decodeCompactData = (data) => {
+            data.charts.sales_trend = decodeCompactTrend(data.charts.sales_trend);
+            return data;
+        };
+
         // Fetch data from Flask API
         const fetchData = async (filters = {}) => {
             try {
-                const params = new URLSearchParams(filters);
-                const response = await fetch(`/api/data?${params}`);
-                const data = await response.json();
+                // Keep the trend chart bounded however much history is loaded
+                const params = new URLSearchParams({ max_points: 1000, ...filters });
+                const response = await fetch(`/api/data?${params}`, {
+                    headers: { 'Accept': 'application/vnd.dashboard.compact+json' }
+                });
+                const data = decodeCompactData(await response.json());
                 currentData = data;
                 return data;
             } catch (error) {
@@ -697,7 +4918,7 @@ if __name__ == '__main__':
 
             const layout = {
                 margin: { t: 10, r: 10, b: 40, l: 60 },
-                xaxis: { title: 'Date' },
+                xaxis: { title: 'Date', type: 'date' },
                 yaxis: { title: 'Sales ($)' },
                 showlegend: false,
                 plot_bgcolor: 'rgba(0,0,0,0)',
@@ -751,8 +4972,8 @@ if __name__ == '__main__':
             Plotly.newPlot('productChart', [trace], layout, {responsive: true});
         };
 
-        // Create growth chart
-        const createGrowthChart = (data) => {
+        // Create growth chart (monthly for a daily trend, otherwise per trend period)
+        const createGrowthChart = (data, granularity) => {
             const trace = {
                 x: data.months,
                 y: data.growth_rates,
@@ -764,7 +4985,7 @@ if __name__ == '__main__':
 
             const layout = {
                 margin: { t: 10, r: 10, b: 60, l: 60 },
-                xaxis: { title: 'Month' },
+                xaxis: { title: { week: 'Week', quarter: 'Quarter' }[granularity] || 'Month' },
                 yaxis: { title: 'Growth Rate (%)' },
                 showlegend: false,
                 plot_bgcolor: 'rgba(0,0,0,0)',
@@ -795,54 +5016,99 @@ if __name__ == '__main__':
             Plotly.newPlot('heatmapChart', [trace], layout, {responsive: true});
         };
 
+        // Merge an update event (only what changed) into the current data
+        const applyUpdate = (update) => {
+            Object.assign(currentData.metrics, update.metrics || {});
+            const changed = update.trend && decodeCompactTrend(update.trend);
+            if (changed && changed.replace) {
+                currentData.charts.sales_trend = changed;
+            } else if (changed) {
+                // Changed points are existing dates or new ones after them; decoded
+                // compact trends are typed arrays, which cannot grow in place
+                const trend = currentData.charts.sales_trend;
+                const dates = Array.from(trend.dates);
+                const sales = Array.from(trend.sales);
+                Array.from(changed.dates).forEach((date, i) => {
+                    const at = dates.indexOf(date);
+                    if (at >= 0) {
+                        sales[at] = changed.sales[i];
+                    } else {
+                        dates.push(date);
+                        sales.push(changed.sales[i]);
+                    }
+                });
+                currentData.charts.sales_trend = { dates: dates, sales: sales, resolution: changed.resolution };
+            }
+            Object.assign(currentData.charts, update.charts || {});
+            document.getElementById('recordCount').textContent = update.total_records.toLocaleString();
+        };
+
+        // Subscribe to the server's update stream: the full dashboard first, then changes
+        let eventSource = null;
+        const loadDashboard = async (filters = {}) => {
+            if (eventSource) {
+                eventSource.close();
+            }
+            if (!window.EventSource) {
+                const data = await fetchData(filters);
+                if (data) {
+                    updateDashboard(data, filters.granularity);
+                }
+                return;
+            }
+
+            const params = new URLSearchParams({ max_points: 1000, encoding: 'compact', ...filters });
+            eventSource = new EventSource(`/api/stream?${params}`);
+            eventSource.addEventListener('snapshot', (event) => {
+                currentData = decodeCompactData(JSON.parse(event.data));
+                updateDashboard(currentData, filters.granularity);
+            });
+            eventSource.addEventListener('update', (event) => {
+                applyUpdate(JSON.parse(event.data));
+                updateDashboard(currentData, filters.granularity);
+            });
+        };
+
         // Apply filters
         const applyFilters = async () => {
             const filters = {
                 region: document.getElementById('regionFilter').value,
                 product: document.getElementById('productFilter').value,
-                date_range: document.getElementById('dateRange').value
+                date_range: document.getElementById('dateRange').value,
+                granularity: document.getElementById('granularity').value
             };
 
-            const data = await fetchData(filters);
-            if (data) {
-                updateDashboard(data);
-            }
+            await loadDashboard(filters);
         };
 
         // Update dashboard
-        const updateDashboard = (data) => {
+        const updateDashboard = (data, granularity) => {
             updateMetrics(data.metrics);
             createSalesTrendChart(data.charts.sales_trend);
             createRegionChart(data.charts.region_data);
             createProductChart(data.charts.product_data);
-            createGrowthChart(data.charts.growth_data);
+            createGrowthChart(data.charts.growth_data, granularity);
             createHeatmapChart(data.charts.heatmap_data);
 
             document.getElementById('lastUpdated').textContent = new Date().toLocaleString();
         };
 
         // Export data
-        const exportData = async () => {
+        const exportData = () => {
             const filters = {
                 region: document.getElementById('regionFilter').value,
                 product: document.getElementById('productFilter').value,
                 date_range: document.getElementById('dateRange').value
             };
 
-            try {
-                const params = new URLSearchParams(filters);
-                const response = await fetch(`/api/export?${params}`);
-                const result = await response.json();
-
-                if (result.success) {
-                    alert(`✅ ${result.message}`);
-                } else {
-                    alert('❌ Export failed');
-                }
-            } catch (error) {
-                console.error('Export error:', error);
-                alert('❌ Export failed');
-            }
+            // The server streams the file, so let the browser download it directly
+            const params = new URLSearchParams(filters);
+            const link = document.createElement('a');
+            link.href = `/api/export?${params}`;
+            link.download = '';
+            document.body.appendChild(link);
+            link.click();
+            link.remove();
         };
 
         // Get dataset stats
@@ -856,21 +5122,12 @@ if __name__ == '__main__':
             }
         };
 
-        // Initialize dashboard
+        // Initialize dashboard; new sales arrive over the update stream
         const initDashboard = async () => {
             await updateStats();
-            const data = await fetchData();
-            if (data) {
-                updateDashboard(data);
-            }
+            await loadDashboard();
         };
 
-        // Auto-refresh every 30 seconds
-        setInterval(async () => {
-            await fetch('/api/realtime');
-            await applyFilters();
-        }, 30000);
-
         // Initialize on page load
         document.addEventListener('DOMContentLoaded', initDashboard);
     </script>
@@ -885,15 +5142,19 @@ if __name__ == '__main__':
     print("📊 Dashboard URL: http://localhost:5000")
     print("🔗 API Endpoints:")
     print("   - GET /api/data - Get filtered dashboard data")
-    print("   - GET /api/export - Export data as CSV")
-    print("   - GET /api/stats - Get dataset statistics")
+    print("   - POST /api/batch - Dashboard data for several filter sets at once")
+    print("   - GET /api/export - Stream data as CSV, CSV.gz, Parquet or Arrow")
+    print("   - GET /api/stats - Get dataset statistics (same filters as /api/data)")
     print("   - GET /api/realtime - Simulate real-time updates")
+    print("   - GET /api/stream - Server-Sent Events with dashboard changes")
+    print("   - POST /api/ingest - Append NDJSON or Arrow IPC batches")
+    print("   - GET /api/metrics - Prometheus metrics (latency histograms, cache, memory)")
     print("\n💡 Features:")
     print("   ✅ Interactive filtering by Region, Product, Date Range")
     print("   ✅ Real-time KPI metrics")
     print("   ✅ 5 different chart types (Line, Pie, Bar, Growth, Heatmap)")
-    print("   ✅ CSV export functionality")
-    print("   ✅ Auto-refresh with simulated real-time data")
+    print("   ✅ Streaming CSV/Parquet export")
+    print("   ✅ Live updates pushed over Server-Sent Events")
     print("   ✅ Professional responsive design")
     print("   ✅ RESTful API architecture")
 
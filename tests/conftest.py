@@ -0,0 +1,56 @@
+import math
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+# main builds its module-level backend and replays INGEST_WAL on import,
+# so keep that log out of the working tree and the background threads off
+os.environ.setdefault('INGEST_WAL', os.path.join(tempfile.mkdtemp(), 'ingest.wal'))
+os.environ.setdefault('CACHE_WARM_TOP', '0')
+os.environ.setdefault('REALTIME_INTERVAL', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def generator():
+    """A small in-memory dataset, the same rows every time"""
+    return main.DataGenerator(2000)
+
+
+def day(days_ago):
+    """The date days_ago days before today; sample data covers the last 730 days"""
+    return str(np.datetime64(datetime.now().date(), 'D') - days_ago)
+
+
+def assert_same_data(actual, expected, path='data'):
+    """Dashboard payloads equal up to floating-point summation order"""
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected), path
+        for key in expected:
+            assert_same_data(actual[key], expected[key], f'{path}.{key}')
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected), path
+        for i, (a, b) in enumerate(zip(actual, expected)):
+            assert_same_data(a, b, f'{path}[{i}]')
+    elif isinstance(expected, float) or isinstance(actual, float):
+        assert math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-6), (path, actual, expected)
+    else:
+        assert actual == expected, path
+
+
+def bad_batch(generator, rows=3):
+    """Rows with one non-finite sale and customers the store hasn't seen"""
+    df = generator.generate_realtime_records(rows)
+    df.loc[1, 'sales'] = np.inf
+    df['customer_id'] = np.arange(900000, 900000 + rows)
+    return df
+
+
+def dashboard_metrics(generator, engine='cube'):
+    return main.compute_dashboard_data(None, engine, None, 'day', generator.snapshot)['metrics']
@@ -0,0 +1,98 @@
+import pytest
+
+import main
+from conftest import assert_same_data, day
+
+
+SPECS = [
+    {},
+    {'region': 'North'},
+    {'product': ['Sports', 'Clothing']},
+    {'region': 'East', 'product': 'Electronics', 'date_range': '90'},
+    {'date_range': '30'},
+    {'start': '2000-01-01', 'end': '2000-12-31'},
+]
+
+
+@pytest.fixture
+def client(generator, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache())
+    return main.app.test_client()
+
+
+@pytest.mark.parametrize('engine', ['cube', 'fused', 'rows'])
+def test_batch_matches_single_requests(generator, engine):
+    snapshot = generator.snapshot
+    filter_sets = [main.FilterSpec.from_dict(spec) for spec in SPECS]
+    results = main.compute_batch_data(filter_sets, engine, None, 'day', snapshot)
+
+    assert len(results) == len(filter_sets)
+    for filters, result in zip(filter_sets, results):
+        assert_same_data(result, main.compute_dashboard_data(filters, 'rows', None, 'day', snapshot))
+
+
+@pytest.mark.parametrize('overlap', [0.0, 100.0], ids=['shared-scan', 'separate-scans'])
+def test_fused_batches_scan_overlapping_rows_once(generator, monkeypatch, overlap):
+    snapshot = generator.snapshot
+    monkeypatch.setattr(snapshot, 'SHARED_SCAN_OVERLAP', overlap)
+    scanned = []
+    fused_cube = snapshot._fused_cube
+    monkeypatch.setattr(snapshot, '_fused_cube', lambda filters, *args, **kwargs: (
+        scanned.append(filters), fused_cube(filters, *args, **kwargs))[1])
+    filter_sets = [main.FilterSpec(region='North', start=day(300)), main.FilterSpec(product='Sports'),
+                   main.FilterSpec(region='North', product='Sports', end=day(100))]
+    results = snapshot.batch_dashboard_data(filter_sets, 'month', 'fused')
+
+    assert len(scanned) == (1 if overlap == 0.0 else len(filter_sets))
+    if overlap == 0.0:
+        assert scanned[0].key() == main.FilterSpec.union(filter_sets).key()
+    for filters, result in zip(filter_sets, results):
+        assert_same_data(result, snapshot.dashboard_data(filters, 'month'))
+
+
+def test_repeated_filter_sets_are_computed_once(generator):
+    filter_sets = [main.FilterSpec(region='West'), main.FilterSpec(), main.FilterSpec(region=['West'])]
+    results = main.compute_batch_data(filter_sets, 'cube', 50, 'day', generator.snapshot)
+
+    assert results[0] is results[2] and results[0] is not results[1]
+    assert results[1]['charts']['sales_trend']['resolution']['points'] == 50
+
+
+def test_batch_endpoint_returns_results_in_order(client):
+    specs = [{'region': 'South'}, {}, {'product': 'Electronics', 'date_range': '30'}]
+    response = client.post('/api/batch', json={'filters': specs, 'granularity': 'week', 'max_points': 20})
+    results = response.get_json()['results']
+
+    assert response.status_code == 200 and len(results) == 3
+    for spec, result in zip(specs, results):
+        query = '&'.join(f'{name}={value}' for name, value in spec.items())
+        single = client.get(f'/api/data?granularity=week&max_points=20&{query}').get_json()
+        assert_same_data(result, {name: single[name] for name in result})
+
+
+def test_batches_may_hold_up_to_the_limit(client):
+    filters = [{'date_range': str(days)} for days in range(1, main.BATCH_MAX_FILTER_SETS + 1)]
+    response = client.post('/api/batch', json={'filters': filters})
+    assert response.status_code == 200
+    assert len(response.get_json()['results']) == main.BATCH_MAX_FILTER_SETS
+
+
+@pytest.mark.parametrize('body, message', [
+    (None, 'Expected a JSON object with "filters"'),
+    ({'filters': []}, 'a list of 1 to 100 filter sets'),
+    ({'filters': [{}] * 101}, 'a list of 1 to 100 filter sets'),
+    ({'filters': {'region': 'North'}}, 'a list of 1 to 100 filter sets'),
+    ({'filters': ['North']}, 'Filters must be an object'),
+    ({'filters': [{'city': 'Oslo'}]}, 'Unknown filters: city'),
+    ({'filters': [{'region': 5}]}, 'Invalid region'),
+    ({'filters': [{'start': 20240101}]}, 'Invalid start date'),
+    ({'filters': [{}], 'engine': 'spark'}, 'Unknown engine'),
+    ({'filters': [{}], 'granularity': 'hour'}, 'Unknown granularity'),
+], ids=['no-body', 'empty', 'too-many', 'not-a-list', 'not-an-object', 'unknown-filter',
+        'region-type', 'date-type', 'engine', 'granularity'])
+def test_invalid_batches_are_rejected(client, body, message):
+    response = client.post('/api/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert message in response.get_json()['message']
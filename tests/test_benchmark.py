@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import benchmark
+import main
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """One small suite run; it swaps in its own dataset, put back afterwards"""
+    monkeypatch.setattr(main, 'data_gen', main.data_gen)
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache())
+    return benchmark.suite_run(rows=3000, seed=1, repeat=2, duration=0.5, clients=2, tick=0.1)
+
+
+def test_suite_run_covers_the_microbenchmarks_and_the_load_mix(run):
+    assert run['rows'] == 3000 and run['peak_rss_mb'] > 0
+    assert {'get_filtered_data[range]', 'stats[in_list]', 'prepare_heatmap_data',
+            'compute_dashboard_data[fused]'} <= set(run['micro'])
+    assert all(stats['runs'] == 2 and stats['best_ms'] <= stats['median_ms'] for stats in run['micro'].values())
+
+    load = run['load']
+    assert load['requests'] > 0 and load['errors'] == 0
+    assert {'data', 'realtime'} <= set(load['endpoints'])
+    assert sum(endpoint['requests'] for endpoint in load['endpoints'].values()) == load['requests']
+
+
+def test_suite_metrics_flatten_a_run(run):
+    metrics = benchmark.suite_metrics(run)
+
+    assert metrics['compute_dashboard_data[cube] best_ms'] == (run['micro']['compute_dashboard_data[cube]']['best_ms'], False)
+    assert metrics['load all rps'] == (run['load']['throughput_rps'], True)
+    assert metrics['peak_rss_mb'][1] is False
+
+
+def write_suite(path, best_ms, rps):
+    run = {'rows': 1000, 'micro': {'stats[all]': {'best_ms': best_ms}},
+           'load': {'throughput_rps': rps, 'latency_ms': {'p50': 1.0}, 'endpoints': {}}}
+    path.write_text(json.dumps({'runs': [run]}))
+    return str(path)
+
+
+@pytest.mark.parametrize('best_ms, rps, passed', [
+    (1.0, 100, True),
+    (1.05, 96, True),
+    (1.5, 100, False),
+    (1.0, 80, False),
+])
+def test_compare_flags_regressions_past_the_threshold(tmp_path, capsys, best_ms, rps, passed):
+    before = write_suite(tmp_path / 'before.json', 1.0, 100)
+    after = write_suite(tmp_path / 'after.json', best_ms, rps)
+
+    assert benchmark.compare_suites(before, after, threshold=0.1) is passed
+    assert ('REGRESSED' in capsys.readouterr().out) is not passed
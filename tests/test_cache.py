@@ -0,0 +1,85 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def client(generator, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache())
+    return main.app.test_client()
+
+
+@pytest.mark.parametrize('endpoint', ['/api/data', '/api/stats'])
+def test_repeat_request_is_a_hit_with_the_same_etag(client, endpoint):
+    first = client.get(endpoint)
+    second = client.get(endpoint)
+
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.data == second.data
+
+
+def test_matching_if_none_match_gets_304(client):
+    etag = client.get('/api/data').headers['ETag']
+    response = client.get('/api/data', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_append_invalidates_cached_responses(client, generator):
+    before = client.get('/api/data')
+    generator.append_records(generator.generate_realtime_records(5))
+    after = client.get('/api/data', headers={'If-None-Match': before.headers['ETag']})
+
+    assert after.status_code == 200
+    assert after.headers['X-Cache'] == 'MISS'
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert main.response_cache.stats()['entries'] == 1
+
+
+def test_equivalent_filters_share_an_entry(client):
+    client.get('/api/data?region=North,South')
+    assert client.get('/api/data?region=South&region=North').headers['X-Cache'] == 'HIT'
+    assert client.get('/api/data?region=North').headers['X-Cache'] == 'MISS'
+
+
+def test_compact_and_json_payloads_are_cached_apart(client):
+    client.get('/api/data')
+    response = client.get('/api/data', headers={'Accept': main.COMPACT_MIMETYPE})
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.mimetype == main.COMPACT_MIMETYPE
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = main.ResponseCache(max_entries=2)
+    for key in ('a', 'b'):
+        cache.put(key, 1, b'body', key)
+    cache.get('a', 1)
+    cache.put('c', 1, b'body', 'c')
+
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == (b'body', 'a')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_budget_and_ttl_bound_the_cache():
+    cache = main.ResponseCache(max_bytes=10)
+    cache.put('a', 1, b'123456', 'a')
+    cache.put('b', 1, b'123456', 'b')
+    assert cache.get('a', 1) is None and cache.stats()['bytes'] == 6
+
+    expired = main.ResponseCache(ttl=-1)
+    expired.put('a', 1, b'body', 'a')
+    assert expired.get('a', 1) is None
+
+
+def test_entries_for_an_older_version_are_never_served():
+    cache = main.ResponseCache()
+    cache.put('a', 1, b'old', 'old')
+    cache.put('a', 2, b'new', 'new')
+    cache.put('b', 1, b'late', 'late')
+
+    assert cache.get('a', 1) is None and cache.get('b', 1) is None
+    assert cache.get('a', 2) == (b'new', 'new')
@@ -0,0 +1,85 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def warmer(generator, monkeypatch):
+    cache = main.ResponseCache()
+    warmer = main.CacheWarmer(generator, cache, top=2, concurrency=1, cpu_budget=1)
+    monkeypatch.setattr(main, 'data_gen', generator)
+    monkeypatch.setattr(main, 'response_cache', cache)
+    monkeypatch.setattr(main, 'cache_warmer', warmer)
+    return warmer
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_popular_responses_are_rebuilt_after_a_write(warmer, generator, monkeypatch):
+    client = main.app.test_client()
+    for query in ('?region=North', '?region=North', '?granularity=week', '?granularity=week', ''):
+        client.get(f'/api/data{query}')
+    generator.append_records(generator.generate_realtime_records(5))
+    wait_until(lambda: warmer.cache.stats()['entries'] == 2)
+
+    warmed = {query: client.get(f'/api/data{query}') for query in ('?region=North', '?granularity=week')}
+    assert [response.headers['X-Cache'] for response in warmed.values()] == ['HIT', 'HIT']
+    assert client.get('/api/data').headers['X-Cache'] == 'MISS'
+    assert warmer.cache.stats()['warm_hits'] == 2
+
+    # What a request would have built itself
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache())
+    for query, response in warmed.items():
+        assert client.get(f'/api/data{query}').data == response.data
+
+
+def test_hottest_follows_request_counts(generator):
+    warmer = main.CacheWarmer(generator, main.ResponseCache(), top=2)
+    warmer._thread = object()  # keep the background threads from starting
+    for key, requests in (('a', 1), ('b', 3), ('c', 2)):
+        for _ in range(requests):
+            warmer.record(key, None)
+
+    assert [entry.key for entry in warmer.hottest()] == ['b', 'c']
+
+
+def test_decay_forgets_keys_nobody_asks_for(generator, monkeypatch):
+    monkeypatch.setattr(main.CacheWarmer, 'DECAY_EVERY', 4)
+    warmer = main.CacheWarmer(generator, main.ResponseCache(), top=2)
+    warmer._thread = object()
+    warmer.record('old', None)
+    for _ in range(7):
+        warmer.record('new', None)
+
+    assert [entry.key for entry in warmer.hottest()] == ['new']
+
+
+def test_stale_and_cached_entries_are_not_rebuilt(generator):
+    cache = main.ResponseCache()
+    warmer = main.CacheWarmer(generator, cache, top=1)
+    builds = []
+    entry = SimpleNamespace(key='k', build=lambda snapshot: builds.append(snapshot) or (b'body', 'etag'))
+
+    old = generator.snapshot
+    generator.append_records(generator.generate_realtime_records(1))
+    warmer._warm(entry, old)
+    assert builds == [] and not cache.contains('k', old.version)
+
+    warmer._warm(entry, generator.snapshot)
+    warmer._warm(entry, generator.snapshot)
+    assert builds == [generator.snapshot]
+    assert cache.get('k', generator.snapshot.version) == (b'body', 'etag')
+
+
+def test_a_zero_top_turns_the_warmer_off(generator):
+    warmer = main.CacheWarmer(generator, main.ResponseCache(), top=0)
+    warmer.record('a', None)
+    assert warmer.tracked_count() == 0 and warmer._thread is None
@@ -0,0 +1,75 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from conftest import assert_same_data, dashboard_metrics
+
+
+def read_meta(path):
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def frame():
+    return main.SalesBackend().generate_sample_data(3000)
+
+
+def test_stored_frame_round_trips(tmp_path, frame):
+    backend = main.SalesBackend()
+    path = str(tmp_path / 'store')
+    main.ColumnStore.from_frame(frame, backend.categories, sort_key='date', path=path)
+    store = main.ColumnStore.open(path)
+
+    expected = frame.sort_values('date', kind='stable').reset_index(drop=True)
+    assert len(store) == 3000 and store.is_sorted
+    pd.testing.assert_frame_equal(store.frame().copy(), expected, check_dtype=False, check_categorical=False)
+
+
+def test_columns_are_memory_mapped_files(tmp_path):
+    path = str(tmp_path / 'store')
+    generator = main.DataGenerator(2000, data_dir=path)
+
+    assert isinstance(generator.store.column('sales').base, np.memmap)
+    files = {f'{name}.npy' for name in generator.store.schema} | {'cube.npz', 'meta.json'}
+    assert files <= set(os.listdir(path))
+    assert read_meta(path)['size'] == 2000
+
+
+def test_appends_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'store')
+    generator = main.DataGenerator(2000, data_dir=path)
+    generator.append_records(generator.generate_realtime_records(1500))
+    generator.checkpoint()
+
+    reopened = main.DataGenerator(10, data_dir=path)
+    assert len(reopened.store) == 3500
+    assert reopened.store.capacity >= 3500
+    pd.testing.assert_frame_equal(reopened.data, generator.data)
+    assert_same_data(dashboard_metrics(reopened), dashboard_metrics(generator))
+
+
+def test_rows_appended_after_the_checkpoint_are_folded_into_the_saved_cube(tmp_path):
+    path = str(tmp_path / 'store')
+    generator = main.DataGenerator(2000, data_dir=path)
+    generator.append_records(generator.generate_realtime_records(7))
+
+    reopened = main.DataGenerator(2000, data_dir=path)
+    assert reopened.snapshot.cube.row_count == 2007
+    assert_same_data(dashboard_metrics(reopened), dashboard_metrics(generator, 'rows'))
+
+
+def test_capacity_doubles_as_rows_are_appended(tmp_path, frame):
+    store = main.ColumnStore.from_frame(frame.iloc[:10], main.SalesBackend().categories,
+                                        sort_key='date', path=str(tmp_path / 'store'))
+    capacities = set()
+    for start in range(10, 3000, 500):
+        store.append(frame.iloc[start:start + 500].sort_values('date').assign(date=frame['date'].max()))
+        capacities.add(store.capacity)
+
+    assert len(store) == 3000
+    assert capacities == {1024, 2048, 4096}
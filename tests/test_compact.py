@@ -0,0 +1,59 @@
+import base64
+
+import numpy as np
+import pytest
+
+import main
+
+
+@pytest.fixture
+def client(generator, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache())
+    return main.app.test_client()
+
+
+def decode_trend(trend):
+    """The dashboard's decoding of a compact sales trend"""
+    offsets = np.frombuffer(base64.b64decode(trend['day_offsets']), dtype='<i4')
+    days = (trend['base_day'] + offsets.astype(np.int64)).astype('datetime64[D]')
+    sales = np.frombuffer(base64.b64decode(trend['sales']), dtype='<f4')
+    return [str(day) for day in days], sales
+
+
+def test_compact_trend_round_trips(generator):
+    trend = main.compute_dashboard_data(None, 'cube', None, 'day', generator.snapshot)['charts']['sales_trend']
+    dates, sales = decode_trend(main.compact_trend(trend))
+
+    assert dates == trend['dates']
+    assert np.allclose(sales, trend['sales'], rtol=1e-6)
+
+
+def test_compact_trend_of_no_points():
+    compact = main.compact_trend({'dates': [], 'sales': []})
+    assert decode_trend(compact)[0] == []
+    assert compact['base_day'] == 0
+
+
+@pytest.mark.parametrize('query', ['', '?region=North&granularity=month', '?max_points=20'])
+def test_compact_response_matches_the_json_one(client, query):
+    plain = client.get(f'/api/data{query}').get_json()
+    response = client.get(f'/api/data{query}', headers={'Accept': main.COMPACT_MIMETYPE})
+    compact = response.get_json(force=True)
+
+    assert response.mimetype == main.COMPACT_MIMETYPE
+    trend = compact['charts'].pop('sales_trend')
+    expected = plain['charts'].pop('sales_trend')
+    assert compact == plain
+    assert trend['encoding'] == 'compact'
+    assert trend['resolution'] == expected.get('resolution')
+
+    dates, sales = decode_trend(trend)
+    assert dates == expected['dates']
+    assert np.allclose(sales, expected['sales'], rtol=1e-6)
+
+
+def test_json_stays_the_default(client):
+    response = client.get('/api/data', headers={'Accept': '*/*'})
+    assert response.mimetype == 'application/json'
+    assert isinstance(response.get_json()['charts']['sales_trend']['dates'], list)
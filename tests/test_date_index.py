@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from conftest import day
+
+
+RANGES = [(day(650), day(620)), (day(580), None), (None, day(700)), (day(500), day(500))]
+
+
+def rows_between(df, start, end):
+    dates = df['date'].dt.normalize()
+    mask = np.ones(len(df), dtype=bool)
+    if start:
+        mask &= (dates >= pd.Timestamp(start)).to_numpy()
+    if end:
+        mask &= (dates <= pd.Timestamp(end)).to_numpy()
+    return np.flatnonzero(mask)
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_sorted_store_finds_date_ranges_by_binary_search(generator, start, end):
+    rows = generator.snapshot.date_rows(main.FilterSpec(start=start, end=end))
+
+    assert generator.store.is_sorted and isinstance(rows, slice)
+    assert np.arange(rows.start, rows.stop).tolist() == rows_between(generator.data, start, end).tolist()
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_out_of_order_appends_fall_back_to_a_sorted_index(generator, start, end):
+    early = generator.generate_realtime_records(30)
+    early['date'] = np.datetime64(day(600), 'ns') + np.arange(30) * np.timedelta64(5, 'D')
+    generator.append_records(early)
+    generator.append_records(generator.generate_realtime_records(5))
+    rows = generator.snapshot.date_rows(main.FilterSpec(start=start, end=end))
+
+    assert not generator.store.is_sorted
+    assert rows.tolist() == rows_between(generator.data, start, end).tolist()
+
+
+def test_older_snapshots_only_see_their_rows_in_the_index(generator):
+    before = generator.snapshot
+    late = generator.generate_realtime_records(3)
+    late['date'] = np.datetime64(day(640), 'ns')
+    generator.append_records(late)
+
+    filters = main.FilterSpec(start=day(640), end=day(640))
+    rows = np.arange(len(generator.snapshot))[generator.snapshot.date_rows(filters)]
+    old_rows = np.arange(len(before))[before.date_rows(filters)]
+    assert old_rows.tolist() == rows_between(before.data, day(640), day(640)).tolist()
+    assert rows.tolist() == old_rows.tolist() + [len(before), len(before) + 1, len(before) + 2]
+
+
+def test_date_range_and_start_combine_to_the_later_bound():
+    recent = main.FilterSpec(date_range='30', start='2000-01-01')
+    assert recent == main.FilterSpec(date_range='30')
+    assert main.FilterSpec(date_range='all', start='2025-02-01').start == np.datetime64('2025-02-01')
+
+
+@pytest.mark.parametrize('query', ['?start=yesterday', '?end=2025-13-01', '?date_range=soon'])
+def test_invalid_dates_are_rejected(query):
+    response = main.app.test_client().get(f'/api/data{query}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_end_before_start_selects_nothing(generator):
+    filters = main.FilterSpec(start='2025-06-01', end='2025-05-01')
+    assert generator.snapshot.count(filters) == 0
+    assert generator.snapshot.cube.count(filters) == 0
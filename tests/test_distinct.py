@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import day
+
+
+FILTERS = [
+    main.FilterSpec(),
+    main.FilterSpec(region='North'),
+    main.FilterSpec(region=['East', 'West'], product='Sports'),
+    main.FilterSpec(start=day(650), end=day(560)),
+]
+
+
+def expected_customers(frame, filters):
+    rows = np.ones(len(frame), dtype=bool)
+    if filters.regions:
+        rows &= frame['region'].isin(filters.regions).to_numpy()
+    if filters.products:
+        rows &= frame['product'].isin(filters.products).to_numpy()
+    if filters.start is not None:
+        rows &= (frame['date'] >= str(filters.start)).to_numpy()
+    if filters.end is not None:
+        rows &= (frame['date'] <= str(filters.end)).to_numpy()
+    return frame['customer_id'][rows].nunique()
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=['all', 'region', 'regions-product', 'dates'])
+def test_exact_index_counts_distinct_customers(generator, filters):
+    frame = generator.store.frame()
+    assert generator.snapshot.cube.distinct_customers(filters) == expected_customers(frame, filters)
+
+
+@pytest.mark.parametrize('cardinality', [50, 5000, 200_000])
+@pytest.mark.parametrize('precision', [8, 12, 14])
+def test_hll_estimate_is_within_three_standard_errors(cardinality, precision):
+    values = np.arange(cardinality, dtype=np.int64) * 7919 + 13
+    index, ranks = main._hll_registers(values, precision)
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    np.maximum.at(registers, index, ranks)
+
+    standard_error = 1.04 / np.sqrt(1 << precision)
+    assert abs(main._hll_estimate(registers) - cardinality) <= 3 * standard_error * cardinality
+
+
+def test_hll_cube_tracks_the_exact_count(generator):
+    approximate = main.DataGenerator(2000, distinct_mode='hll', hll_error=0.02)
+    for filters in FILTERS:
+        exact = generator.snapshot.cube.distinct_customers(filters)
+        assert abs(approximate.snapshot.cube.distinct_customers(filters) - exact) <= 3 * 0.02 * exact
+
+
+def test_hll_registers_merge_like_a_union():
+    first, second = np.arange(0, 6000), np.arange(4000, 10000)
+    registers = []
+    for values in (first, second, np.concatenate([first, second])):
+        index, ranks = main._hll_registers(values, 12)
+        merged = np.zeros(1 << 12, dtype=np.uint8)
+        np.maximum.at(merged, index, ranks)
+        registers.append(merged)
+
+    assert np.array_equal(np.maximum(registers[0], registers[1]), registers[2])
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import main
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[500] = 10.0
+    keep = main.lttb_indices(x, y, 50)
+
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert 500 in keep
+
+
+def test_lttb_leaves_short_series_alone():
+    x = np.arange(10, dtype=np.float64)
+    assert main.lttb_indices(x, x, 10).tolist() == list(range(10))
+    assert main.lttb_indices(x, x, 20).tolist() == list(range(10))
+
+
+def test_downsampled_trend_keeps_first_and_last_day(generator):
+    trend = main.compute_dashboard_data(None, 'cube', None, 'day', generator.snapshot)['charts']['sales_trend']
+    small = main.downsample_trend(trend, 100)
+
+    assert small['resolution'] == {'method': 'lttb', 'points': 100, 'source_points': len(trend['dates'])}
+    assert small['dates'][0] == trend['dates'][0] and small['dates'][-1] == trend['dates'][-1]
+    assert small['sales'][-1] == trend['sales'][-1]
+
+
+@pytest.mark.parametrize('endpoint', ['/api/data', '/api/stream'])
+@pytest.mark.parametrize('value', ['abc', '-5', '0', '1', '2', '2.5', ''])
+def test_invalid_max_points_is_rejected(client, endpoint, value):
+    response = client.get(f'{endpoint}?max_points={value}')
+    assert response.status_code == 400
+    assert 'max_points' in response.get_json()['message']
+
+
+@pytest.mark.parametrize('value', [True, '5', 2, 0])
+def test_invalid_batch_max_points_is_rejected(client, value):
+    response = client.post('/api/batch', json={'filters': [{}], 'max_points': value})
+    assert response.status_code == 400
+
+
+def test_max_points_bounds_the_trend(client):
+    trend = client.get('/api/data?max_points=3').get_json()['charts']['sales_trend']
+    assert len(trend['dates']) == 3
+    assert trend['resolution']['method'] == 'lttb'
@@ -0,0 +1,32 @@
+import pytest
+
+import main
+from conftest import assert_same_data
+
+FILTERS = [
+    {},
+    {'region': 'North'},
+    {'product': ['Sports', 'Clothing']},
+    {'region': 'East', 'product': 'Electronics', 'date_range': '90'},
+    {'date_range': '30'},
+    {'start': '2000-01-01', 'end': '2000-12-31'},
+]
+
+
+@pytest.mark.parametrize('granularity', main.RollupCube.GRANULARITIES)
+@pytest.mark.parametrize('spec', FILTERS)
+def test_engines_agree(generator, spec, granularity):
+    snapshot = generator.snapshot
+    filters = main.FilterSpec.from_dict(spec)
+    expected = main.compute_dashboard_data(filters, 'rows', None, granularity, snapshot)
+    for engine in ('cube', 'fused'):
+        assert_same_data(main.compute_dashboard_data(filters, engine, None, granularity, snapshot), expected)
+
+
+def test_engines_agree_after_appends(generator):
+    for _ in range(3):
+        generator.append_records(generator.generate_realtime_records(5))
+    snapshot = generator.snapshot
+    expected = main.compute_dashboard_data(None, 'rows', None, 'week', snapshot)
+    for engine in ('cube', 'fused'):
+        assert_same_data(main.compute_dashboard_data(None, engine, None, 'week', snapshot), expected)
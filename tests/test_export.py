@@ -0,0 +1,78 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+
+import main
+
+
+@pytest.fixture
+def client(generator, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    # Several chunks per export, so chunk boundaries are exercised
+    monkeypatch.setattr(main, 'EXPORT_CHUNK_ROWS', 300)
+    return main.app.test_client()
+
+
+def expected_rows(generator, query):
+    with main.app.test_request_context(f'/api/export{query}'):
+        filters = main.FilterSpec.from_args(main.request.args)
+    df = generator.get_filtered_data(filters)
+    return main._export_frame(df).reset_index(drop=True)
+
+
+def read_export(body, export_format):
+    if export_format == 'csv':
+        return pd.read_csv(io.BytesIO(body), parse_dates=['date'])
+    if export_format == 'csv.gz':
+        return pd.read_csv(io.BytesIO(gzip.decompress(body)), parse_dates=['date'])
+    pa = pytest.importorskip('pyarrow')
+    if export_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(io.BytesIO(body)).to_pandas()
+    return pa.ipc.open_stream(body).read_all().to_pandas()
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'csv.gz', 'parquet', 'arrow'])
+@pytest.mark.parametrize('query', ['', '?region=East&start=2025-02-01'])
+def test_export_holds_the_filtered_rows(client, generator, export_format, query):
+    separator = '&' if query else '?'
+    response = client.get(f'/api/export{query}{separator}format={export_format}')
+    expected = expected_rows(generator, query)
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers['X-Export-Records'] == str(len(expected))
+    extension = main.EXPORT_FORMATS[export_format][0]
+    assert response.headers['Content-Disposition'].endswith(f'.{extension}"')
+
+    exported = read_export(response.data, export_format)
+    assert exported['customer_id'].tolist() == expected['customer_id'].tolist()
+    assert exported['customer_id'].iloc[0].startswith('CUST_')
+    assert exported['sales'].tolist() == expected['sales'].tolist()
+    assert (exported['date'].dt.date == expected['date'].dt.date).all()
+    assert exported['region'].astype(str).tolist() == expected['region'].astype(str).tolist()
+
+
+def test_empty_export_still_has_a_header(client):
+    body = client.get('/api/export?region=Atlantis').data.decode('utf-8')
+    assert body.splitlines() == ['date,region,product,sales,orders,customers,customer_id,order_id']
+
+
+def test_export_writes_nothing_to_disk(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client.get('/api/export?format=csv.gz').close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_export_format_is_rejected(client):
+    response = client.get('/api/export?format=xlsx')
+    assert response.status_code == 400
+    assert 'xlsx' in response.get_json()['message']
+
+
+def test_export_is_of_the_snapshot_it_started_with(client, generator):
+    response = client.get('/api/export')
+    generator.append_records(generator.generate_realtime_records(10))
+    assert len(read_export(response.data, 'csv')) == int(response.headers['X-Export-Records']) == 2000
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from conftest import assert_same_data, dashboard_metrics
+
+
+EXTENSIONS = {'csv': 'csv', 'csv.gz': 'csv.gz', 'parquet': 'parquet', 'arrow': 'arrows'}
+
+
+def write_export(generator, tmp_path, export_format, chunk_rows=700):
+    """The generator's rows as /api/export would stream them"""
+    path = str(tmp_path / f'sales.{EXTENSIONS[export_format]}')
+    with open(path, 'wb') as f:
+        for data in main.iter_export(generator.snapshot.iter_chunks(chunk_rows=chunk_rows), export_format):
+            f.write(data)
+    return path
+
+
+def write_csv(generator, tmp_path, changes):
+    """The first 50 rows as an export CSV, with {(row, column): value} changed"""
+    frame = main._export_frame(generator.snapshot.data.iloc[:50].copy())
+    for (row, name), value in changes.items():
+        frame[name] = frame[name].astype(object)
+        frame.loc[row, name] = value
+    path = str(tmp_path / 'sales.csv')
+    frame.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'csv.gz', 'parquet', 'arrow'])
+def test_exported_files_load_back(generator, tmp_path, export_format):
+    loaded = main.DataGenerator(source=write_export(generator, tmp_path, export_format))
+
+    expected = generator.data
+    for name in main.SalesFileReader.COLUMNS:
+        actual = loaded.data[name]
+        if name == 'date':
+            assert (actual.to_numpy() == expected[name].to_numpy()).all()
+        else:
+            assert actual.astype(expected[name].dtype).tolist() == expected[name].tolist(), name
+    assert_same_data(dashboard_metrics(loaded), dashboard_metrics(generator))
+    assert loaded.snapshot.cube.distinct_customers() == generator.snapshot.cube.distinct_customers()
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'csv.gz', 'parquet', 'arrow'])
+def test_files_are_read_in_bounded_chunks(generator, tmp_path, export_format):
+    reader = main.SalesFileReader(write_export(generator, tmp_path, export_format),
+                                  generator.regions, generator.products, chunk_rows=300)
+    sizes = [len(chunk) for chunk in reader]
+
+    assert max(sizes) <= 300 and sum(sizes) == reader.rows_read == 2000
+    assert reader.fraction_read == pytest.approx(1.0, abs=0.01)
+    assert reader.date_span == tuple(generator.snapshot.date_span())
+
+
+def test_ids_may_be_bare_numbers(generator, tmp_path):
+    frame = generator.snapshot.data.iloc[:50]
+    path = str(tmp_path / 'sales.csv')
+    frame.to_csv(path, index=False)
+
+    loaded = main.DataGenerator(source=path)
+    assert loaded.store.column('customer_id').tolist() == frame['customer_id'].tolist()
+    assert loaded.store.column('order_id').tolist() == frame['order_id'].tolist()
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({(12, 'region'): 'Antarctica'}, 'Unknown region values in rows 1-50 of .*: Antarctica'),
+    ({(3, 'customer_id'): 'CLIENT_9'}, 'Invalid customer_id values in rows 1-50 of .*: expected CUST_<number>'),
+    ({(8, 'orders'): 2.5}, 'Non-integer orders values in rows 1-50'),
+    ({(5, 'date'): 'not a date'}, 'Missing or unparseable dates in rows 1-50'),
+])
+def test_bad_rows_are_rejected_with_where_they_are(generator, tmp_path, changes, message):
+    with pytest.raises(ValueError, match=message):
+        main.DataGenerator(source=write_csv(generator, tmp_path, changes))
+
+
+def test_missing_columns_and_unknown_file_types_are_rejected(generator, tmp_path):
+    path = str(tmp_path / 'sales.csv')
+    main._export_frame(generator.snapshot.data.iloc[:5]).drop(columns=['orders', 'sales']).to_csv(path, index=False)
+    with pytest.raises(ValueError, match='Missing columns in rows 1-5 of .*: sales, orders'):
+        main.DataGenerator(source=path)
+    with pytest.raises(ValueError, match='Unsupported sales file type'):
+        main.SalesFileReader(str(tmp_path / 'sales.xlsx'), generator.regions, generator.products)
+
+
+def test_a_loaded_data_dir_is_not_read_again(generator, tmp_path):
+    source = write_export(generator, tmp_path, 'csv')
+    data_dir = str(tmp_path / 'store')
+    main.DataGenerator(source=source, data_dir=data_dir)
+    pd.DataFrame({'date': ['x']}).to_csv(source, index=False)
+
+    reopened = main.DataGenerator(source=source, data_dir=data_dir)
+    assert len(reopened.store) == 2000
+    assert np.array_equal(reopened.store.column('sales'), generator.store.column('sales'))
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from conftest import day
+
+
+FILTERS = [
+    {},
+    {'region': 'North'},
+    {'region': ['South', 'West'], 'product': 'Clothing'},
+    {'product': 'Sports', 'start': day(640), 'end': day(460)},
+    {'region': 'Atlantis'},
+]
+
+
+def boolean_mask(df, spec):
+    """The filters as the plain pandas comparisons they replace"""
+    mask = pd.Series(True, index=df.index)
+    for name in ('region', 'product'):
+        if name in spec:
+            labels = [spec[name]] if isinstance(spec[name], str) else spec[name]
+            mask &= df[name].astype(str).isin(labels)
+    if 'start' in spec:
+        mask &= df['date'] >= pd.Timestamp(spec['start'])
+    if 'end' in spec:
+        mask &= df['date'] < pd.Timestamp(spec['end']) + pd.Timedelta(days=1)
+    return mask
+
+
+@pytest.mark.parametrize('spec', FILTERS, ids=['none', 'region', 'regions-product', 'product-dates', 'unknown'])
+def test_filtered_rows_match_boolean_masks(generator, spec):
+    df = generator.data
+    expected = df[boolean_mask(df, spec)]
+    actual = generator.get_filtered_data(main.FilterSpec(**spec))
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert generator.snapshot.count(main.FilterSpec(**spec)) == len(expected)
+
+
+def test_unfiltered_and_date_filtered_rows_are_not_copied(generator):
+    sales = generator.store.column('sales')
+    unfiltered = generator.get_filtered_data()
+    by_date = generator.get_filtered_data(main.FilterSpec(start=day(590)))
+
+    assert np.shares_memory(unfiltered['sales'].to_numpy(), sales)
+    assert np.shares_memory(by_date['sales'].to_numpy(), sales)
+    assert not unfiltered['sales'].to_numpy().flags.writeable
+
+
+def test_label_filters_select_positions(generator):
+    rows = generator.snapshot.get_row_selection(main.FilterSpec(region='North', start=day(590)))
+    codes = generator.store.column('region')[rows]
+
+    assert isinstance(rows, np.ndarray) and np.all(np.diff(rows) > 0)
+    assert set(codes.tolist()) == {generator.categories['region'].index('North')}
+
+
+@pytest.mark.parametrize('region, key', [
+    ('North', ('North',)),
+    (['South', 'North', 'South'], ('North', 'South')),
+    ('all', None),
+    (['', None], None),
+])
+def test_label_filters_are_normalized(region, key):
+    assert main.FilterSpec(region=region).regions == key
+
+
+def test_repeated_and_comma_separated_labels_are_the_same_filter():
+    with main.app.test_request_context('/api/data?region=North,South&product=Sports'):
+        first = main.FilterSpec.from_args(main.request.args)
+    with main.app.test_request_context('/api/data?region=South&region=North&product=Sports'):
+        second = main.FilterSpec.from_args(main.request.args)
+
+    assert first == second and hash(first) == hash(second)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import assert_same_data
+
+
+@pytest.fixture
+def client(generator, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache())
+    return main.app.test_client()
+
+
+def test_fused_cube_reads_slices_and_positions_alike(generator):
+    store = generator.store
+    every_row = main.fused_cube(store).dashboard_data(granularity='month')
+
+    assert_same_data(main.fused_cube(store, slice(0, len(store))).dashboard_data(granularity='month'), every_row)
+    assert_same_data(main.fused_cube(store, np.arange(len(store))).dashboard_data(granularity='month'), every_row)
+    assert main.fused_cube(store, np.arange(0, len(store), 3)).row_count == len(range(0, len(store), 3))
+
+
+def test_fused_dashboard_of_no_rows(generator):
+    data = main.fused_dashboard_data(generator.store, np.array([], dtype=np.intp))
+
+    assert data['metrics'] == {'total_sales': 0, 'total_orders': 0, 'avg_order_value': 0, 'conversion_rate': 0}
+    assert data['charts']['sales_trend']['dates'] == []
+
+
+@pytest.mark.parametrize('values', [
+    np.array([5, 3, 5, 9, 3], dtype=np.int16),
+    np.array([1, 10**12, 1, -7, 10**12], dtype=np.int64),
+    np.array([], dtype=np.int32),
+], ids=['compact', 'sparse', 'empty'])
+def test_distinct_values_are_counted_either_way(values):
+    assert main._count_distinct(values) == len(np.unique(values))
+
+
+@pytest.mark.parametrize('query', ['', '?region=South&granularity=quarter', '?start=2025-05-01&end=2025-05-31'])
+def test_fused_engine_serves_the_same_dashboard(client, query):
+    separator = '&' if query else '?'
+    fused = client.get(f'/api/data{query}{separator}engine=fused').get_json()
+    assert_same_data(fused, client.get(f'/api/data{query}').get_json())
+
+
+def test_unknown_engine_is_rejected(client):
+    response = client.get('/api/data?engine=spark')
+    assert response.status_code == 400
+    assert 'spark' in response.get_json()['message']
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+DTYPES = {
+    'date': 'datetime64[ns]', 'region': 'category', 'product': 'category', 'sales': 'float64',
+    'orders': 'int16', 'customers': 'int16', 'customer_id': 'int16', 'order_id': 'int32'
+}
+
+
+@pytest.fixture(scope='module')
+def backend():
+    return main.SalesBackend()
+
+
+def test_same_seed_gives_the_same_rows(backend):
+    pd.testing.assert_frame_equal(backend.generate_sample_data(3000, seed=7),
+                                  backend.generate_sample_data(3000, seed=7))
+    assert not backend.generate_sample_data(3000, seed=7).equals(backend.generate_sample_data(3000, seed=8))
+
+
+def test_chunks_cover_every_row(backend):
+    chunks = list(backend.iter_sample_chunks(1000, seed=3, chunk_size=300))
+
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  backend.generate_sample_data(1000, seed=3, chunk_size=300))
+
+
+@pytest.mark.parametrize('num_records', [0, 1, 5000])
+def test_sample_rows_have_the_stored_types(backend, num_records):
+    df = backend.generate_sample_data(num_records)
+
+    assert len(df) == num_records
+    assert {name: str(dtype) for name, dtype in df.dtypes.items()} == DTYPES
+    assert list(df['region'].cat.categories) == backend.categories['region']
+    assert list(df['product'].cat.categories) == backend.categories['product']
+
+
+def test_sample_values_follow_the_patterns(backend):
+    df = backend.generate_sample_data(20000)
+    today = pd.Timestamp(datetime.now().date())
+
+    assert df['date'].between(today - pd.Timedelta(days=730), today).all()
+    assert df['orders'].between(1, 5).all() and df['customers'].between(20, 100).all()
+    assert df['customer_id'].between(1000, 9998).all() and df['order_id'].between(10000, 99998).all()
+
+    # Sales are the product's base price times 0.5-2.5, then the month's and region's multipliers
+    pattern = (df['product'].map(backend.BASE_PRICES).astype(float)
+               * backend.SEASONAL_MULTIPLIERS[df['date'].dt.month.to_numpy() - 1]
+               * df['region'].map(backend.REGION_MULTIPLIERS).astype(float))
+    ratio = df['sales'] / pattern
+    assert ratio.between(0.5 - 1e-3, 2.5 + 1e-3).all()
+    assert np.isclose(ratio.mean(), 1.5, atol=0.02)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from conftest import assert_same_data, day
+
+
+def rebuilt_cube(generator):
+    """A cube over the generator's rows, built in one go"""
+    cube = main.RollupCube(generator.regions, generator.products, 'exact', quantile_error=0.01)
+    cube.add(generator.store.frame(len(generator.snapshot)), generator.store.column('customer_id'))
+    return cube
+
+
+def dated_records(generator, count, days_from_today):
+    df = generator.generate_realtime_records(count, np.random.RandomState(count))
+    df['date'] += pd.Timedelta(days=days_from_today)
+    return df
+
+
+@pytest.mark.parametrize('days_from_today', [0, -3, 5, -800], ids=['today', 'inside', 'after', 'before'])
+def test_appended_rows_update_the_cube_like_a_rebuild(generator, days_from_today):
+    generator.append_records(dated_records(generator, 40, days_from_today))
+    cube, expected = generator.snapshot.cube, rebuilt_cube(generator)
+
+    assert (cube.start_day, cube.num_days, cube.row_count) == (expected.start_day, expected.num_days, expected.row_count)
+    for filters in (None, main.FilterSpec(region='East'), main.FilterSpec(start=day(500), product='Sports')):
+        for granularity in main.RollupCube.GRANULARITIES:
+            assert_same_data(cube.dashboard_data(filters, granularity), expected.dashboard_data(filters, granularity))
+        assert cube.distinct_customers(filters) == expected.distinct_customers(filters)
+        assert_same_data(cube.stats(filters, (90,)), expected.stats(filters, (90,)))
+
+
+def test_many_small_appends_add_up(generator):
+    for days_from_today in (0, 1, -2, 0, 3):
+        generator.append_records(dated_records(generator, 5, days_from_today))
+
+    assert_same_data(generator.snapshot.cube.dashboard_data(granularity='week'),
+                     rebuilt_cube(generator).dashboard_data(granularity='week'))
+
+
+def test_realtime_endpoint_appends_and_publishes(generator, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    before = generator.snapshot
+    body = main.app.test_client().get('/api/realtime').get_json()
+
+    assert body['success'] and 1 <= body['new_records'] <= 5
+    assert body['total_records'] == len(generator.snapshot) == len(before) + body['new_records']
+    assert generator.version == before.version + 1
+    assert generator.snapshot.cube.row_count == body['total_records']
@@ -0,0 +1,183 @@
+import json
+
+import pytest
+
+import main
+from conftest import bad_batch, dashboard_metrics
+
+
+def ndjson(*rows):
+    return '\n'.join(json.dumps(row) for row in rows)
+
+
+def sale(date):
+    return {'date': date, 'region': 'North', 'product': 'Sports', 'sales': 10.0, 'orders': 1,
+            'customers': 1, 'customer_id': 'CUST_1', 'order_id': 'ORD_1'}
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+@pytest.fixture
+def open_log():
+    """IngestLog factory whose logs are closed after the test"""
+    logs = []
+
+    def open_log(*args, **kwargs):
+        logs.append(main.IngestLog(*args, **kwargs))
+        return logs[-1]
+
+    yield open_log
+    for log in logs:
+        log.close()
+
+
+def test_ingest_rejects_dates_far_outside_the_data(client):
+    size = len(main.data_gen.snapshot)
+    _, last = main.data_gen.snapshot.date_span()
+    response = client.post('/api/ingest', data=ndjson(sale(str(last)), sale('1700-01-01')),
+                           content_type='application/x-ndjson')
+
+    assert response.status_code == 400
+    assert 'row 2 (1700-01-01)' in response.get_json()['message']
+    assert len(main.data_gen.snapshot) == size
+    assert main.data_gen.snapshot.date_span()[1] == last
+
+
+def test_file_load_rejects_dates_far_outside_the_file(generator, tmp_path):
+    frame = main._export_frame(generator.snapshot.data.iloc[:50].copy())
+    path = str(tmp_path / 'sales.csv')
+    first = frame['date'].min()
+    frame.loc[20, 'date'] = '1700-01-01'
+    frame.to_csv(path, index=False)
+    with pytest.raises(ValueError, match=r'row 21 \(1700-01-01\)'):
+        main.DataGenerator(source=path)
+
+    # The window is configurable
+    frame.loc[20, 'date'] = first - main.pd.Timedelta(days=60)
+    frame.to_csv(path, index=False)
+    with pytest.raises(ValueError, match='row 21'):
+        main.DataGenerator(source=path, date_window_days=30)
+    assert len(main.DataGenerator(source=path, date_window_days=90).store) == 50
+
+
+@pytest.mark.parametrize('name', ['sales', 'orders', 'customers'])
+def test_ingest_rejects_negative_measures(client, name):
+    size = len(main.data_gen.snapshot)
+    _, last = main.data_gen.snapshot.date_span()
+    row = dict(sale(str(last)), **{name: -1})
+    response = client.post('/api/ingest', data=ndjson(sale(str(last)), row), content_type='application/x-ndjson')
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == f'Negative {name} values in rows 1-2 of the request'
+    assert len(main.data_gen.snapshot) == size
+
+
+def test_file_load_rejects_negative_measures(generator, tmp_path):
+    frame = main._export_frame(generator.snapshot.data.iloc[:50].copy())
+    frame.loc[7, 'orders'] = -3
+    path = str(tmp_path / 'sales.csv')
+    frame.to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match='Negative orders values in rows 1-50'):
+        main.DataGenerator(source=path)
+
+
+def test_wal_replay_after_restart(tmp_path, open_log):
+    path = str(tmp_path / 'ingest.wal')
+    generator = main.DataGenerator(2000)
+    log = open_log(path, generator)
+    batches = [generator.generate_realtime_records(4) for _ in range(3)]
+    for batch in batches:
+        log.append(batch)
+    expected = dashboard_metrics(generator, 'cube')
+
+    # The in-memory backend starts over from the same sample data
+    restarted = main.DataGenerator(2000)
+    assert open_log(path, restarted).replay() == 12
+    assert len(restarted.snapshot) == 2012
+    assert dashboard_metrics(restarted, 'cube') == expected
+    assert dashboard_metrics(restarted, 'rows') == expected
+
+
+def test_wal_replay_skips_batches_a_persistent_store_holds(tmp_path, open_log):
+    path, data_dir = str(tmp_path / 'ingest.wal'), str(tmp_path / 'store')
+    generator = main.DataGenerator(2000, data_dir=data_dir)
+    log = open_log(path, generator)
+    log.append(generator.generate_realtime_records(4))
+    generator.checkpoint()
+    unsaved = generator.generate_realtime_records(2)
+    log.append(unsaved)
+
+    restarted = main.DataGenerator(2000, data_dir=data_dir)
+    open_log(path, restarted).replay()
+    assert len(restarted.snapshot) == 2006
+    assert restarted.snapshot.cube.row_count == 2006
+
+
+def test_wal_replay_sets_aside_batches_it_cannot_apply(tmp_path, capsys, open_log):
+    path = str(tmp_path / 'ingest.wal')
+    generator = main.DataGenerator(2000)
+    log = open_log(path, generator)
+    log.append(generator.generate_realtime_records(4))
+    # Left behind as if another process logged after it before it was rejected
+    with open(path, 'ab') as f:
+        f.write(log._record(bad_batch(generator), len(generator.snapshot)))
+    log.append(generator.generate_realtime_records(2))
+
+    restarted = main.DataGenerator(2000)
+    assert open_log(path, restarted).replay() == 6
+    assert 'cannot be applied' in capsys.readouterr().err
+    assert (tmp_path / 'ingest.wal.rejected').stat().st_size > 0
+    # The log no longer holds the bad batch, so the next start replays cleanly
+    assert open_log(path, main.DataGenerator(2000)).replay() == 6
+
+
+def test_failed_wal_append_is_cut_from_the_log(tmp_path, open_log):
+    path = tmp_path / 'ingest.wal'
+    generator = main.DataGenerator(2000)
+    log = open_log(str(path), generator)
+    log.append(generator.generate_realtime_records(4))
+    size = path.stat().st_size
+
+    with pytest.raises(ValueError):
+        log.append(bad_batch(generator))
+    assert path.stat().st_size == size
+
+
+def test_failed_commits_are_not_counted(tmp_path, open_log):
+    generator = main.DataGenerator(2000)
+    log = open_log(str(tmp_path / 'ingest.wal'), generator)
+    log.append(generator.generate_realtime_records(2))
+    with pytest.raises(ValueError):
+        log.append(bad_batch(generator))
+
+    assert (log.commits, log.batches) == (1, 1)
+
+
+def test_in_memory_log_is_capped(tmp_path, open_log):
+    generator = main.DataGenerator(2000)
+    log = open_log(str(tmp_path / 'ingest.wal'), generator, max_bytes=1024)
+    log.append(generator.generate_realtime_records(2))
+    size = (tmp_path / 'ingest.wal').stat().st_size
+
+    with pytest.raises(main.IngestLogFull):
+        log.append(generator.generate_realtime_records(100))
+    assert (tmp_path / 'ingest.wal').stat().st_size == size
+    assert len(generator.snapshot) == 2002
+
+
+def test_persistent_log_is_emptied_past_its_limit(tmp_path, open_log):
+    path = tmp_path / 'ingest.wal'
+    generator = main.DataGenerator(2000, data_dir=str(tmp_path / 'store'))
+    log = open_log(str(path), generator, max_bytes=1024)
+    log.append(generator.generate_realtime_records(2))
+    assert 0 < path.stat().st_size <= 1024
+
+    log.append(generator.generate_realtime_records(100))
+    assert path.stat().st_size == 0
+    restarted = main.DataGenerator(2000, data_dir=str(tmp_path / 'store'))
+    assert open_log(str(path), restarted).replay() == 0
+    assert len(restarted.snapshot) == 2102
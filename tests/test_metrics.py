@@ -0,0 +1,90 @@
+import re
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def client(generator, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    monkeypatch.setattr(main, 'metrics', main.Metrics())
+    return main.app.test_client()
+
+
+def samples(text, name):
+    """{labels: value} of the samples of a metric in Prometheus text"""
+    return {labels: float(value) for labels, value in re.findall(rf'^{name}(\{{.*\}})? (\S+)$', text, re.M)}
+
+
+def test_quantiles_interpolate_within_buckets():
+    metrics = main.Metrics()
+    for value in [0.002] * 50 + [0.02] * 45 + [3.0] * 5:
+        metrics.observe('dashboard_stage_duration_seconds', value, stage='x')
+    counts = metrics._histograms[('dashboard_stage_duration_seconds', (('stage', 'x'),))][0]
+
+    assert metrics.quantile(counts, 0.5) == pytest.approx(0.0025)
+    assert 0.01 < metrics.quantile(counts, 0.95) <= 0.025
+    assert 2.5 < metrics.quantile(counts, 0.99) <= 5.0
+    assert metrics.quantile([0] * len(counts), 0.5) == 0.0
+
+
+def test_histograms_render_cumulative_buckets_and_a_summary():
+    metrics = main.Metrics()
+    for value in (0.0001, 0.003, 0.003, 20.0):
+        metrics.observe('dashboard_request_duration_seconds', value, endpoint='get_data')
+    text = metrics.render()
+
+    buckets = samples(text, 'dashboard_request_duration_seconds_bucket')
+    assert buckets['{endpoint="get_data",le="0.0005"}'] == 1
+    assert buckets['{endpoint="get_data",le="0.005"}'] == 3
+    assert buckets['{endpoint="get_data",le="10.0"}'] == 3
+    assert buckets['{endpoint="get_data",le="+Inf"}'] == 4
+    assert samples(text, 'dashboard_request_duration_seconds_count') == {'{endpoint="get_data"}': 4}
+    assert samples(text, 'dashboard_request_latency_seconds_count') == {'{endpoint="get_data"}': 4}
+    assert '# TYPE dashboard_request_latency_seconds summary' in text
+    assert '{endpoint="get_data",quantile="0.99"}' in samples(text, 'dashboard_request_latency_seconds')
+
+
+def test_stages_record_time_and_rows():
+    metrics = main.Metrics()
+    with metrics.stage('filter') as stage:
+        stage.rows = 120
+    with metrics.stage('filter', rows=30):
+        pass
+    text = metrics.render()
+
+    assert samples(text, 'dashboard_stage_rows_total') == {'{stage="filter"}': 150}
+    assert samples(text, 'dashboard_stage_duration_seconds_count') == {'{stage="filter"}': 2}
+
+
+def test_label_values_are_escaped():
+    assert main._prometheus_labels((('path', 'a"b\\c\nd'),)) == '{path="a\\"b\\\\c\\nd"}'
+    assert main._prometheus_labels(()) == ''
+
+
+def test_metrics_endpoint_reports_requests_and_the_dataset(client, generator):
+    client.get('/api/data')
+    client.get('/api/data?engine=spark')
+    response = client.get('/api/metrics')
+    text = response.get_data(as_text=True)
+
+    assert response.content_type == 'text/plain; version=0.0.4; charset=utf-8'
+    requests = samples(text, 'dashboard_requests_total')
+    assert requests['{endpoint="get_data",status="200"}'] == 1
+    assert requests['{endpoint="get_data",status="400"}'] == 1
+    assert samples(text, 'dashboard_dataset_rows') == {'': 2000}
+    assert samples(text, 'dashboard_dataset_bytes')['{component="cube"}'] == generator.snapshot.cube.nbytes
+    assert '{stage="downsample"}' in samples(text, 'dashboard_stage_duration_seconds_count')
+
+
+def test_profiled_requests_write_folded_stacks(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(main, 'PROFILE_INTERVAL', 0.0001)
+    response = client.get('/api/data?engine=rows&profile=1')
+    response.close()
+
+    profile = tmp_path / response.headers['X-Profile']
+    assert profile.exists()
+    assert all(re.fullmatch(r'\S.* \d+', line) for line in profile.read_text().splitlines())
+    assert 'X-Profile' not in client.get('/api/data').headers
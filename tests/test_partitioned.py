@@ -0,0 +1,54 @@
+import pytest
+
+import main
+from conftest import assert_same_data, day
+
+
+FILTERS = [
+    main.FilterSpec(),
+    main.FilterSpec(region='West'),
+    main.FilterSpec(region=['North', 'East'], product='Electronics', start=day(640), end=day(420)),
+]
+
+
+@pytest.fixture(scope='module')
+def aggregator():
+    aggregator = main.PartitionedAggregator(workers=2, partition_rows=1000)
+    yield aggregator
+    aggregator.close()
+
+
+@pytest.fixture
+def stored(tmp_path):
+    """A dataset whose columns workers can map, with appended rows after the generated ones"""
+    generator = main.DataGenerator(20000, store_dir=str(tmp_path / 'store'))
+    generator.append_records(generator.generate_realtime_records(500))
+    return generator
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=['all', 'region', 'labels-dates'])
+@pytest.mark.parametrize('distinct_mode', ['exact', None])
+def test_partial_cubes_merge_into_the_cube(aggregator, stored, filters, distinct_mode):
+    snapshot = stored.snapshot
+    rows = snapshot.date_rows(filters)
+    assert aggregator.accepts(snapshot.store, rows)
+
+    cube, customers = aggregator.aggregate(snapshot.store, rows, filters, distinct_mode)
+    assert cube.row_count == snapshot.cube.count(filters)
+    assert customers == snapshot.cube.distinct_customers(filters)
+    assert_same_data(cube.dashboard_data(), snapshot.cube.dashboard_data(filters))
+
+
+@pytest.mark.parametrize('granularity', ['day', 'month'])
+def test_fused_engine_on_workers_matches_the_cube(aggregator, stored, monkeypatch, granularity):
+    monkeypatch.setattr(main, 'aggregator', aggregator)
+    for filters in FILTERS:
+        fused = main.compute_dashboard_data(filters, 'fused', None, granularity, stored.snapshot)
+        cube = main.compute_dashboard_data(filters, 'cube', None, granularity, stored.snapshot)
+        assert_same_data(fused, cube)
+
+
+def test_small_or_unstored_ranges_stay_in_process(aggregator, generator, stored):
+    assert not aggregator.accepts(generator.store, generator.snapshot.date_rows(None))
+    assert not aggregator.accepts(stored.store, slice(0, 1999))
+    assert not main.PartitionedAggregator().accepts(stored.store, slice(0, 20000))
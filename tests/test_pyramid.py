@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from conftest import assert_same_data, day
+
+
+FREQUENCIES = {'week': 'W-MON', 'month': 'MS', 'quarter': 'QS'}
+
+
+def bucketed_sales(df, level):
+    """Sales per bucket start, by pandas resampling"""
+    buckets = df.set_index('date')['sales'].resample(FREQUENCIES[level], label='left', closed='left')
+    return buckets.sum()[buckets.size() > 0]
+
+
+@pytest.mark.parametrize('level', ['week', 'month', 'quarter'])
+def test_pyramid_levels_sum_the_days(generator, level):
+    cube = generator.snapshot.cube
+    first, cells = cube._level(level)
+    sales = cells['sales'].sum(axis=(1, 2))
+    present = cells['rows'].sum(axis=(1, 2)) > 0
+    starts = main._bucket_start(level, first + np.arange(len(sales)))[present]
+
+    expected = bucketed_sales(generator.data, level)
+    assert main._day_labels(starts) == [str(day.date()) for day in expected.index]
+    assert np.allclose(sales[present], expected.to_numpy())
+
+
+def test_weeks_start_on_monday():
+    days = np.arange(np.datetime64('2025-01-01'), np.datetime64('2025-03-01')).astype(np.int64)
+    starts = main._bucket_start('week', main._bucket_of('week', days))
+
+    assert set(pd.to_datetime(starts.astype('datetime64[D]')).dayofweek) == {0}
+    assert np.all((days - starts >= 0) & (days - starts < 7))
+
+
+@pytest.mark.parametrize('level', ['week', 'month', 'quarter'])
+def test_appends_re_derive_only_what_changed_and_match_a_rebuild(generator, level):
+    generator.append_records(generator.generate_realtime_records(20))
+    cube = generator.snapshot.cube
+    rebuilt = cube.copy()
+    rebuilt._update_pyramid()
+
+    for filters in (None, main.FilterSpec(start=day(600), end=day(380), region='North')):
+        assert_same_data(cube.dashboard_data(filters, level), rebuilt.dashboard_data(filters, level))
+
+
+def test_partial_buckets_at_the_edges_count_only_selected_days(generator):
+    # Mid-month to mid-month, two months on, whenever the data was generated
+    start = (generator.snapshot.cube.start_day.astype('datetime64[M]') + 3).astype('datetime64[D]') + 10
+    filters = main.FilterSpec(start=str(start), end=str(start + 52))
+    trend = generator.snapshot.cube.dashboard_data(filters, 'month')['charts']['sales_trend']
+    expected = bucketed_sales(generator.get_filtered_data(filters), 'month')
+
+    assert len(trend['dates']) == 3
+    assert trend['dates'] == [str(day.date()) for day in expected.index]
+    assert np.allclose(trend['sales'], expected.to_numpy())
+
+
+@pytest.mark.parametrize('level, days, labels', [
+    ('week', ['2025-01-06', '2025-02-03'], ['2025-01-06', '2025-02-03']),
+    ('month', ['2025-01-01', '2025-02-01'], ['2025-01', '2025-02']),
+    ('quarter', ['2025-01-01', '2025-04-01'], ['2025Q1', '2025Q2']),
+])
+def test_period_labels_match_pandas(level, days, labels):
+    days = np.array(days, dtype='datetime64[D]').astype(np.int64)
+    assert main._period_labels(level, days) == labels
+    if level != 'week':
+        assert labels == [str(pd.Period(day, freq=level[0].upper())) for day in days.astype('datetime64[D]')]
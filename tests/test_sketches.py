@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from conftest import day
+
+
+PERCENTILES = (1, 10, 25, 75, 90, 99, 99.9)
+FILTERS = [
+    main.FilterSpec(),
+    main.FilterSpec(region='South'),
+    main.FilterSpec(product=['Clothing', 'Sports'], start=day(400)),
+]
+
+
+def nearest_rank(sales, p):
+    """The sketch's definition of a percentile, computed exactly"""
+    return np.sort(sales)[int(p / 100 * (len(sales) - 1))]
+
+
+def assert_within(estimate, exact, error):
+    assert abs(estimate - exact) <= error * abs(exact) + 1e-9, (estimate, exact)
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=['all', 'region', 'products-dates'])
+def test_sketch_quantiles_are_within_the_relative_error(generator, filters):
+    stats = generator.snapshot.stats(filters, PERCENTILES)['sales_stats']
+    sales = generator.snapshot.get_filtered_data(filters)['sales'].to_numpy()
+
+    assert stats['min'] == sales.min() and stats['max'] == sales.max()
+    assert_within(stats['median'], nearest_rank(sales, 50), generator.snapshot.cube.quantile_error)
+    for p in PERCENTILES:
+        label = main._percentile_label(p)
+        assert_within(stats['percentiles'][label], nearest_rank(sales, p), generator.snapshot.cube.quantile_error)
+
+
+def test_sketches_stay_accurate_across_appends(generator):
+    for _ in range(3):
+        generator.append_records(generator.generate_realtime_records(200))
+    stats = generator.snapshot.stats(None, (90,))['sales_stats']
+    sales = generator.snapshot.get_filtered_data()['sales'].to_numpy()
+
+    assert_within(stats['median'], nearest_rank(sales, 50), 0.01)
+    assert_within(stats['percentiles']['p90'], nearest_rank(sales, 90), 0.01)
+
+
+@pytest.mark.parametrize('error', [0.001, 0.01, 0.05])
+def test_every_bucket_value_is_within_the_error(error):
+    cube = main.RollupCube(['North'], ['Sports'], distinct_mode=None, quantile_error=error)
+    values = np.concatenate([np.geomspace(0.01, 1e7, 5000), -np.geomspace(0.01, 1e4, 500)])
+    estimates = cube._sketch_values(cube._sketch_buckets(values))
+
+    assert np.all(np.abs(estimates - values) <= error * np.abs(values) * (1 + 1e-9))
+
+
+def test_extremes_are_exact_beyond_the_bucket_bound():
+    cube = main.RollupCube(['North'], ['Sports'], distinct_mode=None, quantile_error=0.001)
+    sales = np.concatenate([np.full(98, 100.0), [0.02, 5e8]])
+    cube.add(pd.DataFrame({
+        'date': pd.Timestamp('2025-01-01'), 'region': 'North', 'product': 'Sports',
+        'sales': sales, 'orders': 1, 'customers': 1, 'customer_id': 1
+    }))
+    stats = cube.stats(None, (0, 50, 100))['sales_stats']
+
+    assert stats['percentiles'] == {'p0': 0.02, 'p50': pytest.approx(100, rel=0.001), 'p100': 5e8}
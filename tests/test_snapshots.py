@@ -0,0 +1,93 @@
+import threading
+
+import numpy as np
+import pytest
+
+import main
+from conftest import assert_same_data, bad_batch, dashboard_metrics
+
+
+def test_snapshot_is_unchanged_by_later_appends(generator):
+    snapshot = generator.snapshot
+    before = main.compute_dashboard_data(None, 'cube', None, 'day', snapshot)
+    generator.append_records(generator.generate_realtime_records(10))
+
+    assert len(snapshot) == 2000
+    assert len(generator.snapshot) == 2010
+    assert_same_data(main.compute_dashboard_data(None, 'cube', None, 'day', snapshot), before)
+    assert_same_data(main.compute_dashboard_data(None, 'rows', None, 'day', snapshot), before)
+
+
+def test_snapshots_stay_consistent_under_concurrent_appends(generator):
+    done = threading.Event()
+    errors = []
+
+    def write():
+        try:
+            for _ in range(50):
+                generator.append_records(generator.generate_realtime_records(3))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    checked = 0
+    while not done.is_set() or checked == 0:
+        snapshot = generator.snapshot
+        # The cube and the rows a snapshot publishes must describe the same data
+        cube = main.compute_dashboard_data(None, 'cube', None, 'day', snapshot)
+        rows = main.compute_dashboard_data(None, 'rows', None, 'day', snapshot)
+        assert_same_data(cube, rows)
+        assert snapshot.cube.row_count == len(snapshot)
+        checked += 1
+    writer.join()
+
+    assert not errors
+    assert len(generator.snapshot) == 2150
+
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_rollback_after_failed_append(tmp_path, persistent):
+    data_dir = str(tmp_path / 'store') if persistent else None
+    generator = main.DataGenerator(2000, data_dir=data_dir)
+    assert 'customer_id' not in generator.store.dictionaries
+    customers = len(generator.snapshot.cube._distinct.numbers)
+    before = dashboard_metrics(generator, 'cube')
+
+    with pytest.raises(ValueError):
+        generator.append_records(bad_batch(generator))
+    assert len(generator.store) == generator.snapshot.cube.row_count == 2000
+    assert len(generator.snapshot.cube._distinct.numbers) == customers
+    assert dashboard_metrics(generator, 'cube') == before
+
+    generator.append_records(generator.generate_realtime_records(3))
+    assert len(generator.store) == generator.snapshot.cube.row_count == 2003
+    assert dashboard_metrics(generator, 'cube') == dashboard_metrics(generator, 'rows')
+    if persistent:
+        reopened = main.DataGenerator(2000, data_dir=data_dir)
+        assert len(reopened.store) == 2003
+        assert np.array_equal(reopened.store.column('customer_id'), generator.store.column('customer_id'))
+
+
+def test_rollback_of_a_grown_store_is_invisible_to_other_processes(tmp_path):
+    data_dir = str(tmp_path / 'store')
+    # Two generators on one directory stand in for two processes
+    first = main.DataGenerator(2000, data_dir=data_dir)
+    second = main.DataGenerator(2000, data_dir=data_dir)
+
+    # Big enough to grow every column, with order numbers that widen one
+    rejected = bad_batch(first, first.store.capacity)
+    rejected['order_id'] = np.arange(len(rejected), dtype=np.int64) + 10 ** 12
+    with pytest.raises(ValueError):
+        first.append_records(rejected)
+    assert not [name for name in (tmp_path / 'store').iterdir() if name.suffix == '.tmp']
+
+    second.append_records(second.generate_realtime_records(5))
+    first.append_records(first.generate_realtime_records(1))
+    assert len(first.store) == first.snapshot.cube.row_count == 2006
+
+    restarted = main.DataGenerator(2000, data_dir=data_dir)
+    assert len(restarted.store) == 2006
+    assert dashboard_metrics(restarted, 'cube') == dashboard_metrics(restarted, 'rows')
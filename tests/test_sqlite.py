@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import assert_same_data, day
+
+
+FILTERS = [
+    main.FilterSpec(),
+    main.FilterSpec(region='North'),
+    main.FilterSpec(region=['South', 'West'], product=['Sports', 'Clothing'], start=day(500), end=day(200)),
+    main.FilterSpec(region='Atlantis'),
+]
+FILTER_IDS = ['all', 'region', 'labels-dates', 'unknown']
+
+
+@pytest.fixture
+def sqlite(tmp_path):
+    """The same sample rows as the generator fixture, in SQLite"""
+    return main.SqliteBackend(str(tmp_path / 'sales.db'), 2000)
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=FILTER_IDS)
+@pytest.mark.parametrize('granularity', ['day', 'month'])
+def test_sql_aggregates_match_the_pandas_backend(sqlite, generator, filters, granularity):
+    assert sqlite.snapshot.count(filters) == generator.snapshot.count(filters)
+    assert_same_data(main.compute_dashboard_data(filters, 'cube', None, granularity, sqlite.snapshot),
+                     main.compute_dashboard_data(filters, 'cube', None, granularity, generator.snapshot))
+    assert_same_data(main.compute_dashboard_data(filters, 'rows', None, granularity, sqlite.snapshot),
+                     main.compute_dashboard_data(filters, 'rows', None, granularity, generator.snapshot))
+
+
+@pytest.mark.parametrize('filters', FILTERS[:3], ids=FILTER_IDS[:3])
+def test_sql_stats_are_exact(sqlite, generator, filters):
+    stats = sqlite.snapshot.stats(filters, (10, 90))
+    sales = np.sort(generator.get_filtered_data(filters)['sales'].to_numpy())
+
+    assert stats['total_records'] == len(sales)
+    assert stats['regions'] == generator.snapshot.cube.stats(filters)['regions']
+    assert (stats['sales_stats']['min'], stats['sales_stats']['max']) == (sales[0], sales[-1])
+    assert stats['sales_stats']['mean'] == pytest.approx(sales.mean())
+    assert stats['sales_stats']['median'] == pytest.approx(np.median(sales))
+    assert stats['sales_stats']['percentiles'] == {
+        'p10': sales[int(0.1 * (len(sales) - 1))], 'p90': sales[int(0.9 * (len(sales) - 1))]
+    }
+
+
+def test_empty_selection_stats(sqlite):
+    stats = sqlite.snapshot.stats(main.FilterSpec(region='Atlantis'), (50,))
+    assert stats['total_records'] == 0
+    assert stats['date_range'] == {'start': None, 'end': None}
+    assert stats['sales_stats']['median'] is None and stats['sales_stats']['percentiles'] == {'p50': None}
+
+
+def test_snapshots_are_pinned_by_id(sqlite):
+    before = sqlite.snapshot
+    records = sqlite.generate_realtime_records(5)
+    after = sqlite.append_records(records)
+
+    assert (len(before), before.count(), len(after)) == (2000, 2000, 2005)
+    assert after.version == before.version + 1
+    assert after.get_filtered_data().iloc[-5:]['sales'].tolist() == records['sales'].tolist()
+
+
+def test_a_reopened_database_keeps_its_rows_and_sees_other_writers(sqlite, tmp_path):
+    other = main.SqliteBackend(str(tmp_path / 'sales.db'), 10)
+    assert len(other.snapshot) == 2000
+
+    other.append_records(other.generate_realtime_records(3))
+    sqlite.refresh()
+    assert len(sqlite.snapshot) == 2003
+
+
+def test_chunks_have_the_stored_types(sqlite, generator):
+    chunks = list(sqlite.snapshot.iter_chunks(chunk_rows=600))
+    empty = list(sqlite.snapshot.iter_chunks(main.FilterSpec(region='Atlantis')))
+
+    assert [len(chunk) for chunk in chunks] == [600, 600, 600, 200]
+    # Integers are downcast per chunk, like rows read from a file
+    kinds = {name: dtype.kind for name, dtype in chunks[0].dtypes.items()}
+    assert kinds == {name: dtype.kind for name, dtype in generator.data.dtypes.items()}
+    assert len(empty) == 1 and len(empty[0]) == 0 and list(empty[0].columns) == list(chunks[0].columns)
+
+
+def test_fused_engine_is_not_offered(sqlite, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', sqlite)
+    response = main.app.test_client().get('/api/data?engine=fused')
+    assert response.status_code == 400
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import dashboard_metrics
+
+
+def test_customer_ids_are_stored_as_plain_integers(generator):
+    column = generator.store.column('customer_id')
+    assert 'customer_id' not in generator.store.dictionaries
+    assert np.issubdtype(column.dtype, np.integer) and column.dtype.itemsize <= 4
+
+
+def test_new_customer_ids_widen_the_column_and_count_once(generator):
+    df = generator.generate_realtime_records(4)
+    df['customer_id'] = [5_000_000, 5_000_000, 7, 5_000_001]
+    generator.append_records(df)
+
+    assert generator.store.column('customer_id')[-4:].tolist() == [5_000_000, 5_000_000, 7, 5_000_001]
+    assert dashboard_metrics(generator, 'cube') == dashboard_metrics(generator, 'rows')
+
+
+def test_customer_code_map_is_reported_apart_from_the_sets():
+    sets = main._CustomerSets((1, 1), 7)
+    sets.extend(7)
+    sets.add(np.array([0, 0, 1]), np.array([10**9, 3, 10**9]))
+
+    cells, numbers = sets.pairs()
+    assert sorted(zip(cells.tolist(), numbers.tolist())) == [(0, 3), (0, 10**9), (1, 10**9)]
+    assert sets.code_nbytes == 2 * 2 * 8
+    assert sets.nbytes > sets.code_nbytes
+
+
+@pytest.mark.parametrize('ids', [
+    ['CUST_1234', 'CUST_7', 'CUST_1234'],
+    ['CUST_0042', 'CUST_42', 'CUST_0', 'CUST_00'],
+    ['CUST_999999999999'],
+], ids=['plain', 'zero-padded', 'wide'])
+def test_id_numbers_format_back_to_the_same_ids(ids):
+    numbers = main._id_numbers(ids, 'CUST_')
+    assert numbers.dtype.kind == 'i'
+    assert main._id_labels(np.asarray(numbers), 'CUST_').tolist() == ids
+
+
+@pytest.mark.parametrize('ids', [['CUST_12', 'USER_3'], ['CUST_'], ['CUST_-5'], [-5]])
+def test_malformed_ids_are_rejected(ids):
+    with pytest.raises(ValueError):
+        main._id_numbers(ids, 'CUST_')
@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+import main
+from conftest import assert_same_data
+
+
+@pytest.fixture
+def hub(generator):
+    return main.UpdateHub(generator, refresh_interval=0.2)
+
+
+def parse(event):
+    """(name, id, data) of one encoded Server-Sent Event"""
+    fields = dict(line.split(': ', 1) for line in event.decode('utf-8').strip().split('\n'))
+    return fields['event'], int(fields['id']), json.loads(fields['data'])
+
+
+def next_event(subscriber):
+    return parse(subscriber.queue.get(timeout=5))
+
+
+def test_subscribers_start_from_the_full_dashboard(hub, generator):
+    filters = main.FilterSpec(region='North')
+    name, version, data = next_event(hub.subscribe(filters))
+
+    assert (name, version) == ('snapshot', generator.version)
+    assert_same_data(data, main.compute_dashboard_data(filters, 'cube', None, 'day', generator.snapshot))
+
+
+def test_updates_carry_only_what_changed(hub, generator):
+    subscriber = hub.subscribe(main.FilterSpec())
+    _, _, before = next_event(subscriber)
+    records = generator.generate_realtime_records(3)
+    generator.append_records(records)
+
+    name, version, changes = next_event(subscriber)
+    assert (name, version) == ('update', generator.version)
+    assert changes['total_records'] == 2003
+    assert changes['metrics']['total_orders'] == before['metrics']['total_orders'] + records['orders'].sum()
+    # Realtime rows are dated today, a day past the sample data, so the trend gains one point
+    assert changes['trend']['dates'] == [str(records['date'].max().date())]
+    assert changes['trend']['dates'][0] > before['charts']['sales_trend']['dates'][-1]
+    assert 'replace' not in changes['trend']
+
+
+def test_subscribers_with_the_same_filters_share_events(hub, generator):
+    first, second = hub.subscribe(main.FilterSpec()), hub.subscribe(main.FilterSpec())
+    other = hub.subscribe(main.FilterSpec(), 'month')
+    for subscriber in (first, second, other):
+        subscriber.queue.get(timeout=5)
+    generator.append_records(generator.generate_realtime_records(2))
+
+    update = first.queue.get(timeout=5)
+    assert second.queue.get(timeout=5) is update
+    assert other.queue.get(timeout=5) is not update
+    assert len(hub._groups) == 2 and hub.subscriber_count() == 3
+
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+    assert len(hub._groups) == 1 and hub.subscriber_count() == 1
+
+
+def test_compact_subscribers_get_compact_trends(hub, generator):
+    subscriber = hub.subscribe(main.FilterSpec(), compact=True)
+    _, _, data = next_event(subscriber)
+    plain = main.compute_dashboard_data(None, 'cube', None, 'day', generator.snapshot)
+    assert data['charts']['sales_trend'] == main.compact_trend(plain['charts']['sales_trend'])
+
+    generator.append_records(generator.generate_realtime_records(2))
+    _, _, changes = next_event(subscriber)
+    assert changes['trend']['encoding'] == 'compact' and changes['trend']['replace'] is False
+
+
+def test_full_queues_are_dropped(hub, generator):
+    hub.QUEUE_SIZE = 1
+    slow, fast = hub.subscribe(main.FilterSpec()), hub.subscribe(main.FilterSpec())
+    fast.queue.get(timeout=5)
+    generator.append_records(generator.generate_realtime_records(2))
+
+    fast.queue.get(timeout=5)
+    assert slow.closed and hub.subscriber_count() == 1
+    hub.close()
+    assert fast.closed and fast.queue.get(timeout=5) is None
+
+
+def test_moved_trend_points_are_resent_in_full():
+    old = {'metrics': {'total_sales': 1.0},
+           'charts': {'sales_trend': {'dates': ['2024-01-01', '2024-01-02'], 'sales': [1.0, 2.0], 'resolution': 'day'}}}
+    new = {'metrics': {'total_sales': 1.0},
+           'charts': {'sales_trend': {'dates': ['2024-01-02', '2024-01-03'], 'sales': [2.0, 3.0], 'resolution': 'day'}}}
+
+    changes = main.UpdateHub._changes(old, new)
+    assert changes == {'trend': dict(new['charts']['sales_trend'], replace=True)}
+    assert main.UpdateHub._changes(new, new) == {}
+
+
+@pytest.fixture
+def client(generator, hub, monkeypatch):
+    monkeypatch.setattr(main, 'data_gen', generator)
+    monkeypatch.setattr(main, 'update_hub', hub)
+    return main.app.test_client()
+
+
+def test_stream_sends_the_dashboard_then_keepalives(client, hub, monkeypatch):
+    monkeypatch.setattr(main, 'STREAM_KEEPALIVE', 0.01)
+    response = client.get('/api/stream?region=North&encoding=compact', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    chunks = iter(response.response)
+    name, _, data = parse(next(chunks))
+    assert name == 'snapshot' and data['charts']['sales_trend']['encoding'] == 'compact'
+    assert next(chunks) == b': keepalive\n\n'
+    assert hub.subscriber_count() == 1
+
+    response.close()
+    assert hub.subscriber_count() == 0
+
+
+@pytest.mark.parametrize('query', ['granularity=hour', 'encoding=xml', 'max_points=1'],
+                         ids=['granularity', 'encoding', 'max_points'])
+def test_bad_stream_parameters_are_rejected(client, hub, query):
+    response = client.get(f'/api/stream?{query}')
+    assert response.status_code == 400 and response.get_json()['success'] is False
+    assert hub.subscriber_count() == 0